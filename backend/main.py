@@ -1,15 +1,57 @@
-from fastapi import FastAPI
+import os
+import json
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
 from rag_pipeline.query_builder import build_query
-from rag_pipeline.search import search_recipes
-from rag_pipeline.generator import generate_recipe
+from rag_pipeline.search import search_recipes_async, search_recipes_batch, get_engine, get_batcher
+from rag_pipeline.generator import (
+    generate_recipe_async,
+    generate_recipe_stream,
+    get_result_cache,
+    get_semantic_cache,
+    get_generation_stats,
+)
+from rag_pipeline.llm_client import get_llm_client
+from rag_pipeline.prompt_builder import get_compiled_template
+from rag_pipeline.json_repair import get_repair_stats
+from rag_pipeline.executor import run_cpu, shutdown as shutdown_executor
+from rag_pipeline.memory import process_memory
+from rag_pipeline.shards import ShardedSearch
+from rag_pipeline.metrics import CONTENT_TYPE, REQUEST_SECONDS, REQUESTS, get_registry, stage_summary
+from rag_pipeline.tracing import (
+    PROFILE_HEADER,
+    REQUEST_ID_HEADER,
+    end_trace,
+    finish_trace,
+    should_profile,
+    start_trace,
+)
 
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI(title="CookMate Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the retrieval assets in the background so /health answers
+    # immediately and /ready flips once everything is in memory.
+    # Set COOKMATE_WARMUP=0 to load lazily on the first search instead.
+    if os.getenv("COOKMATE_WARMUP", "1") != "0":
+        get_engine().warmup()
+    get_compiled_template()
+    yield
+    get_engine().embedding_cache.save()
+    get_result_cache().save()
+    await get_llm_client().aclose()
+    shutdown_executor()
+
+
+app = FastAPI(title="CookMate Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,13 +59,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER, "Server-Timing"],
 )
 
 
-class SearchRequest(BaseModel):
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, to keep the series bounded.
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=str(status))
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace, token = start_trace(
+        request.headers.get(REQUEST_ID_HEADER),
+        profile=should_profile(request.headers.get(PROFILE_HEADER)),
+    )
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish_trace(trace, method=request.method, path=request.url.path, status=500)
+        raise
+    finally:
+        end_trace(token)
+
+    response.headers[REQUEST_ID_HEADER] = trace.request_id
+    response.headers["Server-Timing"] = trace.server_timing()
+
+    # The trace ends with the body, so streamed responses are covered whole.
+    body = response.body_iterator
+
+    async def traced_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish_trace(trace, method=request.method, path=request.url.path, status=response.status_code)
+
+    response.body_iterator = traced_body()
+    return response
+
+
+class SearchQuery(BaseModel):
     ingredients: List[str] | str
     diet: Optional[str] = None
     cuisine: Optional[str] = None
+
+
+class SearchRequest(SearchQuery):
+    k: int = 5
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery]
     k: int = 5
 
 
@@ -54,6 +152,7 @@ class GenerateRequest(BaseModel):
     cuisine: Optional[str] = None
     k: int = 3
     max_retries: int = 1
+    use_cache: bool = True
 
 
 class GeneratedRecipeOut(BaseModel):
@@ -65,6 +164,12 @@ class GeneratedRecipeOut(BaseModel):
     raw_output: Optional[str] = None
     error: Optional[str] = None
     validation_message: Optional[str] = None
+    cached: bool = False
+    cache_similarity: Optional[float] = None
+    context_tokens: Optional[int] = None
+    attempts: Optional[int] = None
+    retries_avoided: Optional[int] = None
+    repairs: Optional[List[str]] = None
 
 
 def normalize_ingredients(ing):
@@ -87,8 +192,39 @@ def health():
     return {"status": "ok", "message": "CookMate backend running"}
 
 
+@app.get("/ready")
+def ready():
+    status = get_engine().status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/stats")
+def stats():
+    batcher = get_batcher()
+    engine = get_engine()
+    return {
+        "embedding_cache": get_engine().embedding_cache.stats(),
+        "batcher": batcher.stats() if batcher is not None else None,
+        "llm": get_llm_client().stats(),
+        "prompt": get_compiled_template().info(),
+        "generation": get_generation_stats().stats(),
+        "json_repair": get_repair_stats().stats(),
+        "result_cache": get_result_cache().stats(),
+        "semantic_cache": get_semantic_cache().stats(),
+        "memory": {"pid": os.getpid(), **process_memory()},
+        "shards": engine.stats() if isinstance(engine, ShardedSearch) else None,
+        "stages": stage_summary(),
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(get_registry().render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/search_recipes", response_model=List[RecipeOut])
-def search_recipes_endpoint(payload: SearchRequest):
+async def search_recipes_endpoint(payload: SearchRequest):
     if isinstance(payload.ingredients, str):
         ingredients = [x.strip() for x in payload.ingredients.split(",") if x.strip()]
     else:
@@ -100,24 +236,46 @@ def search_recipes_endpoint(payload: SearchRequest):
         cuisine=payload.cuisine,
     )
 
-    results = search_recipes(query, k=payload.k)
+    results = await search_recipes_async(
+        query, k=payload.k, diet=payload.diet, cuisine=payload.cuisine
+    )
     return results
 
+
+@app.post("/search_recipes/batch", response_model=List[List[RecipeOut]])
+async def search_recipes_batch_endpoint(payload: BatchSearchRequest):
+    queries = [
+        build_query(
+            ingredients=normalize_ingredients(item.ingredients),
+            diet=item.diet,
+            cuisine=item.cuisine,
+        )
+        for item in payload.queries
+    ]
+    filters = [{"diet": item.diet, "cuisine": item.cuisine} for item in payload.queries]
+
+    return await run_cpu(search_recipes_batch, queries, k=payload.k, filters=filters)
+
 @app.post("/generate_recipe", response_model=GeneratedRecipeOut)
-def generate_recipe_endpoint(payload: GenerateRequest):
+async def generate_recipe_endpoint(payload: GenerateRequest):
     if isinstance(payload.ingredients, str):
         pantry = [x.strip() for x in payload.ingredients.split(",") if x.strip()]
     else:
         pantry = payload.ingredients
 
-    result = generate_recipe(
+    result = await generate_recipe_async(
         pantry=pantry,
         diet=payload.diet,
         cuisine=payload.cuisine,
         k=payload.k,
         max_retries=payload.max_retries,
+        use_cache=payload.use_cache,
     )
 
+    return _generated_out(result, pantry, payload)
+
+
+def _generated_out(result: dict, pantry: List[str], payload: GenerateRequest) -> dict:
     return {
         "success": result.get("success", False),
         "pantry": result.get("pantry", pantry),
@@ -127,4 +285,54 @@ def generate_recipe_endpoint(payload: GenerateRequest):
         "raw_output": result.get("raw_output"),
         "error": result.get("error"),
         "validation_message": result.get("validation_message"),
+        "cached": result.get("cached", False),
+        "cache_similarity": result.get("cache_similarity"),
+        "context_tokens": result.get("context_tokens"),
+        "attempts": result.get("attempts"),
+        "retries_avoided": result.get("retries_avoided"),
+        "repairs": result.get("repairs"),
     }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate_recipe/stream")
+async def generate_recipe_stream_endpoint(payload: GenerateRequest):
+    """
+    Server-sent events: "token" events carry the model output as it is
+    generated, "retry" marks a regeneration after invalid JSON, and a final
+    "result" event carries the same body as /generate_recipe.
+    """
+    pantry = normalize_ingredients(payload.ingredients)
+
+    async def events():
+        try:
+            async for event, data in generate_recipe_stream(
+                pantry=pantry,
+                diet=payload.diet,
+                cuisine=payload.cuisine,
+                k=payload.k,
+                max_retries=payload.max_retries,
+                use_cache=payload.use_cache,
+            ):
+                if event == "result":
+                    data = _generated_out(data, pantry, payload)
+                yield _sse(event, data)
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band.
+            yield _sse(
+                "result",
+                _generated_out(
+                    {"success": False, "error": "llm_error", "validation_message": repr(e)},
+                    pantry,
+                    payload,
+                ),
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
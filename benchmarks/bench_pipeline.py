@@ -0,0 +1,353 @@
+"""
+Microbenchmarks of the pipeline functions, with stored baselines.
+
+Runs offline: the corpus, Faiss index and query encoder are the synthetic
+fixtures from tests/synthetic_corpus.py (HashingEncoder stands in for
+MiniLM, so "search.encode" times the encode path and its cache handling,
+not the transformer). Each function is timed across realistic k and
+corpus sizes:
+
+    build_query
+    search.encode                  query embedding (cache disabled)
+    search.index[n,k]              Faiss search + id mapping, one query
+    search.materialize[n,k]        result dicts for k store rows
+    search_recipes[n,k]            the whole search, hybrid as configured
+    format_retrieved[k]
+    build_rag_prompt[k]
+    validate_recipe_json[valid|invalid]
+    estimate_nutrition[k]
+
+Every benchmark reports the time per call of its best round (and the
+median round), and the best round is compared with
+benchmarks/baselines.json: noise only ever makes a round slower, so the
+minimum is the steadiest statistic. A benchmark slower than its baseline
+by more than the threshold (--threshold, or COOKMATE_BENCH_THRESHOLD,
+default 0.25 = 25%) and by more than --min-delta-us is measured again
+(--confirm times), and the run fails with exit code 1 if it stays slower.
+The suite runs in --processes fresh interpreters, keeping each
+benchmark's best, because timings also shift from process to process.
+
+    python -m benchmarks.bench_pipeline                    # compare with the baselines
+    python -m benchmarks.bench_pipeline --update           # record new baselines
+    python -m benchmarks.bench_pipeline --sizes 1000 --k 5 --only search
+
+Baselines are only comparable on the machine that recorded them, so
+record them where the comparison runs (e.g. the CI runner).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from rag_pipeline.query_builder import build_query
+from rag_pipeline.search import SearchEngine
+from rag_pipeline.format_retrieved import format_retrieved
+from rag_pipeline.prompt_builder import UserRequest, build_rag_prompt
+from rag_pipeline.generator import validate_recipe_json
+from nutrition.estimator import estimate_nutrition_from_retrieved
+from tests.synthetic_corpus import INGREDIENTS, HashingEncoder, build_corpus
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+THRESHOLD = float(os.getenv("COOKMATE_BENCH_THRESHOLD", "0.25"))
+
+SIZES = [1000, 10000]
+KS = [3, 5, 10]
+N_QUERIES = 50
+DIETS = [None, "vegetarian", "vegan"]
+CUISINES = [None, "Italian", "Asian"]
+
+VALID_OUTPUT = json.dumps(
+    {
+        "title": "Tomato garlic pasta",
+        "ingredients": ["200 g pasta", "3 tomatoes", "2 cloves garlic", "olive oil", "salt"],
+        "steps": ["Boil the pasta.", "Fry the garlic in oil.", "Add the tomatoes.", "Toss with the pasta."],
+        "time_minutes": 25,
+        "servings": 2,
+        "diet": "vegetarian",
+        "cuisine": "Italian",
+        "reason": "Uses the pantry tomatoes and garlic.",
+    }
+)
+INVALID_OUTPUT = VALID_OUTPUT[:-40]
+
+
+def make_requests(n: int = N_QUERIES, seed: int = 0) -> List[Dict[str, Any]]:
+    """Deterministic pantry requests: 2-6 ingredients, some with a diet or cuisine."""
+    rng = random.Random(seed)
+    return [
+        {
+            "ingredients": rng.sample(INGREDIENTS, rng.randint(2, 6)),
+            "diet": rng.choice(DIETS),
+            "cuisine": rng.choice(CUISINES),
+        }
+        for _ in range(n)
+    ]
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.02, repeat: int = 7) -> Dict[str, float]:
+    """
+    Time fn like timeit: calls per round are raised until a round takes
+    at least min_time, then repeat rounds are run. Per-call times in us.
+    """
+    def run(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - start
+
+    number = 1
+    elapsed = run(number)
+    while elapsed < min_time and number < 1_000_000:
+        number *= 10 if elapsed < min_time / 10 else 2
+        elapsed = run(number)
+
+    rounds = [elapsed / number] + [run(number) / number for _ in range(repeat - 1)]
+    return {
+        "median_us": round(1e6 * statistics.median(rounds), 3),
+        "min_us": round(1e6 * min(rounds), 3),
+        "calls": number * repeat,
+    }
+
+
+def _cycle(items: List[Any]) -> Callable[[], Any]:
+    state = {"i": -1}
+
+    def next_item():
+        state["i"] = (state["i"] + 1) % len(items)
+        return items[state["i"]]
+
+    return next_item
+
+
+def pipeline_cases(sizes: List[int], ks: List[int], workdir: str) -> Dict[str, Callable[[], Any]]:
+    """Benchmark name -> zero-argument callable, building the corpora in workdir."""
+    requests = make_requests()
+    queries = [build_query(**r) for r in requests]
+    next_request = _cycle(requests)
+    next_query = _cycle(queries)
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "build_query": lambda: build_query(**next_request()),
+        "validate_recipe_json[valid]": lambda: validate_recipe_json(VALID_OUTPUT),
+        "validate_recipe_json[invalid]": lambda: validate_recipe_json(INVALID_OUTPUT),
+    }
+
+    retrieved_by_k: Dict[int, List[List[Dict[str, Any]]]] = {}
+    for n in sizes:
+        paths = build_corpus(os.path.join(workdir, f"corpus_{n}"), n=n)
+        engine = SearchEngine(**paths, model=HashingEncoder(), emb_cache_size=0, emb_cache_path=None)
+        engine.load()
+        query_emb = engine.encode(queries)
+        next_vector = _cycle(list(range(len(queries))))
+
+        if n == sizes[0]:
+            cases["search.encode"] = lambda engine=engine: engine.encode([next_query()])
+
+        for k in ks:
+            hits = [found["vector"][0] for found in engine.candidates(query_emb, queries, k, lexical=False)]
+            next_hits = _cycle(hits)
+
+            # Loop variables are bound as defaults: the closures outlive the loop.
+            def index_search(engine=engine, k=k, query_emb=query_emb, next_vector=next_vector):
+                i = next_vector()
+                return engine.candidates(query_emb[i : i + 1], queries[i : i + 1], k, lexical=False)
+
+            cases[f"search.index[n={n},k={k}]"] = index_search
+            cases[f"search.materialize[n={n},k={k}]"] = (
+                lambda engine=engine, next_hits=next_hits: engine.materialize(next_hits())
+            )
+            cases[f"search_recipes[n={n},k={k}]"] = (
+                lambda engine=engine, k=k: engine.search(next_query(), k=k)
+            )
+            if n == sizes[0]:
+                retrieved_by_k[k] = [engine.search(q, k=k) for q in queries]
+
+    for k, retrieved in retrieved_by_k.items():
+        users = [UserRequest(**r) for r in requests]
+        pairs = list(zip(users, retrieved))
+        next_retrieved = _cycle(retrieved)
+        next_pair = _cycle(pairs)
+        cases[f"format_retrieved[k={k}]"] = lambda next_retrieved=next_retrieved: format_retrieved(next_retrieved())
+        cases[f"build_rag_prompt[k={k}]"] = lambda next_pair=next_pair: build_rag_prompt(*next_pair())
+        cases[f"estimate_nutrition[k={k}]"] = (
+            lambda next_retrieved=next_retrieved: estimate_nutrition_from_retrieved(next_retrieved())
+        )
+    return cases
+
+
+def run_benchmarks(
+    sizes: List[int] = SIZES,
+    ks: List[int] = KS,
+    only: Optional[str] = None,
+    min_time: float = 0.02,
+    repeat: int = 7,
+    names: Optional[List[str]] = None,
+    workdir: Optional[str] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time every case in this process (whose name contains only, or is in
+    names, if given); returns name -> timings.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = pipeline_cases(sizes, ks, workdir or tmp)
+        results = {}
+        for name, fn in cases.items():
+            if (only and only not in name) or (names and name not in names):
+                continue
+            results[name] = measure(fn, min_time=min_time, repeat=repeat)
+    return results
+
+
+def run_in_processes(processes: int, args: List[str], names: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Run the benchmarks in fresh interpreters and keep each one's best
+    result: timings shift between processes (memory layout, hash seeds)
+    more than between rounds inside one.
+    """
+    best: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(processes):
+            out = os.path.join(tmp, f"worker_{i}.json")
+            cmd = [sys.executable, "-m", "benchmarks.bench_pipeline", *args, "--worker", out]
+            if names:
+                cmd += ["--names", *names]
+            subprocess.run(cmd, cwd=BASE_DIR, check=True, stderr=subprocess.DEVNULL)
+            with open(out, "r", encoding="utf-8") as f:
+                for name, timing in json.load(f).items():
+                    if name not in best or timing["min_us"] < best[name]["min_us"]:
+                        best[name] = timing
+    return best
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baselines: Dict[str, Dict[str, float]],
+    threshold: float = THRESHOLD,
+    min_delta_us: float = 1.0,
+) -> List[Dict[str, Any]]:
+    """
+    One row per result: best-round time, baseline, ratio and status
+    ("ok", "faster", "regression" or "new"). A regression is slower than
+    the baseline by more than threshold (relative) and min_delta_us
+    (absolute).
+    """
+    rows = []
+    for name, timing in results.items():
+        current = timing["min_us"]
+        base = baselines.get(name, {}).get("min_us")
+        row = {"name": name, "us": current, "baseline_us": base, "ratio": None, "status": "new"}
+        if base:
+            ratio = current / base
+            row["ratio"] = round(ratio, 3)
+            if ratio > 1 + threshold and current - base > min_delta_us:
+                row["status"] = "regression"
+            elif ratio < 1 / (1 + threshold):
+                row["status"] = "faster"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def load_baselines(path: str = BASELINES_PATH) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baselines(results: Dict[str, Dict[str, float]], path: str = BASELINES_PATH, merge: bool = True) -> None:
+    """Write results as the new baselines (kept entries: those not re-run, when merge)."""
+    merged = dict(load_baselines(path)) if merge else {}
+    merged.update(results)
+    payload = {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "recorded": time.strftime("%Y-%m-%d"),
+        "results": dict(sorted(merged.items())),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.write("\n")
+
+
+def print_report(rows: List[Dict[str, Any]], threshold: float) -> None:
+    print(f"{'benchmark':<42} {'us / call':>12} {'baseline us':>12} {'ratio':>7}  status")
+    for row in rows:
+        base = f"{row['baseline_us']:.1f}" if row["baseline_us"] else "-"
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+        print(f"{row['name']:<42} {row['us']:>12.1f} {base:>12} {ratio:>7}  {row['status']}")
+    regressions = [r for r in rows if r["status"] == "regression"]
+    print(f"\n{len(rows)} benchmarks, {len(regressions)} regressions (threshold +{threshold:.0%})")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pipeline microbenchmarks against stored baselines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="corpus sizes")
+    parser.add_argument("--k", type=int, nargs="+", default=KS, help="retrieved recipes per query")
+    parser.add_argument("--only", default=None, help="run benchmarks whose name contains this")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta-us", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--repeat", type=int, default=7, help="timed rounds per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.02, help="seconds per round (at least)")
+    parser.add_argument("--processes", type=int, default=3, help="interpreters to run the suite in")
+    parser.add_argument("--confirm", type=int, default=2, help="re-runs of apparent regressions")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update", action="store_true", help="record the results as the baselines")
+    parser.add_argument("--output", default=None, help="also write the results as JSON here")
+    # Internal: one worker process of run_in_processes.
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--names", nargs="+", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        results = run_benchmarks(args.sizes, args.k, args.only, args.min_time, args.repeat, args.names)
+        with open(args.worker, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+        return 0
+
+    common = ["--sizes", *map(str, args.sizes), "--k", *map(str, args.k)]
+    common += ["--min-time", str(args.min_time), "--repeat", str(args.repeat)]
+    if args.only:
+        common += ["--only", args.only]
+
+    baselines = load_baselines(args.baselines)
+    results = run_in_processes(args.processes, common)
+    rows = compare(results, baselines, args.threshold, args.min_delta_us)
+    for _ in range(0 if args.update else args.confirm):
+        suspects = [row["name"] for row in rows if row["status"] == "regression"]
+        if not suspects:
+            break
+        for name, timing in run_in_processes(args.processes, common, suspects).items():
+            if timing["min_us"] < results[name]["min_us"]:
+                results[name] = timing
+        rows = compare(results, baselines, args.threshold, args.min_delta_us)
+    print_report(rows, args.threshold)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"threshold": args.threshold, "results": rows}, f, indent=2)
+    if args.update:
+        save_baselines(results, args.baselines)
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    return 1 if any(r["status"] == "regression" for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
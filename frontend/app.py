@@ -1,4 +1,5 @@
 import os
+import json
 import requests
 import streamlit as st
 
@@ -174,6 +175,48 @@ def call_backend_generate(
     return resp.json()
 
 
+def call_backend_generate_stream(
+    ingredients: list[str], diet: str | None, cuisine: str | None, k: int, placeholder
+):
+    """
+    Call /generate_recipe/stream and show the model output in `placeholder`
+    while it is being written. Returns the final result (same shape as
+    /generate_recipe).
+    """
+    payload = {"ingredients": ingredients, "diet": diet, "cuisine": cuisine, "k": k}
+    partial = ""
+    result = None
+
+    with requests.post(
+        f"{BACKEND_URL}/generate_recipe/stream", json=payload, stream=True, timeout=(10, 300)
+    ) as resp:
+        resp.raise_for_status()
+        event = "message"
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+
+            data = json.loads(line[len("data:"):].strip())
+            if event == "token":
+                partial += data.get("text", "")
+                placeholder.code(partial, language="json")
+            elif event == "retry":
+                partial = ""
+                placeholder.info("Almost there – CookMate is tidying up the recipe format...")
+            elif event == "result":
+                result = data
+
+    placeholder.empty()
+    if result is None:
+        raise RuntimeError("the stream ended before the final recipe arrived")
+    return result
+
+
 def render_pills(items, prefix_icon=""):
     if not items:
         return
@@ -398,8 +441,11 @@ with generate_tab:
             st.error("Please enter at least one ingredient before generating a recipe.")
         else:
             with st.spinner("Creating your recipe..."):
+                live_output = st.empty()
                 try:
-                    data = call_backend_generate(ingredients, diet, cuisine, k)
+                    data = call_backend_generate_stream(
+                        ingredients, diet, cuisine, k, live_output
+                    )
                 except Exception as e:
                     st.error(f"Generation request failed: {e}")
                 else:
@@ -0,0 +1,326 @@
+"""
+Approximate-nearest-neighbour index variants for recipe retrieval.
+
+build_index() turns recipe_embeddings.npy into one of
+
+    flat       exact inner product (IndexFlatIP), what the notebooks build
+    ivf_flat   inverted lists over full vectors (IndexIVFFlat)
+    ivfpq      inverted lists over product-quantized codes (IndexIVFPQ),
+               m bytes per vector instead of 4 * dim
+    hnsw       graph index over full vectors (IndexHNSWFlat)
+
+and evaluate() measures recall@k against exact search, single-query
+latency and serialized size, for a range of nprobe / efSearch values.
+
+The command line builds the requested variants, writes each next to
+faiss_index.bin (flat keeps that name, the others get a suffix) and
+writes a JSON report. Index files that already exist, such as the
+production faiss_index.bin, are kept unless --force is given:
+
+    python -m rag_pipeline.ann_index --types flat,ivf_flat,ivfpq,hnsw
+
+search.py loads the variant named by COOKMATE_INDEX_TYPE (memory-mapped,
+see read_index) and tunes it with COOKMATE_NPROBE / COOKMATE_EF_SEARCH
+(configure_index and search_parameters below).
+"""
+import os
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger("cookmate-backend")
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+EMB_PATH = os.path.join(BASE_DIR, "embeddings", "recipe_embeddings.npy")
+INDEX_DIR = os.path.join(BASE_DIR, "embeddings")
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivfpq", "hnsw")
+
+# Rows used to train IVF centroids and PQ codebooks.
+MAX_TRAIN = 100_000
+
+
+def index_path(index_type: str, index_dir: str = INDEX_DIR) -> str:
+    """faiss_index.bin for flat, faiss_index_<type>.bin for the others."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    name = "faiss_index.bin" if index_type == "flat" else f"faiss_index_{index_type}.bin"
+    return os.path.join(index_dir, name)
+
+
+def default_nlist(n: int) -> int:
+    """About 4 * sqrt(n) inverted lists, with at least 39 training points each."""
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str,
+    nlist: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    seed: int = 0,
+):
+    """Build and fill an inner-product index of the given type."""
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n, dim = embeddings.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type in ("ivf_flat", "ivfpq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            pq_m = pq_m or max(1, dim // 8)
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding size {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+
+        rng = np.random.default_rng(seed)
+        train = embeddings
+        if n > MAX_TRAIN:
+            train = embeddings[np.sort(rng.choice(n, MAX_TRAIN, replace=False))]
+        index.train(train)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+    index.add(embeddings)
+    return index
+
+
+def read_index(path: str, mmap: bool = False):
+    """
+    Load an index. With mmap, its vectors (flat codes, inverted lists,
+    HNSW storage) are mapped from the file instead of copied into the
+    process, so every worker on a host shares one page-cache copy.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    # IO_FLAG_MMAP_IFC maps in place for every index type we build; older
+    # Faiss only has IO_FLAG_MMAP, which maps IVF lists but copies flat codes.
+    return faiss.read_index(path, getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP))
+
+
+def configure_index(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Set the default search-time knob of an IVF (nprobe) or HNSW (efSearch) index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = int(nprobe)
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = int(ef_search)
+
+
+def search_parameters(
+    index,
+    selector=None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+):
+    """
+    SearchParameters of the type index.search expects (IVF indexes reject
+    the generic class), carrying an optional IDSelector and the tuning
+    knobs. Returns None when there is nothing to pass.
+    """
+    kwargs: Dict[str, Any] = {}
+    if selector is not None:
+        kwargs["sel"] = selector
+
+    if faiss.try_extract_index_ivf(index) is not None:
+        if nprobe:
+            kwargs["nprobe"] = int(nprobe)
+        params = faiss.SearchParametersIVF(**kwargs) if kwargs else None
+    elif isinstance(index, faiss.IndexHNSW):
+        if ef_search:
+            kwargs["efSearch"] = int(ef_search)
+        params = faiss.SearchParametersHNSW(**kwargs) if kwargs else None
+    else:
+        params = faiss.SearchParameters(**kwargs) if kwargs else None
+
+    if params is not None and selector is not None:
+        # Keep the selector (and whatever it points into) alive with params.
+        params._cookmate_refs = getattr(selector, "_cookmate_refs", None), selector
+    return params
+
+
+def index_bytes(index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).size)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def evaluate(
+    index,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    k: int = 10,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    recall@k of index against ground_truth (exact top-k ids per query),
+    plus single-query latency in milliseconds.
+    """
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+
+    _, found = index.search(queries, k, params=params)
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, ground_truth))
+    recall = hits / float(ground_truth.size)
+
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        f"recall@{k}": round(recall, 4),
+        "latency_ms": {
+            "mean": round(float(np.mean(latencies)), 3),
+            "p50": round(_percentile(latencies, 50), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+        },
+    }
+
+
+def sample_queries(embeddings: np.ndarray, n: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """
+    Evaluation queries: random recipe vectors with Gaussian noise,
+    re-normalized, so a query is near but not identical to its source row.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), min(n, len(embeddings)), replace=False)
+    queries = embeddings[rows] + rng.normal(0, noise, (len(rows), embeddings.shape[1])).astype("float32")
+    faiss.normalize_L2(queries)
+    return np.ascontiguousarray(queries, dtype="float32")
+
+
+def load_queries(path: str) -> np.ndarray:
+    """Query vectors from an .npy file or a saved embedding cache (.npz with "vectors")."""
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=False) as data:
+            queries = data["vectors"]
+    else:
+        queries = np.load(path)
+    return np.ascontiguousarray(queries, dtype="float32")
+
+
+def _parse_ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build Faiss index variants and report recall/latency/memory.")
+    parser.add_argument("--embeddings", default=EMB_PATH, help="recipe_embeddings.npy")
+    parser.add_argument("--output-dir", default=INDEX_DIR, help="where index files and the report go")
+    parser.add_argument("--types", default="flat,ivf_flat,ivfpq,hnsw", help="comma-separated index types")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=None, help="PQ sub-quantizers (default dim/8)")
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF nprobe values to evaluate")
+    parser.add_argument("--ef-search", default="16,64,256", help="HNSW efSearch values to evaluate")
+    parser.add_argument("--k", type=int, default=10, help="k for recall@k")
+    parser.add_argument("--queries", type=int, default=500, help="number of sampled evaluation queries")
+    parser.add_argument("--queries-file", default=None, help=".npy or embedding-cache .npz of real query vectors")
+    parser.add_argument("--report", default=None, help="report path (default: <output-dir>/index_report.json)")
+    parser.add_argument("--no-save", action="store_true", help="only evaluate, do not write index files")
+    parser.add_argument("--force", action="store_true", help="overwrite index files that already exist")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    embeddings = np.ascontiguousarray(np.load(args.embeddings), dtype="float32")
+    n, dim = embeddings.shape
+    k = min(args.k, n)
+
+    if args.queries_file:
+        queries = load_queries(args.queries_file)
+    else:
+        queries = sample_queries(embeddings, args.queries)
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(embeddings)
+    _, ground_truth = exact.search(queries, k)
+
+    report: Dict[str, Any] = {
+        "embeddings": args.embeddings,
+        "n": n,
+        "dim": dim,
+        "k": k,
+        "queries": len(queries),
+        "indexes": {},
+    }
+
+    for index_type in [t.strip() for t in args.types.split(",") if t.strip()]:
+        start = time.perf_counter()
+        index = build_index(
+            embeddings,
+            index_type,
+            nlist=args.nlist,
+            pq_m=args.pq_m,
+            pq_nbits=args.pq_nbits,
+            hnsw_m=args.hnsw_m,
+            ef_construction=args.ef_construction,
+        )
+        build_seconds = time.perf_counter() - start
+
+        if index_type in ("ivf_flat", "ivfpq"):
+            settings = [{"nprobe": p} for p in _parse_ints(args.nprobe)]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": e} for e in _parse_ints(args.ef_search)]
+        else:
+            settings = [{}]
+
+        entry = {
+            "build_seconds": round(build_seconds, 2),
+            "bytes": index_bytes(index),
+            "bytes_per_vector": round(index_bytes(index) / max(n, 1), 1),
+            "results": [evaluate(index, queries, ground_truth, k=k, **s) for s in settings],
+        }
+        if not args.no_save:
+            path = index_path(index_type, args.output_dir)
+            if os.path.exists(path) and not args.force:
+                logger.info("INDEX | keeping existing %s (pass --force to overwrite)", path)
+                entry["kept_existing"] = True
+            else:
+                faiss.write_index(index, path)
+            entry["path"] = path
+        report["indexes"][index_type] = entry
+
+        for result in entry["results"]:
+            knob = "" if not (result["nprobe"] or result["ef_search"]) else (
+                f" nprobe={result['nprobe']}" if result["nprobe"] else f" efSearch={result['ef_search']}"
+            )
+            logger.info(
+                "INDEX | %-8s%s recall@%d=%.4f p50=%.3fms p99=%.3fms size=%.1f MB",
+                index_type, knob, k, result[f"recall@{k}"],
+                result["latency_ms"]["p50"], result["latency_ms"]["p99"], entry["bytes"] / 1e6,
+            )
+
+    report_path = args.report or os.path.join(args.output_dir, "index_report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info("INDEX | report written to %s", report_path)
+
+
+if __name__ == "__main__":
+    main()
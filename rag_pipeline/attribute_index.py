@@ -0,0 +1,288 @@
+"""
+Per-attribute row bitsets for pre-filtered retrieval.
+
+For every recipe in the compiled store this module precomputes which
+attributes it has:
+
+    diet:vegetarian, diet:vegan, diet:gluten-free
+                        derived from the ingredient names
+    category:<name>     RecipeCategory
+    keyword:<name>      every Keywords tag (cuisines such as "Italian" or
+                        "Asian" are keyword tags in the dataset)
+
+Each attribute is one bitset over store rows, packed with
+np.packbits(bitorder="little") so it can be handed directly to
+faiss.IDSelectorBitmap: the filtered top-k then comes straight out of
+index.search instead of over-fetching and post-filtering.
+
+The bitsets live next to the recipe store (attributes.npz in the store
+directory) and are rebuilt when the store changes. Build them offline
+with:
+
+    python -m rag_pipeline.attribute_index
+"""
+import os
+import json
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import faiss
+
+from rag_pipeline.recipe_store import RecipeStore, STORE_DIR, build_lock, temp_path_for
+from rag_pipeline.lexical_index import tokenize
+from rag_pipeline.cache import LRUCache
+
+logger = logging.getLogger("cookmate-backend")
+
+ATTRIBUTES_FILE = "attributes.npz"
+ATTRIBUTES_VERSION = 1
+
+DIETS = ("vegetarian", "vegan", "gluten-free")
+
+# Combined masks kept per (diet, cuisine) filter.
+MASK_CACHE_SIZE = int(os.getenv("COOKMATE_MASK_CACHE_SIZE", "256"))
+# Filter key of every cuisine that is not a known tag.
+UNKNOWN_CUISINE = "<unknown>"
+
+MEAT_FISH = {
+    "beef", "pork", "chicken", "turkey", "lamb", "bacon", "ham", "sausage",
+    "veal", "duck", "goose", "venison", "prosciutto", "pepperoni", "salami",
+    "chorizo", "steak", "meat", "gelatin", "anchovy", "fish", "salmon",
+    "tuna", "cod", "shrimp", "prawn", "crab", "lobster", "clam", "mussel",
+    "oyster", "scallop", "squid", "sardine", "halibut", "tilapia", "trout",
+    "mackerel", "lard",
+}
+ANIMAL_PRODUCTS = {
+    "egg", "milk", "butter", "cheese", "cream", "yogurt", "yoghurt", "honey",
+    "mayonnaise", "buttermilk", "ghee", "whey", "parmesan", "mozzarella",
+    "cheddar", "ricotta", "feta",
+}
+GLUTEN = {
+    "flour", "wheat", "bread", "breadcrumb", "pasta", "spaghetti", "noodle",
+    "macaroni", "barley", "rye", "couscous", "cracker", "semolina", "bulgur",
+    "seitan", "beer", "penne", "lasagna", "fettuccine", "linguine", "orzo",
+    "panko", "tortilla", "biscuit", "cookie", "pretzel",
+}
+# Words that make an otherwise excluded ingredient fine
+# ("peanut butter", "coconut milk", "rice flour", "gluten-free pasta").
+PLANT_QUALIFIERS = {"peanut", "almond", "coconut", "soy", "oat", "cashew", "rice", "vegan", "tartar"}
+GLUTEN_FREE_QUALIFIERS = {"gluten", "rice", "corn", "almond", "coconut", "buckwheat", "tapioca", "potato", "chickpea"}
+
+
+def normalize_attribute(value: Optional[str]) -> str:
+    return " ".join(str(value or "").lower().replace("_", " ").split())
+
+
+def normalize_diet(diet: Optional[str]) -> Optional[str]:
+    """One of DIETS, or None for "none"/unknown diets."""
+    value = normalize_attribute(diet).replace(" ", "-")
+    if value in ("glutenfree", "gluten-free"):
+        return "gluten-free"
+    return value if value in DIETS else None
+
+
+def _excluded(tokens: Set[str], banned: Set[str], qualifiers: Set[str]) -> bool:
+    return bool(tokens & banned) and not (tokens & qualifiers)
+
+
+def diet_flags(ingredients: List[str]) -> Dict[str, bool]:
+    """Which DIETS a recipe with these ingredient names is compatible with."""
+    vegetarian = vegan = gluten_free = True
+    for name in ingredients:
+        tokens = set(tokenize(name))
+        if tokens & MEAT_FISH:
+            vegetarian = vegan = False
+        if _excluded(tokens, ANIMAL_PRODUCTS, PLANT_QUALIFIERS):
+            vegan = False
+        if _excluded(tokens, GLUTEN, GLUTEN_FREE_QUALIFIERS):
+            gluten_free = False
+    return {"vegetarian": vegetarian, "vegan": vegan, "gluten-free": gluten_free}
+
+
+def attributes_path(store_dir: str = STORE_DIR) -> str:
+    return os.path.join(store_dir, ATTRIBUTES_FILE)
+
+
+def build_attribute_index(store: RecipeStore, out_path: Optional[str] = None) -> str:
+    """Compute the attribute bitsets for every store row and save them."""
+    out_path = out_path or attributes_path(store.store_dir)
+    n = len(store)
+    rows: Dict[str, List[int]] = {f"diet:{d}": [] for d in DIETS}
+
+    for row in range(n):
+        for diet, ok in diet_flags(store.list("ingredients_list", row)).items():
+            if ok:
+                rows[f"diet:{diet}"].append(row)
+        category = normalize_attribute(store.text("category", row))
+        if category:
+            rows.setdefault(f"category:{category}", []).append(row)
+        for keyword in {normalize_attribute(k) for k in store.list("keywords", row)}:
+            if keyword:
+                rows.setdefault(f"keyword:{keyword}", []).append(row)
+
+    names = sorted(rows)
+    bits = np.zeros((len(names), (n + 7) // 8), dtype="uint8")
+    for i, name in enumerate(names):
+        dense = np.zeros(n, dtype=bool)
+        dense[rows[name]] = True
+        bits[i] = np.packbits(dense, bitorder="little")
+
+    tmp_path = temp_path_for(out_path, ".tmp.npz")
+    try:
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps({"version": ATTRIBUTES_VERSION, "n_docs": n})),
+            names=np.array(names),
+            bits=bits,
+        )
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info("ATTRIBUTES | %d bitsets over %d recipes -> %s", len(names), n, out_path)
+    return out_path
+
+
+class AttributeIndex:
+    """
+    Loaded attribute bitsets. mask() combines the ones a request asks for;
+    selector() wraps a mask for faiss index.search.
+    """
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.meta = json.loads(str(data["meta"]))
+            names = data["names"].tolist()
+            self.bits = data["bits"]
+        self.n_docs = int(self.meta["n_docs"])
+        self.rows = {name: i for i, name in enumerate(names)}
+        self._masks = LRUCache(max_size=MASK_CACHE_SIZE)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def bitset(self, name: str) -> Optional[np.ndarray]:
+        row = self.rows.get(name)
+        return None if row is None else self.bits[row]
+
+    @staticmethod
+    def count(mask: np.ndarray) -> int:
+        return int(np.unpackbits(mask, bitorder="little").sum())
+
+    def _cuisine_bitset(self, cuisine: str) -> Optional[np.ndarray]:
+        found = [b for b in (self.bitset(f"keyword:{cuisine}"), self.bitset(f"category:{cuisine}")) if b is not None]
+        if not found:
+            return None
+        return np.bitwise_or.reduce(found) if len(found) > 1 else found[0]
+
+    def filter_key(self, diet: Optional[str], cuisine: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Canonical (diet, cuisine) of a request: a known diet or None, and a
+        known cuisine tag, None (no cuisine) or UNKNOWN_CUISINE. Requests
+        with the same key get the same mask.
+        """
+        cuisine_key = normalize_attribute(cuisine)
+        if not cuisine_key or cuisine_key == "none":
+            cuisine_tag = None
+        elif f"keyword:{cuisine_key}" in self.rows or f"category:{cuisine_key}" in self.rows:
+            cuisine_tag = cuisine_key
+        else:
+            cuisine_tag = UNKNOWN_CUISINE
+        return normalize_diet(diet), cuisine_tag
+
+    def mask(self, diet: Optional[str], cuisine: Optional[str]) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+        """
+        Packed bitmap of rows allowed for a request, or None for no filter,
+        plus a description of what was applied.
+
+        Diet is a hard constraint. Cuisine narrows the diet-compatible rows
+        only when it is a known tag and leaves at least one row; otherwise
+        it is ignored (and reported as such).
+        """
+        key = self.filter_key(diet, cuisine)
+        cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+
+        diet_key, cuisine_key = key
+        mask = self.bitset(f"diet:{diet_key}") if diet_key else None
+        info: Dict[str, Any] = {"diet": diet_key, "cuisine": None}
+
+        if cuisine_key == UNKNOWN_CUISINE:
+            info["cuisine_ignored"] = "unknown cuisine"
+        elif cuisine_key:
+            cuisine_bits = self._cuisine_bitset(cuisine_key)
+            combined = cuisine_bits if mask is None else mask & cuisine_bits
+            if self.count(combined) > 0:
+                mask = combined
+                info["cuisine"] = cuisine_key
+            else:
+                info["cuisine_ignored"] = "no matching recipes"
+
+        if mask is not None:
+            mask = np.ascontiguousarray(mask)
+            info["allowed"] = self.count(mask)
+
+        self._masks.put(key, (mask, info))
+        return mask, info
+
+    def selector(self, mask: np.ndarray) -> faiss.IDSelectorBitmap:
+        """
+        IDSelectorBitmap restricting a search to the ids set in mask; pass
+        it to index.search through ann_index.search_parameters.
+        """
+        selector = faiss.IDSelectorBitmap(len(mask) * 8, faiss.swig_ptr(mask))
+        # The selector points into mask's buffer; keep it alive with the selector.
+        selector._cookmate_refs = mask
+        return selector
+
+    @staticmethod
+    def allows(mask: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Boolean array: which of rows are set in mask."""
+        rows = np.asarray(rows, dtype="int64")
+        inside = rows < len(mask) * 8
+        out = np.zeros(len(rows), dtype=bool)
+        r = rows[inside]
+        out[inside] = (mask[r >> 3] >> (r & 7)) & 1 == 1
+        return out
+
+
+def _is_current(store: RecipeStore, path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+        return meta.get("version") == ATTRIBUTES_VERSION and meta.get("n_docs") == len(store)
+    except Exception as e:
+        logger.warning("ATTRIBUTES | could not read %s: %r", path, e)
+        return False
+
+
+def open_or_build(store: RecipeStore, path: Optional[str] = None) -> AttributeIndex:
+    """Open the store's attribute bitsets, building them first if missing or stale."""
+    path = path or attributes_path(store.store_dir)
+    if not _is_current(store, path):
+        with build_lock(path):
+            # Another worker may have built it while we waited.
+            if not _is_current(store, path):
+                logger.warning("ATTRIBUTES | no current bitsets at %s, building them (one-off)", path)
+                build_attribute_index(store, path)
+    return AttributeIndex(path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build diet/cuisine/category/keyword bitsets for a recipe store.")
+    parser.add_argument("--store", default=STORE_DIR, help="compiled recipe store directory")
+    parser.add_argument("--output", default=None, help=f"bitset file (default: <store>/{ATTRIBUTES_FILE})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    build_attribute_index(RecipeStore(args.store), args.output)
+
+
+if __name__ == "__main__":
+    main()
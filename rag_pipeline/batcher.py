@@ -0,0 +1,164 @@
+"""
+Dynamic micro-batching for retrieval.
+
+Concurrent callers of search_recipes each need one encode and one FAISS
+search. MicroBatcher puts their queries on a queue; a single worker thread
+takes the first waiting query, keeps collecting for up to window_ms (or
+until max_batch_size queries are waiting), runs one batched search for all
+of them and hands each caller its own results.
+"""
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("cookmate-backend")
+
+# (queries, k) or (queries, k, filters) -> one result list per query
+SearchBatchFn = Callable[..., List[List[Dict[str, Any]]]]
+Filters = Optional[Dict[str, Optional[str]]]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[pos]
+
+
+class MicroBatcher:
+    """
+    Coalesces single-query searches into batched searches.
+
+    search_batch_fn: function(queries, k[, filters]) -> one result list per
+                     query, e.g. SearchEngine.search_batch. filters (one
+                     dict or None per query) is only passed when a caller
+                     in the batch asked for filtering.
+    window_ms:       how long the first query of a batch waits for company
+    max_batch_size:  a batch is dispatched as soon as it has this many queries
+    """
+
+    def __init__(self, search_batch_fn: SearchBatchFn, window_ms: float = 5.0, max_batch_size: int = 32):
+        self.search_batch_fn = search_batch_fn
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue: "queue.Queue[Tuple[str, int, Filters, Future, float]]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self._waits_ms: "deque[float]" = deque(maxlen=2048)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="cookmate-search-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, query: str, k: int = 5, filters: Filters = None) -> Future:
+        """Queue one query; the returned future resolves to its result list."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((query, k, filters, future, time.perf_counter()))
+        return future
+
+    def search(self, query: str, k: int = 5, filters: Filters = None) -> List[Dict[str, Any]]:
+        return self.submit(query, k, filters).result()
+
+    def _collect(self) -> List[Tuple[str, int, Filters, Future, float]]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[4] + self.window_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window is over; still take anything already waiting.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    @staticmethod
+    def _settle(future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        # Never let one caller's future take the worker thread down.
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            logger.warning("BATCHER | could not resolve a search future: %r", e)
+
+    def _run(self) -> None:
+        while True:
+            # Callers that gave up (cancelled futures, e.g. a client that
+            # disconnected) are dropped; the rest can no longer be cancelled.
+            batch = [item for item in self._collect() if item[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                for _, _, _, _, enqueued in batch:
+                    self._waits_ms.append((started - enqueued) * 1000.0)
+
+            queries = [item[0] for item in batch]
+            k_max = max(item[1] for item in batch)
+            filters = [item[2] for item in batch]
+
+            try:
+                if any(filters):
+                    results = self.search_batch_fn(queries, k_max, filters)
+                else:
+                    results = self.search_batch_fn(queries, k_max)
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"batched search returned {len(results)} result lists for {len(batch)} queries"
+                    )
+                hits = [result[:k] for (_, k, _, _, _), result in zip(batch, results)]
+            except Exception as e:
+                logger.error("BATCHER | batched search of %d queries failed: %r", len(batch), e)
+                for _, _, _, future, _ in batch:
+                    self._settle(future, error=e)
+                continue
+
+            for (_, _, _, future, _), result in zip(batch, hits):
+                self._settle(future, result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits = list(self._waits_ms)
+            return {
+                "window_ms": self.window_ms,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "requests": self.requests,
+                "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "queue_wait_ms": {
+                    "p50": round(_percentile(waits, 50), 3),
+                    "p99": round(_percentile(waits, 99), 3),
+                    "max": round(max(waits), 3) if waits else 0.0,
+                },
+                "queued": self._queue.qsize(),
+            }
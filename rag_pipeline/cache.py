@@ -0,0 +1,246 @@
+"""
+In-process caches for the RAG pipeline.
+
+LRUCache is a bounded, thread-safe least-recently-used mapping with
+hit/miss counters and an optional time-to-live. EmbeddingCache builds on
+it to keep query embeddings, keyed by the normalized query string from
+build_query; ResultCache keeps validated generate_recipe results, keyed by
+a canonical form of the request. Both can persist to disk so a restarted
+worker starts warm.
+"""
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("cookmate-backend")
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache. All operations take a lock, so one
+    instance can be shared by the request threads of a worker.
+    max_size=0 disables the cache (every lookup is a miss).
+    ttl (seconds), if set, expires entries that old; an expired entry
+    counts as a miss.
+
+    Entries are stored as (expires_at, value), expires_at being a
+    time.time() timestamp or None.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        if expires_at is None and self.ttl:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> List[Any]:
+        """Snapshot of (key, expires_at, value), least recently used first."""
+        with self._lock:
+            return [(key, exp, value) for key, (exp, value) in self._data.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def normalize_query(text: str) -> str:
+    """
+    Cache key for a query string: lower-cased with whitespace collapsed.
+    all-MiniLM-L6-v2 uses an uncased tokenizer, so this does not change
+    the embedding.
+    """
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU cache of query embeddings keyed by normalize_query(query).
+
+    If path is set, save() writes the cache to an .npz file and the
+    constructor loads it back. The file records the model name and is
+    ignored if it no longer matches.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None, model_name: str = ""):
+        super().__init__(max_size=max_size)
+        self.path = path
+        self.model_name = model_name
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, text: str, default: Any = None) -> Optional[np.ndarray]:
+        return super().get(normalize_query(text), default)
+
+    def put(self, text: str, value: np.ndarray) -> None:
+        super().put(normalize_query(text), value)
+
+    def load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name:
+                    logger.warning(
+                        "CACHE | ignoring %s: built for model %s", self.path, data["model_name"]
+                    )
+                    return
+                keys = data["keys"].tolist()
+                vectors = data["vectors"]
+        except Exception as e:
+            logger.warning("CACHE | could not load embedding cache %s: %r", self.path, e)
+            return
+
+        # Most recently used entries were saved last; keep the newest if the
+        # configured size shrank since.
+        start = max(0, len(keys) - self.max_size) if self.max_size > 0 else len(keys)
+        for key, vec in zip(keys[start:], vectors[start:]):
+            super().put(key, vec)
+        logger.info("CACHE | loaded %d query embeddings from %s", len(self), self.path)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        entries = self.items()
+        keys = [key for key, _, _ in entries]
+        vectors = [vec for _, _, vec in entries]
+
+        if not keys:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            model_name=np.array(self.model_name),
+            keys=np.array(keys),
+            vectors=np.vstack(vectors).astype("float32"),
+        )
+        os.replace(tmp_path, self.path)
+        logger.info("CACHE | saved %d query embeddings to %s", len(keys), self.path)
+
+
+def canonical_request_key(
+    pantry: List[str],
+    diet: Optional[str],
+    cuisine: Optional[str],
+    k: int,
+    model: str,
+) -> str:
+    """
+    Cache key for a generate_recipe request: the pantry lower-cased,
+    stripped, de-duplicated and sorted, plus diet, cuisine, k and model.
+    """
+    items = sorted({" ".join(str(x).lower().split()) for x in pantry if str(x).strip()})
+    return json.dumps(
+        [
+            items,
+            (diet or "").strip().lower(),
+            (cuisine or "").strip().lower(),
+            int(k),
+            model,
+        ],
+        separators=(",", ":"),
+    )
+
+
+class ResultCache(LRUCache):
+    """
+    TTL + LRU cache of successful generate_recipe results, keyed by
+    canonical_request_key(). Values are deep-copied on the way in and out,
+    so callers may modify what they get back.
+
+    If path is set, save() writes the live entries to a JSON file and the
+    constructor loads the ones that have not expired.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: Optional[float] = 3600, path: Optional[str] = None):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.path = path
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = super().get(key)
+        return copy.deepcopy(value) if value is not None else default
+
+    def put(self, key: str, value: Dict[str, Any], expires_at: Optional[float] = None) -> None:
+        super().put(key, copy.deepcopy(value), expires_at=expires_at)
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.warning("CACHE | could not load result cache %s: %r", self.path, e)
+            return
+
+        now = time.time()
+        for key, expires_at, value in entries[-self.max_size:] if self.max_size > 0 else []:
+            if expires_at is None or expires_at > now:
+                super().put(key, value, expires_at=expires_at)
+        logger.info("CACHE | loaded %d generation results from %s", len(self), self.path)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        now = time.time()
+        entries = [
+            [key, exp, value] for key, exp, value in self.items() if exp is None or exp > now
+        ]
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+        logger.info("CACHE | saved %d generation results to %s", len(entries), self.path)
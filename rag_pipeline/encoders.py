@@ -0,0 +1,387 @@
+"""
+Query encoders for retrieval.
+
+Every backend embeds text with all-MiniLM-L6-v2 (mean pooling, L2
+normalized) and exposes the SentenceTransformer encode() signature the
+search engine uses:
+
+    torch       SentenceTransformer on PyTorch, fp32; what built the index
+    onnx        the same model exported to ONNX, run by ONNX Runtime
+    onnx_int8   the ONNX model with dynamically quantized int8 weights
+
+COOKMATE_ENCODER picks the backend and COOKMATE_ENCODER_THREADS caps its
+intra-op threads (0 = library default, one per core), so several uvicorn
+workers on a host do not each spin up a thread per core.
+
+The ONNX backends need onnxruntime (pip install onnxruntime) and a
+prepared model directory:
+
+    python -m rag_pipeline.encoders prepare
+
+downloads the ONNX export of the model with its tokenizer, quantizes it
+to int8 and checks both against the torch model (check_parity): cosine
+similarity of the embeddings and overlap of the top-k they retrieve from
+the Faiss index. The result is saved as parity.json; loading a backend
+whose check did not pass logs a warning. Compare backends on the queries
+in logs/backend.log with:
+
+    python -m rag_pipeline.encoders bench
+"""
+import os
+import re
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("cookmate-backend")
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODER_TYPES = ("torch", "onnx", "onnx_int8")
+
+ENCODER = os.getenv("COOKMATE_ENCODER", "torch")
+ENCODER_THREADS = int(os.getenv("COOKMATE_ENCODER_THREADS", "0"))
+ONNX_DIR = os.getenv("COOKMATE_ONNX_DIR") or os.path.join(BASE_DIR, "embeddings", "onnx")
+
+LOG_PATH = os.path.join(BASE_DIR, "logs", "backend.log")
+INDEX_PATH = os.path.join(BASE_DIR, "embeddings", "faiss_index.bin")
+
+ONNX_FILES = {"onnx": "model.onnx", "onnx_int8": "model_int8.onnx"}
+PARITY_FILE = "parity.json"
+
+# Parity thresholds: lowest cosine between a backend's embedding and the
+# torch one, and mean top-k overlap of what they retrieve from the index.
+PARITY_MIN_COSINE = 0.95
+PARITY_MIN_OVERLAP = 0.9
+
+# The tokenizer limit all-MiniLM-L6-v2 was trained with.
+MAX_LENGTH = 256
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average of the token vectors, padding excluded (sentence-transformers pooling)."""
+    mask = attention_mask[..., None].astype("float32")
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class TorchEncoder:
+    """SentenceTransformer on PyTorch (the model the index was built with)."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = MODEL_NAME, threads: int = 0):
+        # Imported here: pulling in torch is a large share of cold-start time.
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.threads = threads
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True, batch_size: int = 32, **kwargs) -> np.ndarray:
+        out = self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return out.astype("float32", copy=False)
+
+
+class OnnxEncoder:
+    """The model's ONNX export on ONNX Runtime, with the same tokenizer and pooling."""
+
+    def __init__(self, model_path: str, tokenizer_dir: str, threads: int = 0, backend: str = "onnx"):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The ONNX encoders need onnxruntime: pip install onnxruntime") from e
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+
+        self.backend = backend
+        self.threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True, batch_size: int = 32, **kwargs) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), 0), dtype="float32")
+        # Batches of similar length pad less.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            tokens = self.tokenizer(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+            feed = {name: tokens[name].astype("int64") for name in self.input_names if name in tokens}
+            if "token_type_ids" in self.input_names and "token_type_ids" not in feed:
+                feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+            hidden = self.session.run(None, feed)[0]
+            parts.append(mean_pool(hidden, tokens["attention_mask"]))
+
+        if parts:
+            pooled = np.concatenate(parts).astype("float32")
+            out = np.empty_like(pooled)
+            out[order] = pooled
+        return _l2_normalize(out) if normalize_embeddings else out
+
+
+def load_parity(onnx_dir: str = ONNX_DIR) -> Dict[str, Any]:
+    path = os.path.join(onnx_dir, PARITY_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_encoder(
+    backend: str = ENCODER,
+    model_name: str = MODEL_NAME,
+    threads: int = ENCODER_THREADS,
+    onnx_dir: str = ONNX_DIR,
+):
+    """Create the encoder for backend (one of ENCODER_TYPES)."""
+    if backend not in ENCODER_TYPES:
+        raise ValueError(f"Unknown encoder {backend!r}, expected one of {ENCODER_TYPES}")
+    if backend == "torch":
+        return TorchEncoder(model_name, threads=threads)
+
+    model_path = os.path.join(onnx_dir, ONNX_FILES[backend])
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(
+            f"No ONNX model at {model_path}; create it with python -m rag_pipeline.encoders prepare"
+        )
+    report = load_parity(onnx_dir).get(backend)
+    if not report or not report.get("ok"):
+        logger.warning(
+            "ENCODER | %s has no passing parity check against torch (%s); results may drift from the index",
+            backend, os.path.join(onnx_dir, PARITY_FILE),
+        )
+    return OnnxEncoder(model_path, onnx_dir, threads=threads, backend=backend)
+
+
+def check_parity(
+    candidate,
+    reference,
+    texts: Sequence[str],
+    index=None,
+    k: int = 10,
+    min_cosine: float = PARITY_MIN_COSINE,
+    min_overlap: float = PARITY_MIN_OVERLAP,
+) -> Dict[str, Any]:
+    """
+    Compare candidate's embeddings of texts with reference's: per-text
+    cosine similarity and, given the Faiss index, the mean overlap of the
+    top-k rows each embedding retrieves. ok is True when both are within
+    the thresholds.
+    """
+    a = candidate.encode(texts, normalize_embeddings=True)
+    b = reference.encode(texts, normalize_embeddings=True)
+    cosine = np.sum(_l2_normalize(a) * _l2_normalize(b), axis=1)
+
+    report: Dict[str, Any] = {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "ok": bool(cosine.min() >= min_cosine),
+    }
+    if index is not None:
+        k = min(k, index.ntotal)
+        _, found_a = index.search(np.ascontiguousarray(a, dtype="float32"), k)
+        _, found_b = index.search(np.ascontiguousarray(b, dtype="float32"), k)
+        overlap = float(np.mean([len(set(x) & set(y)) / k for x, y in zip(found_a, found_b)]))
+        report[f"overlap@{k}"] = round(overlap, 4)
+        report["ok"] = report["ok"] and overlap >= min_overlap
+    return report
+
+
+_LOGGED_QUERY = re.compile(r"RETRIEVAL \| query='(.*?)' \| top_k=")
+
+
+def load_logged_queries(path: str = LOG_PATH, limit: Optional[int] = None) -> List[str]:
+    """Queries of the RETRIEVAL lines in a backend log, in order (repeats kept)."""
+    queries = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _LOGGED_QUERY.search(line)
+            if match:
+                queries.append(match.group(1))
+                if limit and len(queries) >= limit:
+                    break
+    return queries
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(float(np.mean(values)), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def length_buckets(queries: Sequence[str]) -> Dict[str, List[str]]:
+    """Queries split at the 50th and 90th percentile of their word count."""
+    lengths = np.array([len(q.split()) for q in queries])
+    p50, p90 = np.percentile(lengths, [50, 90])
+    return {
+        f"short (<= {int(p50)} words)": [q for q, n in zip(queries, lengths) if n <= p50],
+        f"medium (<= {int(p90)} words)": [q for q, n in zip(queries, lengths) if p50 < n <= p90],
+        f"long (> {int(p90)} words)": [q for q, n in zip(queries, lengths) if n > p90],
+    }
+
+
+def benchmark(encoders: Dict[str, Any], queries: Sequence[str], batch_size: int = 32, warmup: int = 3) -> Dict[str, Any]:
+    """
+    Per encoder: single-query latency in milliseconds (the request path)
+    overall and per query-length bucket, and batch throughput.
+    """
+    queries = list(queries)
+    buckets = length_buckets(queries)
+    report: Dict[str, Any] = {
+        "queries": len(queries),
+        "words": _percentiles([len(q.split()) for q in queries]),
+        "encoders": {},
+    }
+
+    for name, encoder in encoders.items():
+        for q in queries[:warmup]:
+            encoder.encode([q])
+
+        latencies = {}
+        for q in queries:
+            start = time.perf_counter()
+            encoder.encode([q])
+            latencies[q] = (time.perf_counter() - start) * 1000.0
+
+        start = time.perf_counter()
+        encoder.encode(queries, batch_size=batch_size)
+        batch_seconds = time.perf_counter() - start
+
+        report["encoders"][name] = {
+            "latency_ms": _percentiles(list(latencies.values())),
+            "by_length": {
+                bucket: _percentiles([latencies[q] for q in members])
+                for bucket, members in buckets.items() if members
+            },
+            "batch_qps": round(len(queries) / max(batch_seconds, 1e-9), 1),
+        }
+    return report
+
+
+def prepare_onnx(model_name: str = MODEL_NAME, onnx_dir: str = ONNX_DIR) -> Dict[str, str]:
+    """
+    Download the model's ONNX export and tokenizer from the Hugging Face
+    hub into onnx_dir and write a dynamically quantized int8 copy.
+    """
+    from huggingface_hub import hf_hub_download, snapshot_download
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    os.makedirs(onnx_dir, exist_ok=True)
+    snapshot_download(
+        repo,
+        local_dir=onnx_dir,
+        allow_patterns=["config.json", "tokenizer*", "vocab.txt", "special_tokens_map.json"],
+    )
+    exported = hf_hub_download(repo, "onnx/model.onnx", local_dir=onnx_dir)
+
+    paths = {backend: os.path.join(onnx_dir, name) for backend, name in ONNX_FILES.items()}
+    os.replace(exported, paths["onnx"])
+    quantize_dynamic(paths["onnx"], paths["onnx_int8"], weight_type=QuantType.QInt8)
+    logger.info("ENCODER | ONNX models written to %s", onnx_dir)
+    return paths
+
+
+def _sample_texts(queries: List[str], store_dir: Optional[str], n: int, seed: int = 0) -> List[str]:
+    """Logged queries plus recipe titles and ingredient lists from the store."""
+    texts = list(dict.fromkeys(queries))[:n]
+    if store_dir and os.path.exists(store_dir):
+        from rag_pipeline.recipe_store import RecipeStore
+
+        store = RecipeStore(store_dir)
+        rng = np.random.default_rng(seed)
+        for row in rng.choice(len(store), min(n, len(store)), replace=False).tolist():
+            texts.append(f"Title: {store.text('title', row)}. Ingredients: {', '.join(store.list('ingredients_list', row))}")
+        store.close()
+    return texts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from rag_pipeline.recipe_store import STORE_DIR
+
+    parser = argparse.ArgumentParser(description="Prepare, check and benchmark the query encoders.")
+    parser.add_argument("command", choices=("prepare", "parity", "bench"))
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--onnx-dir", default=ONNX_DIR)
+    parser.add_argument("--backends", default=",".join(ENCODER_TYPES), help="comma-separated encoders")
+    parser.add_argument("--threads", type=int, default=ENCODER_THREADS, help="intra-op threads (0 = default)")
+    parser.add_argument("--log", default=LOG_PATH, help="backend log to take queries from")
+    parser.add_argument("--store", default=STORE_DIR, help="recipe store to sample parity texts from")
+    parser.add_argument("--index", default=INDEX_PATH, help="Faiss index for the top-k parity check")
+    parser.add_argument("--samples", type=int, default=500, help="texts per source for the parity check")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--report", default=None, help="benchmark report (default: <onnx-dir>/encoder_benchmark.json)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    queries = load_logged_queries(args.log) if os.path.exists(args.log) else []
+
+    if args.command == "prepare":
+        prepare_onnx(args.model, args.onnx_dir)
+
+    if args.command in ("prepare", "parity"):
+        import faiss
+
+        reference = load_encoder("torch", args.model, threads=args.threads)
+        index = faiss.read_index(args.index) if os.path.exists(args.index) else None
+        texts = _sample_texts(queries, args.store, args.samples)
+        parity = load_parity(args.onnx_dir)
+        for backend in [b for b in backends if b != "torch"]:
+            encoder = load_encoder(backend, args.model, threads=args.threads, onnx_dir=args.onnx_dir)
+            parity[backend] = check_parity(encoder, reference, texts, index=index)
+            logger.info("ENCODER | parity %s: %s", backend, parity[backend])
+        with open(os.path.join(args.onnx_dir, PARITY_FILE), "w", encoding="utf-8") as f:
+            json.dump(parity, f, indent=2)
+        return
+
+    if not queries:
+        raise SystemExit(f"No RETRIEVAL queries found in {args.log}")
+    encoders = {b: load_encoder(b, args.model, threads=args.threads, onnx_dir=args.onnx_dir) for b in backends}
+    report = benchmark(encoders, queries, batch_size=args.batch_size)
+    report["threads"] = args.threads
+
+    report_path = args.report or os.path.join(args.onnx_dir, "encoder_benchmark.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for name, entry in report["encoders"].items():
+        logger.info(
+            "ENCODER | %-9s p50=%.2fms p99=%.2fms batch=%.0f q/s",
+            name, entry["latency_ms"]["p50"], entry["latency_ms"]["p99"], entry["batch_qps"],
+        )
+    logger.info("ENCODER | report written to %s", report_path)
+
+
+if __name__ == "__main__":
+    main()
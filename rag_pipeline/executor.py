@@ -0,0 +1,46 @@
+"""
+Dedicated thread pool for the CPU-bound parts of a request (query
+encoding, FAISS search, row materialization, prompt formatting).
+
+Async endpoints hand that work to this pool with run_cpu(), so the event
+loop stays free to hold many pending LLM calls, and retrieval does not
+compete with them for the default threadpool.
+"""
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from rag_pipeline.tracing import profiled
+
+# Size of the pool; defaults to the number of cores.
+CPU_WORKERS = int(os.getenv("COOKMATE_CPU_WORKERS", "0")) or (os.cpu_count() or 4)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cookmate-cpu")
+    return _executor
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run fn(*args, **kwargs) on the CPU pool and await its result. It runs
+    in the caller's context, so it belongs to the caller's request trace
+    (and is profiled with it, see rag_pipeline.tracing).
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(profiled, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), contextvars.copy_context().run, call)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,27 +1,50 @@
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+from rag_pipeline.recipe_store import parse_list_value
+
+# Detail levels for format_single_recipe, most to least verbose.
+FULL = "full"
+SHORT_STEPS = "short_steps"
+INGREDIENTS_ONLY = "ingredients_only"
+
+# Steps kept for a recipe packed at SHORT_STEPS.
+SHORT_STEPS_COUNT = 3
 
 
 def _as_list(x) -> list:
-    """Ensure a value is treated as a list."""
-    if x is None:
-        return []
+    """
+    Ensure a value is treated as a list.
+    Results from search_recipes already carry real lists; anything else
+    (e.g. a DataFrame row in a notebook) goes through the same parser the
+    recipe store uses at compile time.
+    """
     if isinstance(x, list):
         return x
-    if isinstance(x, str) and x.startswith("[") and x.endswith("]"):
-        cleaned = x.strip("[]").replace("'", "").replace('"', "")
-        return [item.strip() for item in cleaned.split(",") if item.strip()]
-    return [x]
+    return parse_list_value(x)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for LLaMA-style BPE tokenizers on English text
+    (about 4 characters per token). Cheap enough to call per block.
+    """
+    return (len(text) + 3) // 4
 
 
-def format_single_recipe(recipe: Dict[str, Any], idx: int) -> str:
+def format_single_recipe(recipe: Dict[str, Any], idx: int, detail: str = FULL) -> str:
     """
     Format a single retrieved recipe as a structured text block.
     This will be inserted into the RAG prompt for the LLM to read,
     NOT as final JSON.
+
+    detail: FULL (everything), SHORT_STEPS (no keywords or nutrition,
+    first SHORT_STEPS_COUNT steps) or INGREDIENTS_ONLY (title, category
+    and ingredients).
     """
     title = recipe.get("title", "").strip()
     category = recipe.get("category", "") or ""
     keywords = _as_list(recipe.get("keywords", []))
+    structured = recipe.get("ingredients_structured") or []
     ingredients = _as_list(recipe.get("ingredients_list", []))
     quantities = _as_list(recipe.get("quantities_list", []))
     steps = _as_list(recipe.get("steps_list", []))
@@ -39,10 +62,16 @@ def format_single_recipe(recipe: Dict[str, Any], idx: int) -> str:
     if category:
         lines.append(f"Category: {category}")
 
-    if keywords:
+    if keywords and detail == FULL:
         lines.append("Keywords: " + ", ".join(str(k) for k in keywords))
 
-    if quantities and len(quantities) == len(ingredients):
+    if structured:
+        lines.append("Ingredients:")
+        for pair in structured:
+            q = pair.get("quantity")
+            ing = pair.get("ingredient", "")
+            lines.append(f"- {q} {ing}" if q else f"- {ing}")
+    elif quantities and len(quantities) == len(ingredients):
         lines.append("Ingredients:")
         for q, ing in zip(quantities, ingredients):
             lines.append(f"- {q} {ing}".strip())
@@ -52,12 +81,15 @@ def format_single_recipe(recipe: Dict[str, Any], idx: int) -> str:
             for ing in ingredients:
                 lines.append(f"- {ing}")
 
-    if steps:
+    if steps and detail != INGREDIENTS_ONLY:
+        shown = steps if detail == FULL else steps[:SHORT_STEPS_COUNT]
         lines.append("Steps:")
-        for i, step in enumerate(steps, start=1):
+        for i, step in enumerate(shown, start=1):
             lines.append(f"{i}. {step}")
+        if len(shown) < len(steps):
+            lines.append(f"({len(steps) - len(shown)} more steps omitted)")
 
-    if any(v is not None for v in [calories, fat, carbs, protein]):
+    if detail == FULL and any(v is not None for v in [calories, fat, carbs, protein]):
         lines.append("Nutrition (approx):")
         if calories is not None:
             lines.append(f"- Calories: {calories}")
@@ -83,4 +115,67 @@ def format_retrieved(recipes: List[Dict[str, Any]]) -> str:
     for i, r in enumerate(recipes, start=1):
         blocks.append(format_single_recipe(r, i))
 
-    return "\n\n".join(blocks)
\ No newline at end of file
+    return "\n\n".join(blocks)
+
+
+def pack_retrieved(
+    recipes: List[Dict[str, Any]],
+    max_tokens: int,
+    estimate: Callable[[str], int] = estimate_tokens,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Format retrieved recipes within a token budget.
+
+    Recipes are taken in rank order. The top hit is offered in FULL, then
+    SHORT_STEPS, then INGREDIENTS_ONLY detail; lower-ranked hits start at
+    SHORT_STEPS. Each recipe gets the most detailed form that still fits
+    the remaining budget, and packing stops at the first recipe that does
+    not fit at all. The top hit is always included (as INGREDIENTS_ONLY if
+    nothing else fits) so the prompt stays grounded.
+
+    Returns (text, report) where report has the estimated tokens used, the
+    budget, and the detail level chosen per included recipe.
+    """
+    report: Dict[str, Any] = {
+        "budget": max_tokens,
+        "tokens": 0,
+        "recipes_total": len(recipes),
+        "recipes_included": 0,
+        "detail": [],
+    }
+    if not recipes:
+        text = "No retrieved recipes."
+        report["tokens"] = estimate(text)
+        return text, report
+
+    separator_tokens = estimate("\n\n")
+    blocks: List[str] = []
+    used = 0
+
+    for rank, recipe in enumerate(recipes):
+        levels = [FULL, SHORT_STEPS, INGREDIENTS_ONLY] if rank == 0 else [SHORT_STEPS, INGREDIENTS_ONLY]
+        overhead = separator_tokens if blocks else 0
+
+        chosen: Optional[Tuple[str, str, int]] = None
+        for level in levels:
+            block = format_single_recipe(recipe, rank + 1, detail=level)
+            cost = estimate(block) + overhead
+            if used + cost <= max_tokens:
+                chosen = (level, block, cost)
+                break
+
+        if chosen is None:
+            if rank > 0:
+                break
+            block = format_single_recipe(recipe, 1, detail=INGREDIENTS_ONLY)
+            chosen = (INGREDIENTS_ONLY, block, estimate(block))
+
+        level, block, cost = chosen
+        blocks.append(block)
+        report["detail"].append(level)
+        used += cost
+
+    text = "\n\n".join(blocks)
+    report["tokens"] = estimate(text)
+    report["recipes_included"] = len(blocks)
+    return text, report
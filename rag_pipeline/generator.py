@@ -1,45 +1,152 @@
+import os
 import json
-from typing import List, Optional, Dict, Any
-
-import requests
+import threading
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 
 from rag_pipeline.query_builder import build_query
-from rag_pipeline.search import search_recipes
-from rag_pipeline.prompt_builder import UserRequest, build_rag_prompt
+from rag_pipeline.search import search_recipes, search_recipes_async, get_engine
+from rag_pipeline.prompt_builder import UserRequest, pack_rag_prompt
 from nutrition.estimator import estimate_nutrition_from_retrieved
+from rag_pipeline.executor import run_cpu
+from rag_pipeline.llm_client import get_llm_client
+from rag_pipeline.cache import ResultCache, canonical_request_key
+from rag_pipeline.semantic_cache import SemanticCache
+from rag_pipeline.json_repair import repair_recipe_json
+from rag_pipeline.structured_output import STRUCTURED_OUTPUT, StreamingJSONValidator, output_format
+from rag_pipeline.metrics import GENERATIONS, PROMPT_TOKENS, RETRIES, record_cache, stage
+from rag_pipeline.tracing import current_request_id, profiled
 
 import logging
 
 logger = logging.getLogger("cookmate-backend")
 
+# Cache of validated results keyed on the canonical request.
+# TTL in seconds (0 = never expire); size 0 disables the cache.
+RESULT_CACHE_SIZE = int(os.getenv("COOKMATE_RESULT_CACHE_SIZE", "512"))
+RESULT_CACHE_TTL = float(os.getenv("COOKMATE_RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PATH = os.getenv("COOKMATE_RESULT_CACHE_PATH") or None
+
+result_cache = ResultCache(
+    max_size=RESULT_CACHE_SIZE,
+    ttl=RESULT_CACHE_TTL or None,
+    path=RESULT_CACHE_PATH,
+)
+
+
+def get_result_cache() -> ResultCache:
+    return result_cache
+
+
+# Near-duplicate cache: minimum cosine similarity of the build_query
+# embeddings and number of stored recipes (0 disables it).
+SEMANTIC_CACHE_SIZE = int(os.getenv("COOKMATE_SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("COOKMATE_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+semantic_cache = SemanticCache(
+    lambda texts: get_engine().encode(texts),
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_SIZE,
+)
+
+
+def get_semantic_cache() -> SemanticCache:
+    return semantic_cache
+
+
+class GenerationStats:
+    """
+    Counters for LLM generations. retries_avoided counts the requests
+    constrained decoding spared a retry: with structured output on, the
+    first attempt was valid as generated (no local repair) while a retry
+    was allowed. Without structured output nothing is counted as avoided.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.first_try_valid = 0
+        self.retries = 0
+        self.retries_avoided = 0
+        self.failures = 0
+        self.aborted_streams = 0
+
+    def record(
+        self,
+        attempts: int,
+        success: bool,
+        max_retries: int,
+        repaired: bool = False,
+        structured: Optional[bool] = None,
+    ) -> int:
+        """Count one finished request; returns its retries_avoided (0 or 1)."""
+        structured = STRUCTURED_OUTPUT if structured is None else structured
+        avoided = int(structured and success and attempts == 1 and not repaired and max_retries > 0)
+        with self._lock:
+            self.requests += 1
+            self.retries += attempts - 1
+            self.retries_avoided += avoided
+            if success and attempts == 1:
+                self.first_try_valid += 1
+            if not success:
+                self.failures += 1
+        return avoided
+
+    def aborted(self) -> None:
+        with self._lock:
+            self.aborted_streams += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "structured_output": STRUCTURED_OUTPUT,
+                "requests": self.requests,
+                "first_try_valid": self.first_try_valid,
+                "retries": self.retries,
+                "retries_avoided": self.retries_avoided,
+                "failures": self.failures,
+                "aborted_streams": self.aborted_streams,
+            }
+
+
+generation_stats = GenerationStats()
+
+
+def get_generation_stats() -> GenerationStats:
+    return generation_stats
+
 
 def run_local_llm(
     prompt: str,
-    model: str = "llama3",
+    model: Optional[str] = None,
     temperature: float = 0.2,
-    timeout: int = 120,
+    timeout: Optional[float] = None,
+    format: Optional[Any] = None,
 ) -> str:
     """
     Call the local LLaMA model via Ollama.
 
     Make sure `ollama serve` is running in another terminal:
         ollama run llama3
+
+    Goes through the shared LLMClient (rag_pipeline.llm_client), which
+    reads OLLAMA_HOST and the COOKMATE_LLM_* settings. format (a JSON
+    schema) constrains the output, see rag_pipeline.structured_output.
     """
-    resp = requests.post(
-        "http://localhost:11434/api/generate",
-        json={
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": temperature,
-            },
-        },
-        timeout=timeout,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("response", "")
+    return get_llm_client().generate(prompt, model=model, temperature=temperature, timeout=timeout, format=format)
+
+
+async def run_local_llm_async(
+    prompt: str,
+    model: Optional[str] = None,
+    temperature: float = 0.2,
+    timeout: Optional[float] = None,
+    format: Optional[Any] = None,
+) -> str:
+    """
+    Non-blocking version of run_local_llm: awaits the Ollama call on the
+    event loop instead of holding a worker thread for its whole duration.
+    """
+    return await get_llm_client().agenerate(prompt, model=model, temperature=temperature, timeout=timeout, format=format)
 
 
 def validate_recipe_json(text: str):
@@ -76,12 +183,239 @@ def validate_recipe_json(text: str):
     return True, parsed
 
 
+RETRY_INSTRUCTIONS = (
+    "\n\nYou produced INVALID JSON. "
+    "Regenerate the ENTIRE recipe as VALID JSON that matches the schema. "
+    "Do NOT include any text outside the JSON object."
+)
+
+
+def _generation_query(pantry: List[str], diet: Optional[str], cuisine: Optional[str]) -> Tuple[UserRequest, str]:
+    """Step 1: the user request and its retrieval query."""
+    user = UserRequest(
+        ingredients=pantry,
+        diet=diet,
+        cuisine=cuisine,
+    )
+
+    with stage("query_build"):
+        query = build_query(
+            ingredients=user.ingredients,
+            diet=user.diet,
+            cuisine=user.cuisine,
+        )
+    return user, query
+
+
+def _no_recipes_result(pantry, diet, cuisine) -> Dict[str, Any]:
+    GENERATIONS.inc(outcome="no_recipes")
+    return {
+        "success": False,
+        "error": "no_recipes_found",
+        "message": "search_recipes returned no candidates",
+        "pantry": pantry,
+        "diet": diet,
+        "cuisine": cuisine,
+    }
+
+
+def _prepare_prompt(user: UserRequest, retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    CPU-bound steps 3-4: estimate nutrition and build the prompt.
+    Returns {"prompt": ..., "nutrition": ..., "context": ...}.
+    """
+    with stage("nutrition"):
+        nutrition_estimate = estimate_nutrition_from_retrieved(retrieved)
+
+    # The schema instructions live in the template's static prefix.
+    with stage("prompt_build"):
+        prompt, context = pack_rag_prompt(user, retrieved)
+    PROMPT_TOKENS.observe(context["prompt_tokens"])
+    logger.info(
+        "PROMPT | context %d/%d recipes, ~%d tokens (budget %s), prompt ~%d tokens | request_id=%s",
+        context["recipes_included"], context["recipes_total"],
+        context["tokens"], context["budget"], context["prompt_tokens"],
+        current_request_id(),
+    )
+
+    return {"prompt": prompt, "nutrition": nutrition_estimate, "context": context}
+
+
+def _prepare_generation(
+    pantry: List[str],
+    diet: Optional[str],
+    cuisine: Optional[str],
+    k: int,
+) -> Dict[str, Any]:
+    """
+    Steps 1-4: build the query, retrieve, estimate nutrition and build
+    the prompt. Returns either {"prompt": ..., "nutrition": ...} or a
+    ready-made error result.
+    """
+    user, query = _generation_query(pantry, diet, cuisine)
+    retrieved = search_recipes(query, k=k, diet=user.diet, cuisine=user.cuisine)
+    if not retrieved:
+        return _no_recipes_result(pantry, diet, cuisine)
+    return _prepare_prompt(user, retrieved)
+
+
+async def _aprepare_generation(
+    pantry: List[str],
+    diet: Optional[str],
+    cuisine: Optional[str],
+    k: int,
+) -> Dict[str, Any]:
+    """
+    _prepare_generation for the coroutines. Retrieval is awaited through
+    search_recipes_async (straight into the micro-batcher when it is on),
+    and only the prompt and nutrition work goes to the CPU pool.
+    """
+    user, query = _generation_query(pantry, diet, cuisine)
+    retrieved = await search_recipes_async(query, k=k, diet=user.diet, cuisine=user.cuisine)
+    if not retrieved:
+        return _no_recipes_result(pantry, diet, cuisine)
+    return await run_cpu(_prepare_prompt, user, retrieved)
+
+
+def _cache_key(pantry: List[str], diet: Optional[str], cuisine: Optional[str], k: int) -> str:
+    return canonical_request_key(pantry, diet, cuisine, k, get_llm_client().model)
+
+
+def _lookup_caches(key: str, pantry, diet, cuisine) -> Optional[Dict[str, Any]]:
+    """
+    Exact result cache first, then the semantic near-duplicate cache
+    (which embeds the query, so call this off the event loop).
+    """
+    cached = result_cache.get(key)
+    record_cache("result", hit=cached is not None)
+    if cached is None:
+        query = build_query(ingredients=pantry, diet=diet, cuisine=cuisine)
+        cached = semantic_cache.lookup(query, pantry, diet, cuisine)
+        record_cache("semantic", hit=cached is not None)
+    if cached is None:
+        return None
+    GENERATIONS.inc(outcome="cached")
+    # Echo this request's own inputs, not those of the request that filled
+    # the entry, and report no LLM work for this one.
+    cached.update({"pantry": pantry, "diet": diet, "cuisine": cuisine, "cached": True})
+    cached.update({"attempts": 0, "repairs": [], "retries_avoided": 0})
+    return cached
+
+
+PER_REQUEST_FIELDS = ("attempts", "repairs", "retries_avoided")
+
+
+def _store_caches(key: str, pantry, diet, cuisine, success: Dict[str, Any]) -> None:
+    """
+    Remember a validated result in both caches. Failures are logged, not
+    raised: the result is valid and still goes to the caller.
+    """
+    # Per-request fields added by _finish describe the generation that
+    # filled the entry, not later hits.
+    entry = {k: v for k, v in success.items() if k not in PER_REQUEST_FIELDS}
+    try:
+        result_cache.put(key, entry)
+        query = build_query(ingredients=pantry, diet=diet, cuisine=cuisine)
+        semantic_cache.add(query, pantry, diet, cuisine, entry)
+    except Exception as e:
+        logger.warning("CACHE | could not store generated recipe: %r", e)
+
+
+def _success_result(recipe, nutrition_estimate, raw_output, pantry, diet, cuisine, context=None) -> Dict[str, Any]:
+    if nutrition_estimate:
+        recipe["nutrition"] = nutrition_estimate
+
+    return {
+        "success": True,
+        "recipe": recipe,
+        "raw_output": raw_output,
+        "pantry": pantry,
+        "diet": diet,
+        "cuisine": cuisine,
+        "cached": False,
+        "context_tokens": context["tokens"] if context else None,
+    }
+
+
+def _invalid_json_result(error_message, raw_output, pantry, diet, cuisine, context=None) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": "invalid_json",
+        "validation_message": error_message,
+        "raw_output": raw_output,
+        "pantry": pantry,
+        "diet": diet,
+        "cuisine": cuisine,
+        "context_tokens": context["tokens"] if context else None,
+    }
+
+
+def _validate_or_repair(text: str, diet: Optional[str], cuisine: Optional[str]):
+    """
+    validate_recipe_json, then the local repair pipeline (json_repair)
+    before the caller spends an LLM retry.
+    Returns (ok, parsed or error message, repairs applied).
+    """
+    with stage("validation"):
+        ok, result = validate_recipe_json(text)
+        if ok:
+            return True, result, []
+
+        repaired, recipe, repairs = repair_recipe_json(text, diet=diet, cuisine=cuisine)
+        if not repaired:
+            return False, result, []
+
+        ok, checked = validate_recipe_json(json.dumps(recipe))
+        if not ok:
+            return False, result, []
+    logger.info("GENERATE | repaired model output locally: %s", ", ".join(repairs))
+    return True, checked, repairs
+
+
+def _finish(result: Dict[str, Any], attempts: int, max_retries: int, repairs: Optional[List[str]] = None) -> Dict[str, Any]:
+    result["attempts"] = attempts
+    result["repairs"] = repairs or []
+    GENERATIONS.inc(outcome="success" if result.get("success") else result.get("error", "failure"))
+    RETRIES.inc(attempts - 1)
+    result["retries_avoided"] = generation_stats.record(
+        attempts, result.get("success", False), max_retries, repaired=bool(repairs)
+    )
+    return result
+
+
+async def _astream_validated(prompt: str, validator: StreamingJSONValidator) -> AsyncIterator[str]:
+    """
+    Stream a generation through validator. Stops reading (which closes the
+    connection, so Ollama stops generating) once the JSON object is
+    complete or can no longer become valid.
+    """
+    stream = get_llm_client().astream(prompt, format=output_format())
+    try:
+        async for token in stream:
+            state = validator.feed(token)
+            yield token
+            if state != "partial":
+                break
+    finally:
+        await stream.aclose()
+
+
+def _check_streamed(validator: StreamingJSONValidator, diet: Optional[str], cuisine: Optional[str]):
+    """_validate_or_repair for streamed output: (ok, parsed or error message, repairs)."""
+    if validator.state == "invalid":
+        generation_stats.aborted()
+        logger.warning("GENERATE | aborted generation: %s", validator.error)
+        return False, f"Aborted: {validator.error}", []
+    return _validate_or_repair(validator.document or validator.text, diet, cuisine)
+
+
 def generate_recipe(
     pantry: List[str],
     diet: Optional[str] = None,
     cuisine: Optional[str] = None,
     k: int = 3,
     max_retries: int = 1,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
     """
     Full CookMate RAG pipeline in one function.
@@ -89,102 +423,159 @@ def generate_recipe(
     1. Build query from pantry + diet + cuisine
     2. Retrieve similar recipes with search_recipes(...)
     3. Estimate nutrition from retrieved recipes
-    4. Build RAG prompt with build_rag_prompt(...)
+    4. Build RAG prompt with pack_rag_prompt(...) (retrieved recipes within COOKMATE_CONTEXT_TOKENS)
     5. Call local LLM (Ollama / LLaMA 3)
-    6. Validate JSON against our schema
+    6. Validate JSON against our schema (repairing it locally if possible)
     7. Retry once if JSON is invalid (optional)
     8. Return either a recipe dict or an error description
+
+    Validated results are cached on the canonical request (see
+    rag_pipeline.cache.canonical_request_key) and in the semantic
+    near-duplicate cache. use_cache=False skips the lookups and always
+    calls the LLM; a successful result still refreshes the caches.
     """
+    key = _cache_key(pantry, diet, cuisine, k)
+    if use_cache:
+        cached = _lookup_caches(key, pantry, diet, cuisine)
+        if cached is not None:
+            return cached
 
-    user = UserRequest(
-        ingredients=pantry,
-        diet=diet,
-        cuisine=cuisine,
-    )
+    prepared = _prepare_generation(pantry, diet, cuisine, k)
+    if "prompt" not in prepared:
+        return prepared
 
-    query = build_query(
-        ingredients=user.ingredients,
-        diet=user.diet,
-        cuisine=user.cuisine,
-    )
+    prompt = prepared["prompt"]
+    nutrition_estimate = prepared["nutrition"]
 
-    retrieved = search_recipes(query, k=k)
-    if not retrieved:
-        return {
-            "success": False,
-            "error": "no_recipes_found",
-            "message": "search_recipes returned no candidates",
-            "pantry": pantry,
-            "diet": diet,
-            "cuisine": cuisine,
-        }
-
-    nutrition_estimate = estimate_nutrition_from_retrieved(retrieved)
-
-    prompt = build_rag_prompt(user, retrieved)
-
-    prompt += """
-    
-IMPORTANT: You must answer ONLY with a single JSON object that matches this schema.
-
-- "title": string
-- "ingredients": an ARRAY.
-  Each element SHOULD be an OBJECT with:
-    - "item": ingredient name (string)
-    - "quantity": quantity and unit as a single string (e.g. "1 cup", "2 tbsp", "200 g", "1 small", "2 cloves").
-  Example:
-  "ingredients": [
-    { "item": "rice", "quantity": "1 cup" },
-    { "item": "onion", "quantity": "1 small" },
-    { "item": "garlic", "quantity": "2 cloves" }
-  ]
-
-If the retrieved recipes do not give an exact quantity, infer a reasonable quantity
-for 1 batch of the recipe based on typical home cooking. NEVER leave out the quantity;
-always provide something like "1 cup", "2 tbsp", "200 g", etc.
-
-Do NOT include any commentary, explanation, prose, or markdown. 
-Return ONLY the JSON object.
-"""
+    last_raw_output = ""
+    last_error_message = ""
+
+    for attempt in range(max_retries + 1):
+        last_raw_output = run_local_llm(prompt, format=output_format())
+
+        ok, result, repairs = _validate_or_repair(last_raw_output, diet, cuisine)
+        if ok:
+            success = _success_result(result, nutrition_estimate, last_raw_output, pantry, diet, cuisine, prepared["context"])
+            _finish(success, attempt + 1, max_retries, repairs)
+            _store_caches(key, pantry, diet, cuisine, success)
+            return success
+
+        last_error_message = result
+        if attempt < max_retries:
+            prompt = prompt + RETRY_INSTRUCTIONS
+
+    failure = _invalid_json_result(last_error_message, last_raw_output, pantry, diet, cuisine, prepared["context"])
+    return _finish(failure, max_retries + 1, max_retries)
+
+
+async def generate_recipe_async(
+    pantry: List[str],
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    k: int = 3,
+    max_retries: int = 1,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Coroutine version of generate_recipe for the async backend.
+
+    Retrieval is awaited with search_recipes_async and prompt building
+    runs on the dedicated CPU pool (rag_pipeline.executor); the LLM call
+    is awaited with an async HTTP client, so a pending generation holds
+    no thread.
+    """
+    key = _cache_key(pantry, diet, cuisine, k)
+    if use_cache:
+        cached = await run_cpu(_lookup_caches, key, pantry, diet, cuisine)
+        if cached is not None:
+            return cached
+
+    prepared = await _aprepare_generation(pantry, diet, cuisine, k)
+    if "prompt" not in prepared:
+        return prepared
+
+    prompt = prepared["prompt"]
+    nutrition_estimate = prepared["nutrition"]
 
     last_raw_output = ""
     last_error_message = ""
 
     for attempt in range(max_retries + 1):
-        last_raw_output = run_local_llm(prompt)
+        # Streamed internally so a hopeless generation is cut short.
+        validator = StreamingJSONValidator(strict=STRUCTURED_OUTPUT)
+        async for _ in _astream_validated(prompt, validator):
+            pass
+        last_raw_output = validator.text
 
-        ok, result = validate_recipe_json(last_raw_output)
+        ok, result, repairs = profiled(_check_streamed, validator, diet, cuisine)
         if ok:
-            recipe = result
+            success = _success_result(result, nutrition_estimate, last_raw_output, pantry, diet, cuisine, prepared["context"])
+            _finish(success, attempt + 1, max_retries, repairs)
+            await run_cpu(_store_caches, key, pantry, diet, cuisine, success)
+            return success
 
-            if nutrition_estimate:
-                recipe["nutrition"] = nutrition_estimate
+        last_error_message = result
+        if attempt < max_retries:
+            prompt = prompt + RETRY_INSTRUCTIONS
 
-            return {
-                "success": True,
-                "recipe": recipe,
-                "raw_output": last_raw_output,
-                "pantry": pantry,
-                "diet": diet,
-                "cuisine": cuisine,
-            }
-        else:
-            last_error_message = result
+    failure = _invalid_json_result(last_error_message, last_raw_output, pantry, diet, cuisine, prepared["context"])
+    return _finish(failure, max_retries + 1, max_retries)
 
-            if attempt < max_retries:
-                prompt = (
-                    prompt
-                    + "\n\nYou produced INVALID JSON. "
-                    "Regenerate the ENTIRE recipe as VALID JSON that matches the schema. "
-                    "Do NOT include any text outside the JSON object."
-                )
 
-    return {
-        "success": False,
-        "error": "invalid_json",
-        "validation_message": last_error_message,
-        "raw_output": last_raw_output,
-        "pantry": pantry,
-        "diet": diet,
-        "cuisine": cuisine,
-    }
+async def generate_recipe_stream(
+    pantry: List[str],
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    k: int = 3,
+    max_retries: int = 1,
+    use_cache: bool = True,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming version of generate_recipe_async. Yields (event, data) pairs:
+
+    - ("token", {"text": ..., "attempt": n})   model output as it arrives
+    - ("retry", {"attempt": n, "validation_message": ...})
+                                               the previous attempt was invalid JSON
+    - ("result", {...})                        final result, same shape as generate_recipe
+
+    A cache hit yields the result event straight away.
+    """
+    key = _cache_key(pantry, diet, cuisine, k)
+    if use_cache:
+        cached = await run_cpu(_lookup_caches, key, pantry, diet, cuisine)
+        if cached is not None:
+            yield "result", cached
+            return
+
+    prepared = await _aprepare_generation(pantry, diet, cuisine, k)
+    if "prompt" not in prepared:
+        yield "result", prepared
+        return
+
+    prompt = prepared["prompt"]
+    nutrition_estimate = prepared["nutrition"]
+
+    last_raw_output = ""
+    last_error_message = ""
+
+    for attempt in range(max_retries + 1):
+        validator = StreamingJSONValidator(strict=STRUCTURED_OUTPUT)
+        async for token in _astream_validated(prompt, validator):
+            yield "token", {"text": token, "attempt": attempt}
+        last_raw_output = validator.text
+
+        ok, result, repairs = profiled(_check_streamed, validator, diet, cuisine)
+        if ok:
+            success = _success_result(result, nutrition_estimate, last_raw_output, pantry, diet, cuisine, prepared["context"])
+            _finish(success, attempt + 1, max_retries, repairs)
+            await run_cpu(_store_caches, key, pantry, diet, cuisine, success)
+            yield "result", success
+            return
+
+        last_error_message = result
+        if attempt < max_retries:
+            yield "retry", {"attempt": attempt + 1, "validation_message": result}
+            prompt = prompt + RETRY_INSTRUCTIONS
+
+    failure = _invalid_json_result(last_error_message, last_raw_output, pantry, diet, cuisine, prepared["context"])
+    yield "result", _finish(failure, max_retries + 1, max_retries)
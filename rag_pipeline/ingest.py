@@ -0,0 +1,304 @@
+"""
+Incremental recipe ingestion.
+
+Adds new recipes to the retrieval assets in place instead of rerunning
+the notebooks:
+
+    cleaned_recipes.json      new records appended to the JSON array
+    recipe_store/             rows appended (recipe_store.append_recipe_store)
+    recipe_embeddings.npy     rows appended, header rewritten in place
+    faiss_index*.bin          vectors added to every index variant present
+    id_mapping.csv            new recipe ids appended, in index order
+
+The input is read in chunks (a .jsonl file is streamed, a .json array is
+sliced), each chunk is embedded in batches, optionally across several
+encoder processes, and appended. Recipes keep their recipe_id; ids that
+are already indexed are skipped, records without one get the next free id.
+
+id_mapping.csv is the commit point: it is rewritten after the indexes, so
+a run that stops half-way leaves rows in the store and embeddings that no
+index position refers to. The next run drops them before appending.
+lexical.npz and attributes.npz are rebuilt at the end (or, with
+--skip-derived, on the next backend start).
+
+Running backends keep serving the old assets until restarted.
+
+    python -m rag_pipeline.ingest new_recipes.jsonl --workers 4
+"""
+import os
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import faiss
+
+from rag_pipeline.recipe_store import (
+    CLEAN_PATH,
+    STORE_DIR,
+    RecipeStore,
+    append_npy,
+    append_recipe_store,
+    open_or_compile,
+    parse_list_value,
+    truncate_recipe_store,
+)
+from rag_pipeline.ann_index import INDEX_DIR, INDEX_TYPES, index_path
+from rag_pipeline.lexical_index import build_lexical_index
+from rag_pipeline.attribute_index import build_attribute_index
+
+logger = logging.getLogger("cookmate-backend")
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+EMB_PATH = os.path.join(BASE_DIR, "embeddings", "recipe_embeddings.npy")
+IDMAP_PATH = os.path.join(BASE_DIR, "embeddings", "id_mapping.csv")
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 64
+
+
+def recipe_text(recipe: Dict[str, Any]) -> str:
+    """The text a recipe is embedded from (as in 03_embeddings_and_faiss)."""
+    ingredients = [i for i in parse_list_value(recipe.get("ingredients_list")) if i]
+    steps = [s for s in parse_list_value(recipe.get("steps_list")) if s]
+    return f"Title: {recipe.get('title')}. Ingredients: {', '.join(ingredients)}. Steps: {' '.join(steps[:5])}"
+
+
+def read_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Recipes from a .jsonl file (streamed) or a JSON array, chunk_size at a time."""
+    if path.endswith((".jsonl", ".ndjson")):
+        with pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False) as reader:
+            for chunk in reader:
+                yield chunk.reset_index(drop=True)
+        return
+
+    df = pd.read_json(path, dtype=False)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+
+def default_index_paths(index_dir: str = INDEX_DIR) -> List[str]:
+    """Every index variant (see ann_index) that exists in index_dir."""
+    paths = [index_path(t, index_dir) for t in INDEX_TYPES]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def encode_texts(model, texts: List[str], batch_size: int = BATCH_SIZE, pool=None) -> np.ndarray:
+    """Normalized float32 embeddings, through a SentenceTransformer process pool if given."""
+    kwargs = {"batch_size": batch_size, "normalize_embeddings": True}
+    if pool is not None:
+        kwargs["pool"] = pool
+    return np.ascontiguousarray(model.encode(texts, **kwargs), dtype="float32")
+
+
+def _truncate_index(index, n: int, path: str) -> None:
+    if index.ntotal > n:
+        logger.warning("INGEST | %s has %d uncommitted vectors, removing them", path, index.ntotal - n)
+        try:
+            index.remove_ids(faiss.IDSelectorRange(n, index.ntotal))
+        except RuntimeError as e:
+            raise ValueError(
+                f"{path} has {index.ntotal} vectors but the id map has {n} rows and this index type "
+                f"cannot drop vectors; rebuild it with python -m rag_pipeline.ann_index"
+            ) from e
+    elif index.ntotal < n:
+        raise ValueError(f"{path} has {index.ntotal} vectors but the id map has {n} rows; rebuild it")
+
+
+def _append_json_records(path: str, df: pd.DataFrame) -> None:
+    """Append df's rows to a JSON array file (orient="records") in place."""
+    records = df.to_json(orient="records")[1:-1]
+    if not records:
+        return
+    with open(path, "r+b") as f:
+        # Only the tail is read: the file can be hundreds of megabytes.
+        start = max(0, f.seek(0, os.SEEK_END) - 4096)
+        f.seek(start)
+        tail = f.read().rstrip()
+        if not tail.endswith(b"]"):
+            raise ValueError(f"{path} is not a JSON array")
+        empty = tail[:-1].rstrip().endswith(b"[")
+        f.seek(start + len(tail) - 1)
+        f.truncate()
+        f.write((records if empty else "," + records).encode("utf-8") + b"]")
+
+
+def _prepare_chunk(chunk: pd.DataFrame, known: set, next_id: int, report: Dict[str, int]):
+    """
+    Drop invalid and already-indexed recipes. Recipes without an id get
+    the lowest free id above every id indexed before this run.
+    """
+    keep, ids = [], []
+    for i, recipe in enumerate(chunk.to_dict("records")):
+        if not str(recipe.get("title") or "").strip() or not parse_list_value(recipe.get("ingredients_list")):
+            report["invalid"] += 1
+            continue
+
+        recipe_id = recipe.get("recipe_id")
+        if recipe_id is None or (isinstance(recipe_id, float) and np.isnan(recipe_id)):
+            while next_id in known:
+                next_id += 1
+            recipe_id = next_id
+            report["assigned_ids"] += 1
+        recipe_id = int(recipe_id)
+        if recipe_id in known:
+            report["skipped_existing"] += 1
+            continue
+
+        known.add(recipe_id)
+        keep.append(i)
+        ids.append(recipe_id)
+
+    df = chunk.iloc[keep].reset_index(drop=True)
+    df["recipe_id"] = np.asarray(ids, dtype="int64")
+    return df, next_id
+
+
+def ingest(
+    source: str,
+    model,
+    clean_path: str = CLEAN_PATH,
+    store_dir: str = STORE_DIR,
+    emb_path: str = EMB_PATH,
+    index_paths: Optional[List[str]] = None,
+    idmap_path: str = IDMAP_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    batch_size: int = BATCH_SIZE,
+    pool=None,
+    rebuild_derived: bool = True,
+) -> Dict[str, Any]:
+    """
+    Append the recipes in source to every retrieval asset. model is a
+    SentenceTransformer (or anything with the same encode signature);
+    pool, if given, a process pool from model.start_multi_process_pool().
+    Returns a summary of what was added and skipped.
+    """
+    start = time.perf_counter()
+    index_paths = index_paths if index_paths is not None else default_index_paths(os.path.dirname(emb_path))
+    if not index_paths:
+        raise ValueError("No index to append to; build one with python -m rag_pipeline.ann_index")
+
+    id_map = pd.read_csv(idmap_path)
+    ids = id_map["recipe_id"].to_numpy(dtype="int64")
+    n = len(ids)
+
+    store = open_or_compile(store_dir, clean_path)
+    store_ids = np.asarray(store.recipe_ids)
+    if len(store_ids) < n or not np.array_equal(store_ids[:n], ids):
+        raise ValueError(
+            f"Recipe store at {store_dir} does not match {idmap_path}; "
+            f"recompile it with python -m rag_pipeline.recipe_store"
+        )
+    if len(store_ids) > n:
+        logger.warning("INGEST | dropping %d uncommitted rows from the recipe store", len(store_ids) - n)
+        truncate_recipe_store(store_dir, n)
+    store.close()
+
+    n_emb = np.load(emb_path, mmap_mode="r").shape[0]
+    if n_emb < n:
+        raise ValueError(f"{emb_path} has {n_emb} rows but the id map has {n}; rebuild it")
+
+    indexes = []
+    for path in index_paths:
+        index = faiss.read_index(path)
+        _truncate_index(index, n, path)
+        indexes.append(index)
+
+    report = {"read": 0, "added": 0, "skipped_existing": 0, "invalid": 0, "assigned_ids": 0}
+    known = set(ids.tolist())
+    next_id = int(ids.max()) + 1 if n else 0
+    new_ids: List[np.ndarray] = []
+    added = []
+
+    for chunk in read_chunks(source, chunk_size):
+        report["read"] += len(chunk)
+        df, next_id = _prepare_chunk(chunk, known, next_id, report)
+        if df.empty:
+            continue
+
+        vectors = encode_texts(model, [recipe_text(r) for r in df.to_dict("records")], batch_size, pool)
+        append_recipe_store(df, store_dir)
+        append_npy(emb_path, vectors, keep=n + report["added"])
+        for index in indexes:
+            index.add(vectors)
+
+        new_ids.append(df["recipe_id"].to_numpy(dtype="int64"))
+        added.append(df)
+        report["added"] += len(df)
+        logger.info("INGEST | %d read, %d added", report["read"], report["added"])
+
+    if report["added"]:
+        for index, path in zip(indexes, index_paths):
+            faiss.write_index(index, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+        all_ids = np.concatenate([ids, *new_ids])
+        tmp_path = idmap_path + ".tmp"
+        pd.DataFrame({"recipe_id": all_ids}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, idmap_path)
+
+        if os.path.exists(clean_path):
+            _append_json_records(clean_path, pd.concat(added, ignore_index=True))
+
+        if rebuild_derived:
+            store = RecipeStore(store_dir)
+            build_lexical_index(store)
+            build_attribute_index(store)
+            store.close()
+
+    report["total"] = n + report["added"]
+    report["indexes"] = index_paths
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    logger.info("INGEST | %s", json.dumps(report))
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Append new recipes to the store, embeddings and indexes.")
+    parser.add_argument("source", help="new recipes, .jsonl (streamed) or a JSON array, in the cleaned schema")
+    parser.add_argument("--clean", default=CLEAN_PATH, help="cleaned_recipes.json to append to")
+    parser.add_argument("--store", default=STORE_DIR, help="compiled recipe store directory")
+    parser.add_argument("--embeddings", default=EMB_PATH, help="recipe_embeddings.npy")
+    parser.add_argument("--index", action="append", default=None,
+                        help="index file to append to (repeatable; default: every variant next to the embeddings)")
+    parser.add_argument("--id-map", default=IDMAP_PATH, help="id_mapping.csv")
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="recipes read and appended at a time")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="encoder batch size")
+    parser.add_argument("--workers", type=int, default=1, help="encoder processes")
+    parser.add_argument("--skip-derived", action="store_true",
+                        help="do not rebuild lexical/attribute indexes (the backend rebuilds them on start)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model)
+    pool = model.start_multi_process_pool(["cpu"] * args.workers) if args.workers > 1 else None
+    try:
+        ingest(
+            args.source,
+            model,
+            clean_path=args.clean,
+            store_dir=args.store,
+            emb_path=args.embeddings,
+            index_paths=args.index,
+            idmap_path=args.id_map,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            pool=pool,
+            rebuild_derived=not args.skip_derived,
+        )
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+
+if __name__ == "__main__":
+    main()
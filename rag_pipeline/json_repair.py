@@ -0,0 +1,280 @@
+"""
+Deterministic repair of almost-valid recipe JSON.
+
+Model output that fails validate_recipe_json is usually close: wrapped in
+markdown fences, preceded by a sentence of prose, with a trailing comma,
+or with "ingredients" as one string instead of a list. repair_recipe_json
+fixes those cases locally, before the generator falls back to an LLM
+retry:
+
+1. extract the outermost JSON object (drops fences and surrounding prose,
+   closes an object cut off mid-way)
+2. fix common syntax errors (trailing commas, smart quotes, Python
+   literals)
+3. coerce field types to the recipe schema
+4. fill safe defaults for missing non-critical fields
+
+title, ingredients and steps are never invented; without them the repair
+fails. Each step that changes something is recorded by name and counted
+in get_repair_stats().
+"""
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+CRITICAL_FIELDS = ("title", "ingredients", "steps")
+
+_FENCE = re.compile(r"```[a-zA-Z]*")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SMART_QUOTES = {"“": '"', "”": '"'}
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+class RepairStats:
+    """How often repair ran, succeeded, and which repairs fired."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.repaired = 0
+        self.failed = 0
+        self.repairs: Dict[str, int] = {}
+
+    def record(self, repairs: List[str], ok: bool) -> None:
+        with self._lock:
+            self.attempts += 1
+            if ok:
+                self.repaired += 1
+                for name in repairs:
+                    self.repairs[name] = self.repairs.get(name, 0) + 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "repaired": self.repaired,
+                "failed": self.failed,
+                "repairs": dict(sorted(self.repairs.items())),
+            }
+
+
+repair_stats = RepairStats()
+
+
+def get_repair_stats() -> RepairStats:
+    return repair_stats
+
+
+def _outside_strings(text: str, fn) -> str:
+    """Apply fn to the parts of text that are not inside JSON strings."""
+    out, chunk = [], []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            out.append(fn("".join(chunk)))
+            chunk = []
+            out.append(ch)
+            in_string = True
+        else:
+            chunk.append(ch)
+    out.append(fn("".join(chunk)))
+    return "".join(out)
+
+
+def extract_object(text: str) -> Tuple[Optional[str], List[str]]:
+    """
+    The outermost {...} in text, string-aware. An object that is cut off
+    (stream ended early) is closed. Returns (object text or None, repairs).
+    """
+    repairs = []
+    if "```" in text:
+        text = _FENCE.sub("", text)
+        repairs.append("strip_fences")
+
+    start = text.find("{")
+    if start < 0:
+        return None, repairs
+    if text[:start].strip():
+        repairs.append("strip_preamble")
+
+    stack = []
+    in_string = escape = False
+    for pos in range(start, len(text)):
+        ch = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                return None, repairs
+            stack.pop()
+            if not stack:
+                if text[pos + 1:].strip():
+                    repairs.append("strip_trailing_text")
+                return text[start:pos + 1], repairs
+
+    # Truncated: close the open string and brackets.
+    body = text[start:].rstrip()
+    if in_string:
+        body += '"'
+    body = body.rstrip(",:")
+    repairs.append("close_brackets")
+    return body + "".join(reversed(stack)), repairs
+
+
+def fix_syntax(text: str) -> Tuple[str, List[str]]:
+    """Trailing commas, smart quotes and Python literals; returns (text, repairs)."""
+    repairs = []
+
+    if any(q in text for q in _SMART_QUOTES):
+        for q, r in _SMART_QUOTES.items():
+            text = text.replace(q, r)
+        repairs.append("smart_quotes")
+
+    fixed = _outside_strings(text, lambda part: _TRAILING_COMMA.sub(r"\1", part))
+    if fixed != text:
+        repairs.append("trailing_commas")
+        text = fixed
+
+    fixed = _outside_strings(
+        text, lambda part: re.sub(r"\b(True|False|None)\b", lambda m: _PY_LITERALS[m.group(1)], part)
+    )
+    if fixed != text:
+        repairs.append("python_literals")
+        text = fixed
+
+    return text, repairs
+
+
+def _split_items(value: str) -> List[str]:
+    lines = [line for line in value.splitlines() if line.strip()]
+    if len(lines) <= 1:
+        lines = value.split(",") if "," in value else lines
+    items = [_LIST_PREFIX.sub("", line).strip() for line in lines]
+    return [item for item in items if item]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _NUMBER.search(str(value))
+    return int(float(match.group())) if match else None
+
+
+def coerce_types(recipe: Dict[str, Any]) -> List[str]:
+    """Coerce recipe fields to the schema types in place; returns repairs."""
+    repairs = []
+
+    for field in ("ingredients", "steps"):
+        value = recipe.get(field)
+        if isinstance(value, str):
+            recipe[field] = _split_items(value)
+            repairs.append(f"coerce_{field}")
+        elif isinstance(value, dict):
+            recipe[field] = [value]
+            repairs.append(f"coerce_{field}")
+
+    for field in ("time_minutes", "servings"):
+        value = recipe.get(field)
+        if value is not None and not isinstance(value, int):
+            number = _to_int(value)
+            if number is not None:
+                recipe[field] = number
+                repairs.append(f"coerce_{field}")
+
+    for field in ("title", "diet", "cuisine", "reason"):
+        value = recipe.get(field)
+        if value is not None and not isinstance(value, str):
+            recipe[field] = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+            repairs.append(f"coerce_{field}")
+
+    return repairs
+
+
+def fill_defaults(recipe: Dict[str, Any], defaults: Dict[str, Any]) -> List[str]:
+    """Fill missing non-critical fields from defaults in place; returns repairs."""
+    repairs = []
+    for field, value in defaults.items():
+        if field in CRITICAL_FIELDS:
+            continue
+        if recipe.get(field) is None:
+            recipe[field] = value
+            repairs.append(f"default_{field}")
+    return repairs
+
+
+def repair_recipe_json(
+    text: str,
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+) -> Tuple[bool, Any, List[str]]:
+    """
+    Try to turn model output into a recipe dict.
+    diet/cuisine are the request's values, used as defaults.
+
+    Returns (True, recipe, repairs) or (False, error_message, repairs).
+    """
+    repairs: List[str] = []
+    ok, result = _repair(text, diet, cuisine, repairs)
+    repair_stats.record(repairs, ok)
+    return ok, result, repairs
+
+
+def _repair(text: str, diet, cuisine, repairs: List[str]) -> Tuple[bool, Any]:
+    body, found = extract_object(text or "")
+    repairs.extend(found)
+    if body is None:
+        return False, "no JSON object found"
+
+    try:
+        recipe = json.loads(body)
+    except json.JSONDecodeError:
+        body, fixed = fix_syntax(body)
+        repairs.extend(fixed)
+        try:
+            recipe = json.loads(body)
+        except json.JSONDecodeError as e:
+            return False, f"JSON decode error after repair: {e}"
+
+    if not isinstance(recipe, dict):
+        return False, "top-level JSON value is not an object"
+
+    repairs.extend(coerce_types(recipe))
+
+    missing = [f for f in CRITICAL_FIELDS if not recipe.get(f)]
+    if missing:
+        return False, f"Missing critical fields: {missing}"
+
+    repairs.extend(fill_defaults(recipe, {
+        "time_minutes": 0,
+        "servings": 0,
+        "diet": diet or "none",
+        "cuisine": cuisine or "none",
+        "reason": "",
+    }))
+
+    return True, recipe
@@ -0,0 +1,234 @@
+"""
+Ingredient inverted index for hybrid (lexical + vector) retrieval.
+
+Ingredient names from the compiled recipe store are split into normalized
+tokens ("Cherry Tomatoes" -> "cherry", "tomato"). The index keeps, per
+token, a posting list of the store rows that use it, as one sorted int32
+array in CSR layout:
+
+    vocab        sorted token strings
+    offsets      int64, len(vocab) + 1; token t owns postings[offsets[t]:offsets[t + 1]]
+    postings     int32 row ids, ascending within each token
+    tfs          uint16 term frequency of the token in that row
+    doc_len      uint16 number of tokens per row
+
+LexicalIndex.search scores rows with BM25. rrf_fuse merges its ranking
+with the FAISS ranking by weighted reciprocal rank fusion.
+
+The index lives next to the recipe store (lexical.npz in the store
+directory), so recompiling the store drops it and it is rebuilt. Build it
+offline with:
+
+    python -m rag_pipeline.lexical_index
+"""
+import os
+import re
+import json
+import argparse
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_pipeline.recipe_store import RecipeStore, STORE_DIR, build_lock, temp_path_for
+
+logger = logging.getLogger("cookmate-backend")
+
+LEXICAL_FILE = "lexical.npz"
+LEXICAL_VERSION = 1
+
+# BM25 parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z]+")
+
+# Words that say nothing about which ingredient it is.
+STOPWORDS = {
+    "a", "an", "and", "or", "of", "the", "to", "with", "for", "in", "taste",
+    "fresh", "freshly", "chopped", "sliced", "diced", "minced", "ground",
+    "dried", "large", "small", "medium", "whole", "cup", "cups", "tbsp",
+    "tsp", "tablespoon", "teaspoon", "oz", "lb", "g", "kg", "ml",
+}
+
+
+def _singular(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("oes"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized ingredient tokens of a string (lower-case, singular, no stopwords)."""
+    return [_singular(t) for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def lexical_path(store_dir: str = STORE_DIR) -> str:
+    return os.path.join(store_dir, LEXICAL_FILE)
+
+
+def build_lexical_index(store: RecipeStore, out_path: Optional[str] = None) -> str:
+    """Build the inverted index over the store's ingredients and save it."""
+    out_path = out_path or lexical_path(store.store_dir)
+    n = len(store)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_len = np.zeros(n, dtype="uint16")
+
+    for row in range(n):
+        counts = Counter(
+            token for name in store.list("ingredients_list", row) for token in tokenize(name)
+        )
+        doc_len[row] = min(sum(counts.values()), np.iinfo("uint16").max)
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((row, tf))
+
+    vocab = sorted(postings)
+    offsets = np.zeros(len(vocab) + 1, dtype="int64")
+    for t, token in enumerate(vocab):
+        offsets[t + 1] = offsets[t] + len(postings[token])
+
+    rows = np.empty(int(offsets[-1]), dtype="int32")
+    tfs = np.empty(int(offsets[-1]), dtype="uint16")
+    for t, token in enumerate(vocab):
+        # Rows were appended in ascending order.
+        pairs = np.asarray(postings[token], dtype="int64")
+        rows[offsets[t]:offsets[t + 1]] = pairs[:, 0]
+        tfs[offsets[t]:offsets[t + 1]] = np.minimum(pairs[:, 1], np.iinfo("uint16").max)
+
+    tmp_path = temp_path_for(out_path, ".tmp.npz")
+    try:
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps({"version": LEXICAL_VERSION, "n_docs": n})),
+            vocab=np.array(vocab),
+            offsets=offsets,
+            postings=rows,
+            tfs=tfs,
+            doc_len=doc_len,
+        )
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(
+        "LEXICAL | indexed %d recipes, %d tokens, %d postings -> %s",
+        n, len(vocab), len(rows), out_path,
+    )
+    return out_path
+
+
+class LexicalIndex:
+    """BM25 search over a saved ingredient inverted index."""
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.meta = json.loads(str(data["meta"]))
+            vocab = data["vocab"].tolist()
+            self.offsets = data["offsets"]
+            self.postings = data["postings"]
+            self.tfs = data["tfs"].astype("float32")
+            self.doc_len = data["doc_len"].astype("float32")
+
+        self.n_docs = int(self.meta["n_docs"])
+        self.term_ids = {token: t for t, token in enumerate(vocab)}
+        self.avg_len = float(self.doc_len.mean()) if self.n_docs else 0.0
+        df = np.diff(self.offsets).astype("float32")
+        self.idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def search(self, text: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by BM25 for the tokens of text: (rows, scores), best first."""
+        term_ids = {self.term_ids[t] for t in tokenize(text) if t in self.term_ids}
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+
+        rows, contribs = [], []
+        for t in term_ids:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            docs = self.postings[lo:hi]
+            tf = self.tfs[lo:hi]
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / max(self.avg_len, 1e-6))
+            rows.append(docs)
+            contribs.append(self.idf[t] * tf * (BM25_K1 + 1.0) / (tf + norm))
+
+        rows = np.concatenate(rows)
+        contribs = np.concatenate(contribs)
+        uniq, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contribs).astype("float32")
+
+        if len(uniq) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(uniq))
+        # Ties broken by row id so results are deterministic.
+        top = top[np.lexsort((uniq[top], -scores[top]))]
+        return uniq[top].astype("int64"), scores[top]
+
+
+def _is_current(store: RecipeStore, path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+        return meta.get("version") == LEXICAL_VERSION and meta.get("n_docs") == len(store)
+    except Exception as e:
+        logger.warning("LEXICAL | could not read %s: %r", path, e)
+        return False
+
+
+def open_or_build(store: RecipeStore, path: Optional[str] = None) -> LexicalIndex:
+    """Open the store's lexical index, building it first if missing or stale."""
+    path = path or lexical_path(store.store_dir)
+    if not _is_current(store, path):
+        with build_lock(path):
+            # Another worker may have built it while we waited.
+            if not _is_current(store, path):
+                logger.warning("LEXICAL | no current index at %s, building it (one-off)", path)
+                build_lexical_index(store, path)
+    return LexicalIndex(path)
+
+
+def rrf_fuse(
+    rankings: Sequence[Sequence[int]],
+    weights: Sequence[float],
+    k: int,
+    rrf_k: float = 60.0,
+) -> List[Tuple[int, float]]:
+    """
+    Weighted reciprocal rank fusion: each row scores
+    sum(weight / (rrf_k + rank)) over the rankings it appears in (rank
+    starting at 1). Returns the top k (row, score) pairs, best first; ties
+    keep the order of the first ranking.
+    """
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if weight <= 0:
+            continue
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + weight / (rrf_k + rank)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])
+    return ordered[:k]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the ingredient inverted index for a recipe store.")
+    parser.add_argument("--store", default=STORE_DIR, help="compiled recipe store directory")
+    parser.add_argument("--output", default=None, help=f"index file (default: <store>/{LEXICAL_FILE})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    build_lexical_index(RecipeStore(args.store), args.output)
+
+
+if __name__ == "__main__":
+    main()
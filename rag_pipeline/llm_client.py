@@ -0,0 +1,314 @@
+"""
+Reusable client for the local Ollama server.
+
+One LLMClient per process keeps pooled keep-alive connections to Ollama
+(a requests.Session for sync callers, an httpx.AsyncClient for the async
+backend), reads its base URL, model and timeouts from the environment,
+caps how many generations may run against the server at once, and asks
+Ollama to keep the model loaded between requests.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from rag_pipeline.metrics import STAGE_SECONDS, stage
+from rag_pipeline.tracing import add_span
+
+logger = logging.getLogger("cookmate-backend")
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+LLM_MODEL = os.getenv("COOKMATE_LLM_MODEL", "llama3")
+LLM_CONNECT_TIMEOUT = float(os.getenv("COOKMATE_LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("COOKMATE_LLM_TIMEOUT", "120"))
+# Generations allowed in flight against the Ollama host; extra calls wait.
+LLM_MAX_CONCURRENCY = int(os.getenv("COOKMATE_LLM_MAX_CONCURRENCY", "4"))
+# How long Ollama keeps the model resident after a request ("-1" = forever).
+LLM_KEEP_ALIVE = os.getenv("COOKMATE_LLM_KEEP_ALIVE", "30m")
+LLM_POOL_SIZE = int(os.getenv("COOKMATE_LLM_POOL_SIZE", "16"))
+
+
+class LLMClient:
+    """
+    Pooled Ollama client with a concurrency cap.
+    Use get_llm_client() for the process-wide instance.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_HOST,
+        model: str = LLM_MODEL,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        timeout: float = LLM_TIMEOUT,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        keep_alive: Optional[str] = LLM_KEEP_ALIVE,
+        pool_size: int = LLM_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+
+        self._session: Optional[requests.Session] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session_lock = threading.Lock()
+
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+
+    # ---------- connections ----------
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    async def _bind_loop(self) -> None:
+        # The async client and semaphore belong to one event loop. The
+        # backend has a single loop; this only matters for callers such as
+        # the test client that run each request on a fresh loop.
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            stale, stale_loop = self._async_client, self._async_loop
+            self._async_loop = loop
+            self._async_client = None
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            if stale is not None:
+                await self._close_stale(stale, stale_loop)
+
+    @staticmethod
+    async def _close_stale(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close the pooled connections of a client bound to another loop."""
+        try:
+            if loop is not None and loop.is_running() and not loop.is_closed():
+                # Still running in another thread: close it there.
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            else:
+                await client.aclose()
+        except Exception as e:
+            # Its loop is closed, so asyncio cannot close the sockets any
+            # more; they are released with the client.
+            logger.debug("LLM | could not close the client of a previous event loop: %r", e)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+        return self._async_client
+
+    def _payload(
+        self,
+        prompt: str,
+        model: Optional[str],
+        temperature: float,
+        stream: bool,
+        format: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+            },
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        if format is not None:
+            # "json" or a JSON schema; Ollama constrains decoding to match it.
+            payload["format"] = format
+        return payload
+
+    def _track(self, field: str, delta: int) -> None:
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    # ---------- generation ----------
+
+    def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.2,
+        timeout: Optional[float] = None,
+        format: Optional[Any] = None,
+    ) -> str:
+        """Blocking completion; waits for a free slot if the cap is reached."""
+        self._track("waiting", 1)
+        queued = time.perf_counter()
+        with self._sync_slots:
+            STAGE_SECONDS.observe(time.perf_counter() - queued, stage="llm_wait")
+            add_span("llm_wait", queued, time.perf_counter() - queued)
+            self._track("waiting", -1)
+            self._track("in_flight", 1)
+            try:
+                with stage("llm_total"):
+                    resp = self._get_session().post(
+                        f"{self.base_url}/api/generate",
+                        json=self._payload(prompt, model, temperature, stream=False, format=format),
+                        timeout=(self.connect_timeout, timeout or self.timeout),
+                    )
+                    resp.raise_for_status()
+                    data = resp.json()
+            except Exception:
+                self._track("errors", 1)
+                raise
+            finally:
+                self._track("in_flight", -1)
+                self._track("requests", 1)
+        return data.get("response", "")
+
+    async def agenerate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.2,
+        timeout: Optional[float] = None,
+        format: Optional[Any] = None,
+    ) -> str:
+        """Async completion; waits (without holding a thread) for a free slot."""
+        await self._bind_loop()
+        self._track("waiting", 1)
+        queued = time.perf_counter()
+        async with self._async_slots:
+            STAGE_SECONDS.observe(time.perf_counter() - queued, stage="llm_wait")
+            add_span("llm_wait", queued, time.perf_counter() - queued)
+            self._track("waiting", -1)
+            self._track("in_flight", 1)
+            try:
+                with stage("llm_total"):
+                    resp = await self._get_async_client().post(
+                        "/api/generate",
+                        json=self._payload(prompt, model, temperature, stream=False, format=format),
+                        timeout=httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout),
+                    )
+                    resp.raise_for_status()
+                    data = resp.json()
+            except Exception:
+                self._track("errors", 1)
+                raise
+            finally:
+                self._track("in_flight", -1)
+                self._track("requests", 1)
+        return data.get("response", "")
+
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.2,
+        timeout: Optional[float] = None,
+        format: Optional[Any] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion: yields text fragments as Ollama produces them.
+        The concurrency slot is held until the stream ends or the caller
+        stops iterating.
+        """
+        await self._bind_loop()
+        self._track("waiting", 1)
+        queued = time.perf_counter()
+        async with self._async_slots:
+            STAGE_SECONDS.observe(time.perf_counter() - queued, stage="llm_wait")
+            add_span("llm_wait", queued, time.perf_counter() - queued)
+            self._track("waiting", -1)
+            self._track("in_flight", 1)
+            start = time.perf_counter()
+            first_token = True
+            try:
+                with stage("llm_total"):
+                    async with self._get_async_client().stream(
+                        "POST",
+                        "/api/generate",
+                        json=self._payload(prompt, model, temperature, stream=True, format=format),
+                        timeout=httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout),
+                    ) as resp:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise RuntimeError(f"Ollama error: {chunk['error']}")
+                            token = chunk.get("response", "")
+                            if token:
+                                if first_token:
+                                    STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_first_token")
+                                    add_span("llm_first_token", start, time.perf_counter() - start)
+                                    first_token = False
+                                yield token
+                            if chunk.get("done"):
+                                break
+            except Exception:
+                self._track("errors", 1)
+                raise
+            finally:
+                self._track("in_flight", -1)
+                self._track("requests", 1)
+
+    # ---------- lifecycle ----------
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "base_url": self.base_url,
+                "model": self.model,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "requests": self.requests,
+                "errors": self.errors,
+            }
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
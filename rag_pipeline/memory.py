@@ -0,0 +1,108 @@
+"""
+Per-process memory of the backend workers.
+
+RSS counts every page a process has mapped, so pages that uvicorn workers
+share (the memory-mapped Faiss index, embeddings and recipe store) are
+counted once per worker and the sum over-states what the host uses. PSS
+splits each shared page between the processes mapping it; summed over
+the workers it is their real footprint. Both come from
+/proc/<pid>/smaps_rollup (Linux).
+
+GET /stats reports the worker that answered. For all workers at once:
+
+    python -m rag_pipeline.memory            # processes running backend.main
+    python -m rag_pipeline.memory 1234 1235  # specific pids
+"""
+import os
+import argparse
+from typing import Dict, List, Optional, Union
+
+BACKEND_MATCH = "backend.main"
+
+# smaps_rollup field -> reported name
+_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, Optional[float]]:
+    """
+    Memory of one process in MB: rss_mb, pss_mb, shared_mb and private_mb
+    (None where the platform does not report them).
+    """
+    out: Dict[str, Optional[float]] = {name: None for name in _FIELDS.values()}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _FIELDS:
+                    out[_FIELDS[key]] = round(int(rest.split()[0]) / 1024.0, 1)
+    except OSError:
+        # No smaps_rollup (older kernel, other OS): RSS only.
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        out["rss_mb"] = round(int(line.split()[1]) / 1024.0, 1)
+        except OSError:
+            if pid == "self":
+                import resource
+
+                # Peak, not current; ru_maxrss is in KB on Linux, bytes on macOS.
+                out["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+    shared = [out["shared_clean_mb"], out["shared_dirty_mb"]]
+    private = [out["private_clean_mb"], out["private_dirty_mb"]]
+    return {
+        "rss_mb": out["rss_mb"],
+        "pss_mb": out["pss_mb"],
+        "shared_mb": round(sum(shared), 1) if None not in shared else None,
+        "private_mb": round(sum(private), 1) if None not in private else None,
+    }
+
+
+def find_processes(match: str = BACKEND_MATCH) -> List[int]:
+    """Pids whose command line contains match (this process excluded)."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        except OSError:
+            continue
+        if match in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="RSS and PSS of the backend worker processes.")
+    parser.add_argument("pids", nargs="*", type=int, help="processes to report (default: --match)")
+    parser.add_argument("--match", default=BACKEND_MATCH, help="command-line substring to find workers by")
+    args = parser.parse_args(argv)
+
+    pids = args.pids or find_processes(args.match)
+    if not pids:
+        raise SystemExit(f"No processes matching {args.match!r}")
+
+    rows = [(pid, process_memory(pid)) for pid in pids]
+    print(f"{'pid':>8} {'rss MB':>10} {'pss MB':>10} {'shared MB':>10} {'private MB':>11}")
+    for pid, mem in rows:
+        print(
+            f"{pid:>8} {mem['rss_mb'] or 0:>10.1f} {mem['pss_mb'] or 0:>10.1f} "
+            f"{mem['shared_mb'] or 0:>10.1f} {mem['private_mb'] or 0:>11.1f}"
+        )
+    total_rss = sum(mem["rss_mb"] or 0 for _, mem in rows)
+    total_pss = sum(mem["pss_mb"] or 0 for _, mem in rows)
+    print(f"{'total':>8} {total_rss:>10.1f} {total_pss:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
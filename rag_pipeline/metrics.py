@@ -0,0 +1,291 @@
+"""
+Per-stage latency histograms and counters for the RAG pipeline, exposed
+at GET /metrics in the Prometheus text format.
+
+Every stage of a request is timed into cookmate_stage_seconds{stage=...}:
+
+    query_build      build_query
+    query_encode     query embedding (cache lookups + model call)
+    index_search     Faiss index.search (the /candidates fan-out when sharded)
+    lexical_search   BM25 candidates for hybrid search
+    materialize      result dicts from the recipe store (/recipes when sharded)
+    nutrition        estimate_nutrition_from_retrieved
+    prompt_build     pack_rag_prompt
+    llm_wait         waiting for a free LLM slot (COOKMATE_LLM_MAX_CONCURRENCY)
+    llm_first_token  time to the first streamed token
+    llm_total        whole LLM call
+    validation       validate_recipe_json + local repair
+
+p50 / p99 per stage come from the buckets, e.g. in PromQL
+
+    histogram_quantile(0.99, sum by (stage, le) (rate(cookmate_stage_seconds_bucket[5m])))
+
+Metrics are per process, like GET /stats: with several uvicorn workers
+each scrape reads the worker that answered.
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from rag_pipeline.tracing import add_span
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count per label set (name should end in _total)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = next(j for j, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """
+        Estimate of the q-quantile, interpolated inside its bucket like
+        PromQL's histogram_quantile. None without observations.
+        """
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if not series or not series[2]:
+                return None
+            counts = list(series[0])
+            total = series[2]
+        rank = q * total
+        seen = 0
+        for j, n in enumerate(counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[j - 1] if j else 0.0
+                upper = self.buckets[j]
+                if upper == math.inf:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-2]
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            keys = sorted(self._series)
+        return [dict(zip(self.labelnames, key)) for key in keys]
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+registry = Registry()
+
+
+def get_registry() -> Registry:
+    return registry
+
+
+STAGE_SECONDS = registry.histogram(
+    "cookmate_stage_seconds", "Time spent in each pipeline stage.", ["stage"]
+)
+PROMPT_TOKENS = registry.histogram(
+    "cookmate_prompt_tokens", "Estimated tokens of the prompts sent to the LLM.", buckets=TOKEN_BUCKETS
+)
+REQUEST_SECONDS = registry.histogram(
+    "cookmate_request_seconds", "HTTP request latency per endpoint.", ["endpoint"]
+)
+REQUESTS = registry.counter(
+    "cookmate_requests_total", "HTTP requests per endpoint and status code.", ["endpoint", "status"]
+)
+CACHE_LOOKUPS = registry.counter(
+    "cookmate_cache_lookups_total", "Cache lookups per cache and result (hit / miss).", ["cache", "result"]
+)
+ERRORS = registry.counter(
+    "cookmate_errors_total", "Errors per pipeline stage.", ["stage"]
+)
+GENERATIONS = registry.counter(
+    "cookmate_generations_total",
+    "Finished generate requests by outcome (success, invalid_json, no_recipes, cached).",
+    ["outcome"],
+)
+RETRIES = registry.counter(
+    "cookmate_generation_retries_total", "LLM retries after invalid JSON."
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage into cookmate_stage_seconds (and as a span of the
+    current request, see rag_pipeline.tracing); count it in
+    cookmate_errors_total if it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=name)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        add_span(name, start, duration)
+
+
+def record_cache(cache: str, hit: bool, n: int = 1) -> None:
+    if n:
+        CACHE_LOOKUPS.inc(n, cache=cache, result="hit" if hit else "miss")
+
+
+def stage_summary() -> Dict[str, Dict[str, Optional[float]]]:
+    """Count, p50 and p99 (ms) per stage seen so far, for GET /stats."""
+    out = {}
+    for labels in STAGE_SECONDS.label_sets():
+        p50 = STAGE_SECONDS.quantile(0.5, **labels)
+        p99 = STAGE_SECONDS.quantile(0.99, **labels)
+        out[labels["stage"]] = {
+            "count": STAGE_SECONDS.count(**labels),
+            "p50_ms": None if p50 is None else round(1000 * p50, 3),
+            "p99_ms": None if p99 is None else round(1000 * p99, 3),
+        }
+    return out
@@ -1,8 +1,11 @@
 import os
+import re
+import hashlib
+import threading
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
-from rag_pipeline.format_retrieved import format_retrieved
+from rag_pipeline.format_retrieved import format_retrieved, pack_retrieved, estimate_tokens
 
 
 
@@ -14,42 +17,122 @@ class UserRequest:
 
 
 
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "rag_pipeline",
+    "prompt_templates",
+    "cookmate_rag_prompt.txt",
+)
+
+# Estimated tokens allowed for the retrieved-recipes block ("0" = no limit).
+CONTEXT_TOKENS = int(os.getenv("COOKMATE_CONTEXT_TOKENS", "1200"))
+
+_PLACEHOLDER = re.compile(r"\{\{([A-Z_]+)\}\}")
+
+
 def _load_template() -> str:
     """
     Load the CookMate RAG prompt template from
     rag_pipeline/prompt_templates/cookmate_rag_prompt.txt
     """
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    template_path = os.path.join(
-        base_dir,
-        "rag_pipeline",
-        "prompt_templates",
-        "cookmate_rag_prompt.txt",
-    )
-
-    with open(template_path, "r", encoding="utf-8") as f:
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
         return f.read()
 
 
+class CompiledTemplate:
+    """
+    A prompt template split once into literal text and {{PLACEHOLDER}}
+    slots, so rendering is a single join instead of re-reading the file
+    and running one replace pass per field.
 
-def build_rag_prompt(user: UserRequest, retrieved_recipes: List[Dict[str, Any]]) -> str:
+    static_prefix is the text before the first placeholder. The template
+    keeps every instruction and the JSON schema there, so it is
+    byte-identical across requests and Ollama can reuse its KV cache while
+    the model stays loaded (see COOKMATE_LLM_KEEP_ALIVE).
     """
-    Build the full RAG prompt string by:
-    - loading the template
-    - filling in {{INGREDIENTS}}, {{DIET}}, {{CUISINE}}, {{RETRIEVED_RECIPES}}
+
+    def __init__(self, text: str):
+        parts = _PLACEHOLDER.split(text)
+        # re.split alternates literal, name, literal, name, ..., literal
+        self.segments: List[Tuple[bool, str]] = [
+            (i % 2 == 1, part) for i, part in enumerate(parts) if part or i % 2 == 1
+        ]
+        self.fields = [name for is_field, name in self.segments if is_field]
+        self.static_prefix = parts[0]
+        self.prefix_sha256 = hashlib.sha256(self.static_prefix.encode("utf-8")).hexdigest()
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(values[text] if is_field else text for is_field, text in self.segments)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "fields": self.fields,
+            "static_prefix_chars": len(self.static_prefix),
+            "static_prefix_sha256": self.prefix_sha256[:16],
+        }
+
+
+_compiled = None
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_template() -> CompiledTemplate:
+    """Compile cookmate_rag_prompt.txt on first use and reuse it afterwards."""
+    global _compiled
+    if _compiled is None:
+        with _compiled_lock:
+            if _compiled is None:
+                _compiled = CompiledTemplate(_load_template())
+    return _compiled
+
+
+
+def pack_rag_prompt(
+    user: UserRequest,
+    retrieved_recipes: List[Dict[str, Any]],
+    max_context_tokens: int = CONTEXT_TOKENS,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the full RAG prompt string by filling the compiled template's
+    {{INGREDIENTS}}, {{DIET}}, {{CUISINE}} and {{RETRIEVED_RECIPES}} slots.
+    Everything before {{INGREDIENTS}} is the shared static prefix.
+
+    The retrieved recipes are packed into max_context_tokens (estimated)
+    by pack_retrieved; 0 includes all of them in full. Returns
+    (prompt, report), report describing the packed context plus the
+    estimated size of the whole prompt under "prompt_tokens".
     """
-    template = _load_template()
+    template = get_compiled_template()
 
     ingredients_text = ", ".join(user.ingredients)
 
-    retrieved_block = format_retrieved(retrieved_recipes)
+    if max_context_tokens and max_context_tokens > 0:
+        retrieved_block, report = pack_retrieved(retrieved_recipes, max_context_tokens)
+    else:
+        retrieved_block = format_retrieved(retrieved_recipes)
+        report = {
+            "budget": None,
+            "tokens": estimate_tokens(retrieved_block),
+            "recipes_total": len(retrieved_recipes),
+            "recipes_included": len(retrieved_recipes),
+        }
 
-    prompt = (
-        template
-        .replace("{{INGREDIENTS}}", ingredients_text)
-        .replace("{{DIET}}", user.diet or "none")
-        .replace("{{CUISINE}}", user.cuisine or "")
-        .replace("{{RETRIEVED_RECIPES}}", retrieved_block)
-    )
+    prompt = template.render({
+        "INGREDIENTS": ingredients_text,
+        "DIET": user.diet or "none",
+        "CUISINE": user.cuisine or "",
+        "RETRIEVED_RECIPES": retrieved_block,
+    })
+    report["prompt_tokens"] = estimate_tokens(prompt)
 
-    return prompt
\ No newline at end of file
+    return prompt, report
+
+
+
+def build_rag_prompt(user: UserRequest, retrieved_recipes: List[Dict[str, Any]]) -> str:
+    """
+    Build the full RAG prompt string (see pack_rag_prompt), with the
+    retrieved recipes limited to COOKMATE_CONTEXT_TOKENS.
+    """
+    prompt, _ = pack_rag_prompt(user, retrieved_recipes)
+    return prompt
@@ -0,0 +1,648 @@
+"""
+Columnar, memory-mapped recipe store.
+
+The cleaned recipe table is compiled once, offline, into a directory of
+flat column files:
+
+    meta.json                 row count and column layout
+    recipe_id.npy             int64, one entry per row
+    nutrition.npy             float64 (rows x 4), NaN when missing
+    <column>.bin              UTF-8 values of a text column, back to back
+    <column>.off.npy          uint64 offsets (rows + 1) into <column>.bin
+
+List columns (ingredients, quantities, steps, keywords) are parsed once
+here, whatever form the cleaned data stored them in, and packed as items:
+
+    <column>.bin              UTF-8 items, back to back
+    <column>.item_off.npy     uint64 offsets (items + 1) into <column>.bin
+    <column>.row_off.npy      uint64 offsets (rows + 1) into the items
+    <column>.null.npy         uint8, 1 where an item is missing
+
+quantities_list is aligned to ingredients_list at compile time (one entry
+per ingredient, missing ones null), so the request path never parses a
+list or merges ingredient/quantity pairs; it only slices and decodes.
+
+Every file is opened with mmap, so uvicorn workers on the same host share a
+single page-cache copy of the data, and reading row i is a couple of slices
+instead of building a pandas Series.
+
+New recipes are appended in place (append_recipe_store, used by
+rag_pipeline.ingest); meta.json is rewritten last and its row count is
+what readers go by.
+
+Builds that happen on first start (open_or_compile here, and the lexical
+and attribute indexes) hold an exclusive lock on <path>.lock, so uvicorn
+workers that start together build each file once: the others wait, then
+find it current.
+
+Build it with:
+    python -m rag_pipeline.recipe_store
+"""
+import io
+import os
+import re
+import ast
+import json
+import mmap
+import shutil
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not locked across processes
+    fcntl = None
+
+import numpy as np
+
+logger = logging.getLogger("cookmate-backend")
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+CLEAN_PATH = os.path.join(BASE_DIR, "data", "cleaned", "cleaned_recipes.json")
+STORE_DIR = os.path.join(BASE_DIR, "data", "compiled", "recipe_store")
+
+STORE_VERSION = 2
+
+# store column -> column in cleaned_recipes.json
+TEXT_COLUMNS = {
+    "title": "title",
+    "category": "RecipeCategory",
+}
+
+LIST_COLUMNS = {
+    "keywords": "Keywords",
+    "ingredients_list": "ingredients_list",
+    "quantities_list": "quantities_list",
+    "steps_list": "steps_list",
+}
+
+NUTRITION_COLUMNS = {
+    "calories": "Calories",
+    "fat": "FatContent",
+    "carbs": "CarbohydrateContent",
+    "protein": "ProteinContent",
+}
+
+
+_R_VECTOR_ITEM = re.compile(r'"(.*?)"')
+
+
+def parse_list_value(value) -> List[Optional[str]]:
+    """
+    Turn a list-like column value into a list of strings.
+    Handles:
+    - already-a-list (None items are kept as None)
+    - stringified list (e.g. '["a","b"]' or "['a','b']")
+    - R vector string as in the raw dataset (e.g. 'c("a", "b")')
+    - plain string (becomes a one-item list)
+    """
+    if value is None:
+        return []
+
+    if isinstance(value, float) and np.isnan(value):
+        return []
+
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [None if v is None else str(v) for v in value]
+
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return []
+
+        if text.startswith("c(") and text.endswith(")"):
+            return [item.strip() for item in _R_VECTOR_ITEM.findall(text[2:-1])]
+
+        if text.startswith("[") and text.endswith("]"):
+            try:
+                parsed = json.loads(text)
+            except ValueError:
+                try:
+                    parsed = ast.literal_eval(text)
+                except (ValueError, SyntaxError):
+                    parsed = None
+            if isinstance(parsed, list):
+                return [None if v is None else str(v) for v in parsed]
+
+        return [text]
+
+    return [str(value)]
+
+
+def _align_quantities(names: List[Optional[str]], qtys: List[Optional[str]]) -> List[Optional[str]]:
+    return [qtys[i] if i < len(qtys) else None for i in range(len(names))]
+
+
+def _to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and np.isnan(value):
+        return ""
+    return str(value)
+
+
+def _to_float(value) -> float:
+    try:
+        if value is None:
+            return np.nan
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _write_text_column(out_dir: str, name: str, values) -> None:
+    offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+    pos = 0
+    with open(os.path.join(out_dir, f"{name}.bin"), "wb") as f:
+        for i, value in enumerate(values):
+            data = _to_text(value).encode("utf-8")
+            f.write(data)
+            pos += len(data)
+            offsets[i + 1] = pos
+    np.save(os.path.join(out_dir, f"{name}.off.npy"), offsets)
+
+
+def _write_list_column(out_dir: str, name: str, rows: List[List[Optional[str]]]) -> None:
+    row_offsets = np.zeros(len(rows) + 1, dtype=np.uint64)
+    item_offsets = [0]
+    nulls = []
+    pos = 0
+    with open(os.path.join(out_dir, f"{name}.bin"), "wb") as f:
+        for i, items in enumerate(rows):
+            for item in items:
+                if item is None:
+                    nulls.append(1)
+                else:
+                    nulls.append(0)
+                    data = item.encode("utf-8")
+                    f.write(data)
+                    pos += len(data)
+                item_offsets.append(pos)
+            row_offsets[i + 1] = len(nulls)
+    np.save(os.path.join(out_dir, f"{name}.row_off.npy"), row_offsets)
+    np.save(os.path.join(out_dir, f"{name}.item_off.npy"), np.asarray(item_offsets, dtype=np.uint64))
+    np.save(os.path.join(out_dir, f"{name}.null.npy"), np.asarray(nulls, dtype=np.uint8))
+
+
+def _columns(df) -> Dict[str, Any]:
+    """Parse a cleaned recipe DataFrame into the values of every store column."""
+    n_rows = len(df)
+
+    nutrition = np.full((n_rows, len(NUTRITION_COLUMNS)), np.nan, dtype=np.float64)
+    for j, src in enumerate(NUTRITION_COLUMNS.values()):
+        if src in df.columns:
+            nutrition[:, j] = [_to_float(v) for v in df[src].tolist()]
+
+    texts = {}
+    for name, src in TEXT_COLUMNS.items():
+        texts[name] = df[src].tolist() if src in df.columns else [None] * n_rows
+
+    parsed = {}
+    for name, src in LIST_COLUMNS.items():
+        values = df[src].tolist() if src in df.columns else [None] * n_rows
+        parsed[name] = [parse_list_value(v) for v in values]
+
+    # Ingredient names and steps are always strings; only quantities may be missing.
+    parsed["ingredients_list"] = [
+        ["" if v is None else v for v in names] for names in parsed["ingredients_list"]
+    ]
+    parsed["steps_list"] = [
+        ["" if v is None else v for v in steps] for steps in parsed["steps_list"]
+    ]
+    parsed["quantities_list"] = [
+        _align_quantities(names, qtys)
+        for names, qtys in zip(parsed["ingredients_list"], parsed["quantities_list"])
+    ]
+
+    return {
+        "recipe_id": df["recipe_id"].to_numpy(dtype=np.int64),
+        "nutrition": nutrition,
+        "texts": texts,
+        "lists": parsed,
+    }
+
+
+def _write_meta(out_dir: str, n_rows: int) -> None:
+    meta = {
+        "version": STORE_VERSION,
+        "n_rows": n_rows,
+        "text_columns": list(TEXT_COLUMNS),
+        "list_columns": list(LIST_COLUMNS),
+        "nutrition_columns": list(NUTRITION_COLUMNS),
+    }
+    tmp_path = os.path.join(out_dir, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, "meta.json"))
+
+
+@contextmanager
+def build_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on <path>.lock while building path, so
+    processes that find path missing at the same time build it one after
+    the other. Re-check path once the lock is held.
+    """
+    lock_path = path.rstrip(os.sep) + ".lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def compile_recipe_store(df, out_dir: str = STORE_DIR) -> str:
+    """
+    Compile a cleaned recipe DataFrame (as produced by 02_clean_dataset)
+    into a recipe store at out_dir. The store is written to a fresh
+    directory next to out_dir first and swapped into place at the end, so
+    readers never see a half-written store.
+    """
+    out_dir = out_dir.rstrip(os.sep)
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(out_dir) + ".tmp-", dir=parent)
+
+    try:
+        n_rows = len(df)
+        columns = _columns(df)
+
+        np.save(os.path.join(tmp_dir, "recipe_id.npy"), columns["recipe_id"])
+        np.save(os.path.join(tmp_dir, "nutrition.npy"), columns["nutrition"])
+
+        for name, values in columns["texts"].items():
+            _write_text_column(tmp_dir, name, values)
+
+        for name, rows in columns["lists"].items():
+            _write_list_column(tmp_dir, name, rows)
+
+        _write_meta(tmp_dir, n_rows)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Move the old store aside rather than deleting it in place: open
+    # readers keep their mapped files either way.
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = tempfile.mkdtemp(prefix=os.path.basename(out_dir) + ".old-", dir=parent)
+        os.replace(out_dir, os.path.join(old_dir, "store"))
+    os.replace(tmp_dir, out_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    logger.info("STORE | compiled %d recipes into %s", n_rows, out_dir)
+    return out_dir
+
+
+def temp_path_for(path: str, suffix: str) -> str:
+    """A new, unique temporary file next to path (for write-then-rename)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=suffix, dir=directory)
+    os.close(fd)
+    return tmp_path
+
+
+# ---------- appending ----------
+
+
+def append_npy(path: str, rows: np.ndarray, keep: Optional[int] = None) -> int:
+    """
+    Append rows along the first axis of a saved .npy file, in place: the
+    new data is written at the end of the file, then the header is
+    rewritten with the new shape (numpy pads headers so the row count can
+    grow). keep, if given, first drops everything after the first keep
+    rows. Returns the new row count.
+    """
+    fmt = np.lib.format
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = fmt.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = fmt.read_array_header_2_0(f)
+        data_start = f.tell()
+
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        if fortran or rows.shape[1:] != tuple(shape[1:]):
+            raise ValueError(f"Cannot append {rows.shape} rows to {path} with shape {shape}")
+
+        n = shape[0] if keep is None else min(keep, shape[0])
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        f.truncate(data_start + n * row_bytes)
+        f.seek(0, os.SEEK_END)
+        f.write(rows.tobytes())
+
+        new_shape = (n + len(rows),) + tuple(shape[1:])
+        header = io.BytesIO()
+        header_dict = {"descr": fmt.dtype_to_descr(dtype), "fortran_order": False, "shape": new_shape}
+        if version == (1, 0):
+            fmt.write_array_header_1_0(header, header_dict)
+        else:
+            fmt.write_array_header_2_0(header, header_dict)
+
+        if header.tell() == data_start:
+            f.seek(0)
+            f.write(header.getvalue())
+            return new_shape[0]
+
+    # The header no longer fits in front of the data: copy the rows (old and
+    # appended) behind a freshly padded header and swap the file in.
+    tmp_path = path + ".tmp.npy"
+    with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+        if version == (1, 0):
+            fmt.write_array_header_1_0(dst, header_dict)
+        else:
+            fmt.write_array_header_2_0(dst, header_dict)
+        src.seek(data_start)
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, path)
+    return new_shape[0]
+
+
+def _append_bytes(bin_path: str, keep_bytes: int, chunks: List[bytes]) -> None:
+    with open(bin_path, "r+b") as f:
+        f.truncate(keep_bytes)
+        f.seek(0, os.SEEK_END)
+        f.write(b"".join(chunks))
+
+
+def _append_text_column(store_dir: str, name: str, n_rows: int, values) -> None:
+    off_path = os.path.join(store_dir, f"{name}.off.npy")
+    base = int(np.load(off_path, mmap_mode="r")[n_rows])
+
+    chunks = [_to_text(v).encode("utf-8") for v in values]
+    offsets = base + np.cumsum([len(c) for c in chunks], dtype=np.uint64)
+
+    _append_bytes(os.path.join(store_dir, f"{name}.bin"), base, chunks)
+    append_npy(off_path, offsets, keep=n_rows + 1)
+
+
+def _append_list_column(store_dir: str, name: str, n_rows: int, rows: List[List[Optional[str]]]) -> None:
+    prefix = os.path.join(store_dir, name)
+    n_items = int(np.load(f"{prefix}.row_off.npy", mmap_mode="r")[n_rows])
+    base = int(np.load(f"{prefix}.item_off.npy", mmap_mode="r")[n_items])
+
+    chunks, item_offsets, nulls, row_offsets = [], [], [], []
+    pos = base
+    for items in rows:
+        for item in items:
+            if item is None:
+                nulls.append(1)
+            else:
+                nulls.append(0)
+                data = item.encode("utf-8")
+                chunks.append(data)
+                pos += len(data)
+            item_offsets.append(pos)
+        row_offsets.append(n_items + len(nulls))
+
+    _append_bytes(f"{prefix}.bin", base, chunks)
+    append_npy(f"{prefix}.item_off.npy", np.asarray(item_offsets, dtype=np.uint64), keep=n_items + 1)
+    append_npy(f"{prefix}.null.npy", np.asarray(nulls, dtype=np.uint8), keep=n_items)
+    append_npy(f"{prefix}.row_off.npy", np.asarray(row_offsets, dtype=np.uint64), keep=n_rows + 1)
+
+
+def append_recipe_store(df, store_dir: str = STORE_DIR) -> int:
+    """
+    Append the rows of a cleaned recipe DataFrame to an existing store, in
+    place. Column files are extended first and meta.json (the row count
+    readers go by) is rewritten last, so an interrupted append leaves the
+    store as it was; whatever it wrote past the committed rows is dropped
+    by the next append. Returns the new row count.
+
+    Readers that are already open keep seeing the old rows until reopened.
+    """
+    with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != STORE_VERSION:
+        raise ValueError(
+            f"Recipe store at {store_dir} has version {meta.get('version')}, "
+            f"expected {STORE_VERSION}. Rebuild it with: python -m rag_pipeline.recipe_store"
+        )
+
+    n_rows = int(meta["n_rows"])
+    if len(df) == 0:
+        return n_rows
+    columns = _columns(df)
+
+    append_npy(os.path.join(store_dir, "recipe_id.npy"), columns["recipe_id"], keep=n_rows)
+    append_npy(os.path.join(store_dir, "nutrition.npy"), columns["nutrition"], keep=n_rows)
+    for name, values in columns["texts"].items():
+        _append_text_column(store_dir, name, n_rows, values)
+    for name, rows in columns["lists"].items():
+        _append_list_column(store_dir, name, n_rows, rows)
+
+    _write_meta(store_dir, n_rows + len(df))
+    return n_rows + len(df)
+
+
+def truncate_recipe_store(store_dir: str, n_rows: int) -> None:
+    """
+    Drop every row from n_rows on (e.g. rows of an ingest that never
+    committed). Only meta.json changes; the column files are cut back on
+    the next append.
+    """
+    with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+        current = int(json.load(f)["n_rows"])
+    if n_rows < current:
+        _write_meta(store_dir, n_rows)
+
+
+class _TextColumn:
+    """One mmap-backed text column: a byte buffer plus row offsets."""
+
+    def __init__(self, store_dir: str, name: str):
+        self.offsets = np.load(os.path.join(store_dir, f"{name}.off.npy"), mmap_mode="r")
+
+        bin_path = os.path.join(store_dir, f"{name}.bin")
+        self._file = open(bin_path, "rb")
+        if os.path.getsize(bin_path) > 0:
+            self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # mmap refuses empty files (e.g. a column that is blank everywhere)
+            self.buf = b""
+
+    def get(self, i: int) -> str:
+        start = int(self.offsets[i])
+        end = int(self.offsets[i + 1])
+        return self.buf[start:end].decode("utf-8")
+
+    def close(self) -> None:
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self._file.close()
+
+
+class _ListColumn:
+    """One mmap-backed list column: item bytes, item offsets and row offsets."""
+
+    def __init__(self, store_dir: str, name: str):
+        self.row_offsets = np.load(os.path.join(store_dir, f"{name}.row_off.npy"), mmap_mode="r")
+        self.item_offsets = np.load(os.path.join(store_dir, f"{name}.item_off.npy"), mmap_mode="r")
+        self.nulls = np.load(os.path.join(store_dir, f"{name}.null.npy"), mmap_mode="r")
+
+        bin_path = os.path.join(store_dir, f"{name}.bin")
+        self._file = open(bin_path, "rb")
+        if os.path.getsize(bin_path) > 0:
+            self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buf = b""
+
+    def get(self, i: int) -> List[Optional[str]]:
+        first, last = self.row_offsets[i : i + 2].tolist()
+        if first == last:
+            return []
+
+        offsets = self.item_offsets[first : last + 1].tolist()
+        nulls = self.nulls[first:last].tolist()
+        base = offsets[0]
+        chunk = self.buf[base : offsets[-1]]
+
+        return [
+            None if nulls[j] else chunk[offsets[j] - base : offsets[j + 1] - base].decode("utf-8")
+            for j in range(last - first)
+        ]
+
+    def close(self) -> None:
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self._file.close()
+
+
+class RecipeStore:
+    """
+    Read-only view over a compiled recipe store.
+    Row ids are the same positions used by the FAISS index.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(
+                f"Recipe store at {store_dir} has version {self.meta.get('version')}, "
+                f"expected {STORE_VERSION}. Rebuild it with: python -m rag_pipeline.recipe_store"
+            )
+
+        self.store_dir = store_dir
+        self.n_rows = int(self.meta["n_rows"])
+        # Sliced to n_rows: an interrupted append may have left rows past it.
+        self.recipe_ids = np.load(os.path.join(store_dir, "recipe_id.npy"), mmap_mode="r")[: self.n_rows]
+        self.nutrition = np.load(os.path.join(store_dir, "nutrition.npy"), mmap_mode="r")[: self.n_rows]
+        self.columns = {
+            name: _TextColumn(store_dir, name) for name in self.meta["text_columns"]
+        }
+        self.list_columns = {
+            name: _ListColumn(store_dir, name) for name in self.meta["list_columns"]
+        }
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def text(self, name: str, i: int) -> str:
+        return self.columns[name].get(i)
+
+    def list(self, name: str, i: int) -> List[Optional[str]]:
+        return self.list_columns[name].get(i)
+
+    def recipe_id(self, i: int) -> int:
+        return int(self.recipe_ids[i])
+
+    def nutrition_row(self, i: int) -> Dict[str, Optional[float]]:
+        values = self.nutrition[i]
+        return {
+            name: (None if np.isnan(v) else float(v))
+            for name, v in zip(self.meta["nutrition_columns"], values)
+        }
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """All columns of row i as a plain dict."""
+        out: Dict[str, Any] = {"recipe_id": self.recipe_id(i)}
+        for name in self.columns:
+            out[name] = self.text(name, i)
+        for name in self.list_columns:
+            out[name] = self.list(name, i)
+        out.update(self.nutrition_row(i))
+        return out
+
+    def frame(self, rows):
+        """
+        The given rows as a DataFrame in the cleaned_recipes.json schema,
+        i.e. what compile_recipe_store takes (used to split the store).
+        """
+        import pandas as pd
+
+        records = []
+        for i in rows:
+            i = int(i)
+            record: Dict[str, Any] = {"recipe_id": self.recipe_id(i)}
+            for name, src in TEXT_COLUMNS.items():
+                record[src] = self.text(name, i)
+            for name, src in LIST_COLUMNS.items():
+                record[src] = self.list(name, i)
+            nutrition = self.nutrition_row(i)
+            for name, src in NUTRITION_COLUMNS.items():
+                record[src] = nutrition[name]
+            records.append(record)
+        columns = ["recipe_id", *TEXT_COLUMNS.values(), *LIST_COLUMNS.values(), *NUTRITION_COLUMNS.values()]
+        return pd.DataFrame(records, columns=columns)
+
+    def close(self) -> None:
+        for column in [*self.columns.values(), *self.list_columns.values()]:
+            column.close()
+
+
+def _store_is_current(store_dir: str) -> bool:
+    meta_path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("version") == STORE_VERSION
+
+
+def open_or_compile(store_dir: str = STORE_DIR, clean_path: str = CLEAN_PATH) -> RecipeStore:
+    """
+    Open the store at store_dir, compiling it from clean_path first if it
+    has not been built yet or was built by an older version of this module.
+    Concurrent callers (e.g. uvicorn workers) compile it only once.
+    """
+    if not _store_is_current(store_dir):
+        with build_lock(store_dir):
+            # Another worker may have compiled it while we waited.
+            if not _store_is_current(store_dir):
+                import pandas as pd
+
+                logger.warning(
+                    "STORE | no compiled store at %s, compiling from %s (one-off)",
+                    store_dir,
+                    clean_path,
+                )
+                compile_recipe_store(pd.read_json(clean_path), store_dir)
+    return RecipeStore(store_dir)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Compile cleaned_recipes.json into a recipe store.")
+    parser.add_argument("--input", default=CLEAN_PATH, help="cleaned recipes JSON")
+    parser.add_argument("--output", default=STORE_DIR, help="store directory to write")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    compile_recipe_store(pd.read_json(args.input), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 import os
-import ast
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import faiss
-from sentence_transformers import SentenceTransformer
+
+from rag_pipeline.recipe_store import RecipeStore, STORE_DIR, open_or_compile
+from rag_pipeline.cache import EmbeddingCache, LRUCache, normalize_query
+from rag_pipeline.batcher import MicroBatcher
+from rag_pipeline.executor import run_cpu
+from rag_pipeline.lexical_index import LexicalIndex, open_or_build, rrf_fuse
+from rag_pipeline.attribute_index import AttributeIndex, MASK_CACHE_SIZE, open_or_build as open_or_build_attributes
+from rag_pipeline.ann_index import index_path, read_index, configure_index, search_parameters
+from rag_pipeline.encoders import ENCODER, ENCODER_THREADS, load_encoder
+from rag_pipeline.metrics import record_cache, stage
+from rag_pipeline.tracing import current_request_id, span
 
 logger = logging.getLogger("cookmate-backend")
 
@@ -14,147 +25,598 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 CLEAN_PATH = os.path.join(BASE_DIR, "data", "cleaned", "cleaned_recipes.json")
 EMB_PATH = os.path.join(BASE_DIR, "embeddings", "recipe_embeddings.npy")
-INDEX_PATH = os.path.join(BASE_DIR, "embeddings", "faiss_index.bin")
 IDMAP_PATH = os.path.join(BASE_DIR, "embeddings", "id_mapping.csv")
 
-df_clean = pd.read_json(CLEAN_PATH)
-embeddings = np.load(EMB_PATH).astype("float32")
-N = embeddings.shape[0]
-df_emb = df_clean.iloc[:N].reset_index(drop=True)
-
-index = faiss.read_index(INDEX_PATH)
-id_map = pd.read_csv(IDMAP_PATH)
-
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-
-def _parse_list_field(value) -> List[Any]:
+# Which index variant to load (flat, ivf_flat, ivfpq, hnsw; see
+# rag_pipeline.ann_index) and its search-time knobs: inverted lists probed
+# per query for IVF indexes, candidate list size for HNSW.
+INDEX_TYPE = os.getenv("COOKMATE_INDEX_TYPE", "flat")
+INDEX_PATH = index_path(INDEX_TYPE, os.path.join(BASE_DIR, "embeddings"))
+NPROBE = int(os.getenv("COOKMATE_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("COOKMATE_EF_SEARCH", "64"))
+
+# Map the index file instead of reading it into each process ("0" = read
+# it into memory). Mapped, uvicorn workers on a host share one read-only
+# page-cache copy, as they already do for the recipe store.
+MMAP_INDEX = os.getenv("COOKMATE_MMAP_INDEX", "1") != "0"
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Query-embedding cache: number of entries (0 disables it) and an optional
+# .npz file it is loaded from at startup and saved to at shutdown.
+EMB_CACHE_SIZE = int(os.getenv("COOKMATE_EMB_CACHE_SIZE", "2048"))
+EMB_CACHE_PATH = os.getenv("COOKMATE_EMB_CACHE_PATH") or None
+
+# Micro-batching of concurrent search_recipes calls: how long the first
+# query of a batch waits for others (0 disables batching) and the largest
+# batch dispatched at once.
+BATCH_WINDOW_MS = float(os.getenv("COOKMATE_BATCH_WINDOW_MS", "0"))
+BATCH_MAX_SIZE = int(os.getenv("COOKMATE_BATCH_MAX_SIZE", "32"))
+
+# Hybrid retrieval: FAISS and BM25 over the ingredient inverted index are
+# merged by weighted reciprocal rank fusion. A lexical weight of 0 turns
+# it off (vector-only, as before). Each ranking is taken to
+# HYBRID_CANDIDATES rows before fusing.
+HYBRID_VECTOR_WEIGHT = float(os.getenv("COOKMATE_HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("COOKMATE_HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_CANDIDATES = int(os.getenv("COOKMATE_HYBRID_CANDIDATES", "50"))
+RRF_K = float(os.getenv("COOKMATE_RRF_K", "60"))
+
+# Restrict searches to recipes matching the request's diet and cuisine
+# with precomputed bitsets ("0" = text query only, as before).
+FILTER_SEARCH = os.getenv("COOKMATE_FILTER_SEARCH", "1") != "0"
+
+
+def encode_queries(model, cache: EmbeddingCache, texts: List[str]) -> np.ndarray:
+    """Embed texts with model, through cache; all misses go in one encode call."""
+    with stage("query_encode"):
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        for i, text in enumerate(texts):
+            vec = cache.get(text)
+            if vec is None:
+                missing.setdefault(normalize_query(text), []).append(i)
+            else:
+                out[i] = vec
+        misses = sum(len(m) for m in missing.values())
+        record_cache("embedding", hit=True, n=len(texts) - misses)
+        record_cache("embedding", hit=False, n=misses)
+
+        if missing:
+            keys = list(missing)
+            fresh = model.encode(keys, normalize_embeddings=True).astype("float32")
+            for key, vec in zip(keys, fresh):
+                cache.put(key, vec)
+                for i in missing[key]:
+                    out[i] = vec
+
+        return np.vstack(out).astype("float32", copy=False)
+
+
+def fuse_candidates(
+    vector: Tuple[List[Any], List[float]],
+    lexical: Optional[Tuple[List[Any], List[float]]],
+    k: int,
+    vector_weight: float = HYBRID_VECTOR_WEIGHT,
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+    rrf_k: float = RRF_K,
+) -> Tuple[List[Any], List[float]]:
     """
-    Ensure that a column value becomes a Python list.
-    Handles:
-    - already-a-list
-    - stringified list (e.g. '["a","b"]' or "['a','b']")
-    - plain string
+    Final top-k (rows, scores) from the vector ranking and, when hybrid
+    search is on, the BM25 ranking (each a (rows, scores) pair, best
+    first). Rows can be anything hashable, e.g. (shard, row) pairs.
     """
-    if isinstance(value, list):
-        return value
+    rows, scores = vector
+    if lexical is None:
+        return list(rows[:k]), list(scores[:k])
+    fused = rrf_fuse([rows, lexical[0]], [vector_weight, lexical_weight], k, rrf_k=rrf_k)
+    return [row for row, _ in fused], [round(score, 5) for _, score in fused]
 
-    if isinstance(value, str):
-        try:
-            parsed = ast.literal_eval(value)
-            if isinstance(parsed, list):
-                return parsed
-        except Exception:
-            return [value]
 
-    if value is None:
-        return []
-
-    return [value]
-
-
-def _merge_ingredient_quantities(row: pd.Series) -> List[Dict[str, Optional[str]]]:
+class SearchEngine:
     """
-    Returns a list of objects:
-    [
-        {"ingredient": "...", "quantity": "..."},
-        ...
-    ]
+    Owns the retrieval assets (compiled recipe store, embeddings, FAISS
+    index, id mapping, ingredient inverted index, diet/cuisine bitsets and
+    the query encoder, a backend from rag_pipeline.encoders picked by
+    COOKMATE_ENCODER).
+
+    Nothing is read from disk when the engine is created. Assets are loaded
+    on the first search, or ahead of time by warmup(), and the per-asset
+    progress and load timings are reported by status().
     """
-    names = _parse_list_field(row.get("ingredients_list"))
-    qtys = _parse_list_field(row.get("quantities_list"))
-
-    merged = []
-    for i, name in enumerate(names):
-        q = qtys[i] if i < len(qtys) else None
-        merged.append(
-            {
-                "ingredient": str(name),
-                "quantity": str(q) if q is not None else None,
-            }
+
+    ASSETS = ("recipes", "embeddings", "index", "id_map", "lexical", "attributes", "model")
+
+    def __init__(
+        self,
+        clean_path: str = CLEAN_PATH,
+        store_dir: str = STORE_DIR,
+        emb_path: str = EMB_PATH,
+        index_path: str = INDEX_PATH,
+        idmap_path: str = IDMAP_PATH,
+        model_name: str = MODEL_NAME,
+        model=None,
+        encoder: str = ENCODER,
+        encoder_threads: int = ENCODER_THREADS,
+        emb_cache_size: int = EMB_CACHE_SIZE,
+        emb_cache_path: Optional[str] = EMB_CACHE_PATH,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        hybrid_candidates: int = HYBRID_CANDIDATES,
+        rrf_k: float = RRF_K,
+        filter_search: bool = FILTER_SEARCH,
+        nprobe: int = NPROBE,
+        ef_search: int = EF_SEARCH,
+        mmap_index: bool = MMAP_INDEX,
+    ):
+        self.clean_path = clean_path
+        self.store_dir = store_dir
+        self.emb_path = emb_path
+        self.index_path = index_path
+        self.idmap_path = idmap_path
+        self.model_name = model_name
+        self.encoder = encoder
+        self.encoder_threads = encoder_threads
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.filter_search = filter_search
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.mmap_index = mmap_index
+
+        self.store: Optional[RecipeStore] = None
+        self.embeddings: Optional[np.ndarray] = None
+        self.index = None
+        self.id_map: Optional[pd.DataFrame] = None
+        # Store row per index position (None: the same), see _load_id_map.
+        self._rows: Optional[np.ndarray] = None
+        self._mapped = 0
+        # Index-position bitmaps, per filter key (see AttributeIndex.filter_key).
+        self._index_masks = LRUCache(max_size=MASK_CACHE_SIZE)
+        self.lexical: Optional[LexicalIndex] = None
+        self.attributes: Optional[AttributeIndex] = None
+        self.model = model
+        # Cached vectors are only reused by the backend that computed them.
+        cache_tag = model_name if encoder == "torch" else f"{model_name}:{encoder}"
+        self.embedding_cache = EmbeddingCache(
+            max_size=emb_cache_size, path=emb_cache_path, model_name=cache_tag
         )
 
-    return merged
+        self._lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Dict[str, Any]] = {
+            name: {"state": "pending", "seconds": None, "error": None}
+            for name in self.ASSETS
+        }
+        if model is not None:
+            self._status["model"]["state"] = "ready"
+            self._status["model"]["seconds"] = 0.0
+
+    # ---------- asset loaders ----------
+
+    def _load_recipes(self):
+        self.store = open_or_compile(self.store_dir, self.clean_path)
+
+    def _load_embeddings(self):
+        # Mapped, not read: only the row count is used here, and workers
+        # share the pages if anything does read them.
+        self.embeddings = np.load(self.emb_path, mmap_mode="r")
+        N = self.embeddings.shape[0]
+        if N > len(self.store):
+            logger.warning(
+                "SEARCH | %d embeddings but only %d recipes in the store", N, len(self.store)
+            )
+
+    def _load_index(self):
+        self.index = read_index(self.index_path, mmap=self.mmap_index)
+        configure_index(self.index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def _load_id_map(self):
+        """
+        id_mapping.csv is authoritative: index position i holds the vector
+        of recipe id_map.recipe_id[i], wherever that recipe sits in the
+        store. When the two line up (the usual case, ingestion appends to
+        both in step) positions are used as store rows directly.
+        """
+        self.id_map = pd.read_csv(self.idmap_path)
+        ids = self.id_map["recipe_id"].to_numpy(dtype="int64")
+        if len(ids) != self.index.ntotal:
+            logger.warning(
+                "SEARCH | id map has %d rows but the index has %d vectors; unmapped vectors are ignored",
+                len(ids), self.index.ntotal,
+            )
+
+        store_ids = np.asarray(self.store.recipe_ids)
+        self._mapped = min(len(ids), self.index.ntotal)
+        self._rows = None
+        self._index_masks = LRUCache(max_size=MASK_CACHE_SIZE)
+        if len(store_ids) >= len(ids) and np.array_equal(store_ids[: len(ids)], ids):
+            return
+
+        order = np.argsort(store_ids, kind="stable")
+        pos = np.searchsorted(store_ids, ids, sorter=order).clip(max=max(len(order) - 1, 0))
+        rows = order[pos] if len(order) else np.zeros(len(ids), dtype="int64")
+        found = store_ids[rows] == ids if len(order) else np.zeros(len(ids), dtype=bool)
+        self._rows = np.where(found, rows, -1).astype("int64")
+        logger.warning(
+            "SEARCH | index and store are not aligned; mapping by recipe_id (%d of %d ids not in the store)",
+            int((~found).sum()), len(ids),
+        )
 
+    def _load_lexical(self):
+        # Built next to the store on first use if missing.
+        if self.lexical_weight > 0:
+            self.lexical = open_or_build(self.store)
+
+    def _load_attributes(self):
+        if self.filter_search:
+            self.attributes = open_or_build_attributes(self.store)
+
+    def _load_model(self):
+        self.model = load_encoder(self.encoder, self.model_name, threads=self.encoder_threads)
+
+    # ---------- lifecycle ----------
+
+    def load(self) -> None:
+        """
+        Load every asset that is not ready yet, in dependency order.
+        Safe to call from several threads; only one of them does the work.
+        """
+        with self._lock:
+            for name in self.ASSETS:
+                entry = self._status[name]
+                if entry["state"] == "ready":
+                    continue
+
+                entry["state"] = "loading"
+                entry["error"] = None
+                start = time.perf_counter()
+                try:
+                    getattr(self, f"_load_{name}")()
+                except Exception as e:
+                    entry["state"] = "failed"
+                    entry["error"] = repr(e)
+                    entry["seconds"] = round(time.perf_counter() - start, 3)
+                    logger.error("SEARCH | failed to load %s: %r", name, e)
+                    raise
+
+                entry["state"] = "ready"
+                entry["seconds"] = round(time.perf_counter() - start, 3)
+                logger.info("SEARCH | loaded %s in %.3fs", name, entry["seconds"])
+
+    def warmup(self) -> threading.Thread:
+        """
+        Start loading the assets in a background thread and return it.
+        Calling it again while a warmup is running returns the same thread.
+        """
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return self._warmup_thread
+
+        def _run():
+            try:
+                self.load()
+            except Exception:
+                # Already recorded in status(); the next search retries.
+                pass
+
+        self._warmup_thread = threading.Thread(
+            target=_run, name="cookmate-search-warmup", daemon=True
+        )
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def is_ready(self) -> bool:
+        return all(s["state"] == "ready" for s in self._status.values())
+
+    def status(self) -> Dict[str, Any]:
+        assets = {name: dict(entry) for name, entry in self._status.items()}
+        loaded = sum(1 for s in assets.values() if s["state"] == "ready")
+        return {
+            "ready": loaded == len(assets),
+            "loaded": loaded,
+            "total": len(assets),
+            "assets": assets,
+            "encoder": {"backend": self.encoder, "threads": self.encoder_threads},
+        }
 
-def _extract_steps(row: pd.Series) -> List[str]:
-    steps = _parse_list_field(row.get("steps_list"))
-    return [str(s) for s in steps]
+    # ---------- retrieval ----------
+
+    def _to_store_rows(self, indices: np.ndarray) -> np.ndarray:
+        """Index positions -> store rows; -1 for no hit or a vector missing from the id map."""
+        indices = np.where(indices < self._mapped, indices, -1)
+        if self._rows is None:
+            return indices
+        return np.where(indices >= 0, self._rows[indices.clip(min=0)], -1)
+
+    def _index_mask(self, key: Tuple[Optional[str], Optional[str]], mask: np.ndarray) -> np.ndarray:
+        """The store-row bitmap of filter key as a bitmap over index positions."""
+        if self._rows is None:
+            return mask
+        index_mask = self._index_masks.get(key)
+        if index_mask is None:
+            allowed = (self._rows >= 0) & self.attributes.allows(mask, self._rows.clip(min=0))
+            index_mask = np.packbits(allowed, bitorder="little")
+            self._index_masks.put(key, index_mask)
+        return index_mask
+
+    def _materialize(self, idx: int) -> Dict[str, Any]:
+        """
+        Build the result dict for one store row. Every list field comes out
+        of the store already parsed, with quantities aligned to ingredients.
+        """
+        store = self.store
+        names = store.list("ingredients_list", idx)
+        qtys = store.list("quantities_list", idx)
+
+        result = {
+            "recipe_id": store.recipe_id(idx),
+            "title": store.text("title", idx),
+            "ingredients_list": names,
+            "ingredients_structured": [
+                {"ingredient": name, "quantity": q} for name, q in zip(names, qtys)
+            ],
+            "steps_list": store.list("steps_list", idx),
+        }
+        result.update(store.nutrition_row(idx))
+        return result
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed query strings, serving repeats from the embedding cache and
+        encoding all misses in one model call.
+        """
+        return encode_queries(self.model, self.embedding_cache, texts)
+
+    def _filter_masks(self, n: int, filters: Optional[List[Optional[Dict[str, Optional[str]]]]]):
+        """
+        Per query: filter key (None for no filter), packed row bitmap or
+        None, and a description of the filter.
+        """
+        keys: List[Optional[Tuple[Optional[str], Optional[str]]]] = [None] * n
+        masks: List[Optional[np.ndarray]] = [None] * n
+        infos: List[Optional[Dict[str, Any]]] = [None] * n
+        if self.attributes is None or not filters:
+            return keys, masks, infos
+        for i, f in enumerate(filters):
+            if f:
+                keys[i] = self.attributes.filter_key(f.get("diet"), f.get("cuisine"))
+                masks[i], infos[i] = self.attributes.mask(f.get("diet"), f.get("cuisine"))
+        return keys, masks, infos
+
+    def candidates(
+        self,
+        query_emb: np.ndarray,
+        queries: List[str],
+        depth: int,
+        filters: Optional[List[Optional[Dict[str, Optional[str]]]]] = None,
+        lexical: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Unfused candidates per query: the top-depth vector hits as
+        (store rows, inner-product scores), the top-depth BM25 hits the
+        same way when hybrid search is on and lexical is true (else None),
+        and the filter that was applied. search_batch fuses them; a shard worker returns them
+        to the coordinator, which fuses across shards (rag_pipeline.shards).
+
+        One matrix index.search runs per distinct filter; matching rows are
+        selected inside index.search through a Faiss IDSelectorBitmap, so
+        the top-depth already respects the filter.
+        """
+        if not self.is_ready():
+            self.load()
+
+        depth = min(depth, self.index.ntotal)
+        keys, masks, infos = self._filter_masks(len(queries), filters)
+
+        # Queries with the same filter key share one index.search call.
+        groups: Dict[Any, List[int]] = {}
+        for i, mask in enumerate(masks):
+            groups.setdefault(keys[i] if mask is not None else None, []).append(i)
+
+        all_scores = np.empty((len(queries), depth), dtype="float32")
+        all_indices = np.empty((len(queries), depth), dtype="int64")
+        for key, members in groups.items():
+            mask = masks[members[0]]
+            params = None
+            if mask is not None:
+                params = search_parameters(
+                    self.index,
+                    self.attributes.selector(self._index_mask(key, mask)),
+                    nprobe=self.nprobe,
+                    ef_search=self.ef_search,
+                )
+            with stage("index_search"):
+                scores, indices = self.index.search(query_emb[members], depth, params=params)
+            all_scores[members] = scores
+            all_indices[members] = self._to_store_rows(indices)
+
+        out = []
+        for query_text, scores, indices, mask, info in zip(queries, all_scores, all_indices, masks, infos):
+            # Deduplicate indices while preserving order (-1 means no hit)
+            seen = set()
+            rows, row_scores = [], []
+            for idx, s in zip(indices, scores):
+                idx_int = int(idx)
+                if idx_int >= 0 and idx_int not in seen:
+                    seen.add(idx_int)
+                    rows.append(idx_int)
+                    row_scores.append(float(s))
+
+            lexical_hits = None
+            if lexical and self.lexical is not None:
+                with stage("lexical_search"):
+                    lexical_rows, lexical_scores = self.lexical.search(query_text, depth)
+                if mask is not None:
+                    keep = self.attributes.allows(mask, lexical_rows)
+                    lexical_rows, lexical_scores = lexical_rows[keep], lexical_scores[keep]
+                lexical_hits = (lexical_rows.tolist(), lexical_scores.tolist())
+
+            out.append({"vector": (rows, row_scores), "lexical": lexical_hits, "filter": info})
+        return out
+
+    def materialize(self, rows: List[int]) -> List[Dict[str, Any]]:
+        return [self._materialize(row) for row in rows]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filters: Optional[List[Optional[Dict[str, Optional[str]]]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search several query strings at once: one batched encode and one
+        matrix index.search per distinct filter, then results are built
+        per query.
+
+        filters: optional {"diet": ..., "cuisine": ...} (or None) per
+        query; see candidates().
+
+        Returns one top-k result list per query, in input order.
+        """
+        if not queries:
+            return []
+
+        if not self.is_ready():
+            self.load()
+
+        query_emb = self.encode(queries)
+
+        k = min(k, self.index.ntotal)
+        depth = max(k, self.hybrid_candidates) if self.lexical is not None else k
+
+        batch_results: List[List[Dict[str, Any]]] = []
+        for query_text, found in zip(queries, self.candidates(query_emb, queries, depth, filters)):
+            rows, scores = fuse_candidates(
+                found["vector"],
+                found["lexical"],
+                k,
+                vector_weight=self.vector_weight,
+                lexical_weight=self.lexical_weight,
+                rrf_k=self.rrf_k,
+            )
+            with stage("materialize"):
+                batch_results.append(self.materialize(rows))
+
+            logger.info(
+                "RETRIEVAL | query='%s' | top_k=%d | filter=%s | indices=%s | scores=%s | request_id=%s",
+                query_text,
+                k,
+                found["filter"],
+                rows,
+                scores,
+                current_request_id(),
+            )
+
+        return batch_results
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        diet: Optional[str] = None,
+        cuisine: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search recipes using a free-form query string (already built by build_query).
+        Returns top-k matching recipes as a list of dicts, including structured
+        ingredients with quantities and full steps.
+        diet/cuisine, if given, restrict the search (see search_batch).
+        """
+        filters = [{"diet": diet, "cuisine": cuisine}] if (diet or cuisine) else None
+        return self.search_batch([query], k=k, filters=filters)[0]
+
+
+# Sharded mode: with COOKMATE_SHARDS set to the shard worker addresses
+# (comma-separated, see rag_pipeline.shards), searches fan out to the
+# workers through a coordinator instead of loading the assets here.
+SHARDS = [a.strip() for a in os.getenv("COOKMATE_SHARDS", "").split(",") if a.strip()]
+
+
+def _create_engine():
+    if SHARDS:
+        from rag_pipeline.shards import ShardedSearch
+
+        return ShardedSearch(SHARDS)
+    return SearchEngine()
+
+
+# Process-wide engine used by the backend and the notebooks.
+# Creating it is cheap; assets are loaded on first use or by warmup().
+engine = _create_engine()
+
+
+def get_engine() -> SearchEngine:
+    return engine
+
+
+batcher: Optional[MicroBatcher] = None
+if BATCH_WINDOW_MS > 0:
+    batcher = MicroBatcher(
+        lambda queries, k, filters=None: engine.search_batch(queries, k=k, filters=filters),
+        window_ms=BATCH_WINDOW_MS,
+        max_batch_size=BATCH_MAX_SIZE,
+    )
 
 
-def _safe_float(x) -> Optional[float]:
-    try:
-        if x is None or (isinstance(x, float) and np.isnan(x)):
-            return None
-        return float(x)
-    except Exception:
-        return None
+def get_batcher() -> Optional[MicroBatcher]:
+    return batcher
 
 
-def search_recipes(query: str, k: int = 5) -> List[Dict[str, Any]]:
+def search_recipes(
+    query: str,
+    k: int = 5,
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+) -> List[Dict[str, Any]]:
     """
     Search recipes using a free-form query string (already built by build_query).
     Returns top-k matching recipes as a list of dicts, including structured
     ingredients with quantities and full steps.
-    """
-    query_text = query
-
-    query_emb = model.encode(
-        [query_text],
-        normalize_embeddings=True,
-    ).astype("float32")
 
-    ntotal = index.ntotal
-    if k > ntotal:
-        k = ntotal
+    diet and cuisine, if given, pre-filter the index: a "vegan" search only
+    returns recipes whose ingredients are vegan (COOKMATE_FILTER_SEARCH).
 
-    scores, indices = index.search(query_emb, k)
-    scores = scores[0]
-    indices = indices[0]
-
-    # Deduplicate indices while preserving order
-    seen = set()
-    unique_indices = []
-    unique_scores = []
-
-    for idx, s in zip(indices, scores):
-        idx_int = int(idx)
-        if idx_int not in seen:
-            seen.add(idx_int)
-            unique_indices.append(idx_int)
-            unique_scores.append(float(s))
-
-    indices = unique_indices
-    scores = unique_scores
-
-    results: List[Dict[str, Any]] = []
-
-    for idx in indices:
-        row = df_emb.iloc[int(idx)]
-
-        structured_ingredients = _merge_ingredient_quantities(row)
-        steps = _extract_steps(row)
-
-        result = {
-            "recipe_id": int(row["recipe_id"]),
-            "title": row["title"],
-            "ingredients_list": _parse_list_field(row.get("ingredients_list")),
-            "ingredients_structured": structured_ingredients,
-            "steps_list": steps,
-            "calories": _safe_float(row.get("Calories")),
-            "fat": _safe_float(row.get("FatContent")),
-            "carbs": _safe_float(row.get("CarbohydrateContent")),
-            "protein": _safe_float(row.get("ProteinContent")),
-        }
-
-        results.append(result)
-
-    logger.info(
-        "RETRIEVAL | query='%s' | top_k=%d | indices=%s | scores=%s",
-        query_text,
-        k,
-        indices,
-        scores,
-    )
-
-    return results
+    When COOKMATE_BATCH_WINDOW_MS is set, concurrent calls are coalesced
+    into batched searches by the micro-batcher.
+    """
+    with span("search"):
+        if batcher is not None:
+            filters = {"diet": diet, "cuisine": cuisine} if (diet or cuisine) else None
+            return batcher.search(query, k=k, filters=filters)
+        return engine.search(query, k=k, diet=diet, cuisine=cuisine)
+
+
+async def search_recipes_async(
+    query: str,
+    k: int = 5,
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Coroutine version of search_recipes for the async backend. With the
+    micro-batcher on, the query is submitted from the event loop and its
+    future awaited, so a query waiting for its batch holds no CPU-pool
+    thread; otherwise the search runs on the CPU pool.
+    """
+    if batcher is None:
+        return await run_cpu(search_recipes, query, k=k, diet=diet, cuisine=cuisine)
+    with span("search"):
+        filters = {"diet": diet, "cuisine": cuisine} if (diet or cuisine) else None
+        return await asyncio.wrap_future(batcher.submit(query, k=k, filters=filters))
+
+
+def search_recipes_batch(
+    queries: List[str],
+    k: int = 5,
+    filters: Optional[List[Optional[Dict[str, Optional[str]]]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Batched version of search_recipes: encodes all queries in one call and
+    runs one FAISS search per distinct filter. Returns one result list per
+    query. filters: optional {"diet": ..., "cuisine": ...} per query.
+    """
+    with span("search"):
+        return engine.search_batch(queries, k=k, filters=filters)
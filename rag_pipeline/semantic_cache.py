@@ -0,0 +1,186 @@
+"""
+Semantic near-duplicate cache for generated recipes.
+
+Pantries that differ only trivially ("tomato, garlic, pasta" vs
+"garlic, tomatoes, pasta") miss the exact result cache. SemanticCache
+embeds the build_query text with the retrieval encoder and looks it up in
+a small FAISS index of previously generated recipes. A stored recipe is
+served only if
+
+- the cosine similarity is at least `threshold`,
+- diet and cuisine match exactly (case-insensitive), and
+- every pantry ingredient of the new request appears in the stored
+  recipe's ingredients.
+
+Entries are evicted least-recently-used once max_entries is reached.
+"""
+import copy
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger("cookmate-backend")
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+# Stored recipes compared per lookup (the best passing one wins).
+CANDIDATES = 8
+
+
+def _norm(text: Optional[str]) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def _ingredient_names(recipe: Dict[str, Any]) -> List[str]:
+    names = []
+    for item in recipe.get("ingredients") or []:
+        if isinstance(item, dict):
+            item = item.get("item") or item.get("ingredient") or item.get("name") or ""
+        names.append(_norm(item))
+    return names
+
+
+def _covered(pantry_item: str, ingredient_names: List[str]) -> bool:
+    item = _norm(pantry_item)
+    if not item:
+        return True
+    # Crude singular so "tomatoes" is covered by "tomato".
+    forms = {item}
+    if item.endswith("es"):
+        forms.add(item[:-2])
+    if item.endswith("s"):
+        forms.add(item[:-1])
+    return any(form in name for form in forms for name in ingredient_names)
+
+
+class SemanticCache:
+    """
+    encode_fn: function(list of texts) -> normalized embeddings,
+               e.g. SearchEngine.encode (so lookups share its query cache)
+    """
+
+    def __init__(self, encode_fn: EncodeFn, threshold: float = 0.92, max_entries: int = 1000):
+        self.encode_fn = encode_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._index = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+        self._similarities: "deque[float]" = deque(maxlen=2048)
+
+    def _embed(self, query: str) -> np.ndarray:
+        return np.asarray(self.encode_fn([query]), dtype="float32").reshape(1, -1)
+
+    def lookup(
+        self,
+        query: str,
+        pantry: List[str],
+        diet: Optional[str],
+        cuisine: Optional[str],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return a deep copy of a stored result for a near-duplicate request,
+        with its similarity under "cache_similarity", or None.
+        """
+        if self.max_entries <= 0:
+            return None
+
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+        vec = self._embed(query)
+
+        with self._lock:
+            k = min(CANDIDATES, self._index.ntotal)
+            scores, ids = self._index.search(vec, k)
+
+            best = float(scores[0][0]) if ids[0][0] >= 0 else 0.0
+            self._similarities.append(best)
+
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if entry["diet"] != _norm(diet) or entry["cuisine"] != _norm(cuisine):
+                    self.rejected += 1
+                    continue
+                if not all(_covered(p, entry["ingredients"]) for p in pantry):
+                    self.rejected += 1
+                    continue
+
+                self._entries.move_to_end(int(entry_id))
+                self.hits += 1
+                result = copy.deepcopy(entry["result"])
+                result["cache_similarity"] = round(float(score), 4)
+                return result
+
+            self.misses += 1
+            return None
+
+    def add(
+        self,
+        query: str,
+        pantry: List[str],
+        diet: Optional[str],
+        cuisine: Optional[str],
+        result: Dict[str, Any],
+    ) -> None:
+        """Store a validated result under the embedding of its query."""
+        if self.max_entries <= 0:
+            return
+
+        vec = self._embed(query)
+
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+
+            while len(self._entries) >= self.max_entries:
+                old_id, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([old_id], dtype="int64"))
+                self.evictions += 1
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = {
+                "diet": _norm(diet),
+                "cuisine": _norm(cuisine),
+                "ingredients": _ingredient_names(result.get("recipe") or {}),
+                "result": copy.deepcopy(result),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sims = sorted(self._similarities)
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected_candidates": self.rejected,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "best_similarity": {
+                    "mean": round(float(np.mean(sims)), 4) if sims else 0.0,
+                    "p50": round(sims[len(sims) // 2], 4) if sims else 0.0,
+                    "max": round(sims[-1], 4) if sims else 0.0,
+                },
+            }
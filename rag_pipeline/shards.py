@@ -0,0 +1,758 @@
+"""
+Sharded retrieval.
+
+The corpus is partitioned by recipe id (recipe_id % N) into N shard
+directories, each laid out the way a SearchEngine loads it:
+
+    <out>/shards.json                  manifest
+    <out>/shard_00/recipe_store/       with its lexical.npz / attributes.npz
+    <out>/shard_00/recipe_embeddings.npy
+    <out>/shard_00/faiss_index*.bin
+    <out>/shard_00/id_mapping.csv
+
+Each shard is served by a small worker process, over HTTP on a port or on
+a Unix socket. Workers never load the encoder; the coordinator embeds a
+query once and sends the vector:
+
+    POST /candidates   top-depth vector and BM25 hits per query (shard rows + scores)
+    POST /recipes      recipe dicts for shard rows
+    GET  /health       shard size
+
+ShardedSearch, the coordinator, has the SearchEngine interface. It sends
+/candidates to every shard in parallel, merges the vector hits by
+inner-product score and the BM25 hits by BM25 score (each shard's BM25
+uses its own term statistics, which hash partitioning keeps close to the
+global ones), fuses the two rankings as a single engine does and fetches
+only the final top-k recipes. A shard that fails or misses
+COOKMATE_SHARD_TIMEOUT_MS is left out of that search, logged and counted
+in stats(), instead of failing it. A shard that failed its /health
+check is checked again by status() / is_ready(), and counts as ready as
+soon as it answers a search.
+
+Setting COOKMATE_SHARDS to the worker addresses routes search_recipes
+through the coordinator. On one machine:
+
+    python -m rag_pipeline.shards split --shards 4 --output data/shards
+    python -m rag_pipeline.shards launch data/shards --base-port 8100
+    COOKMATE_SHARDS=http://127.0.0.1:8100,http://127.0.0.1:8101,... uvicorn backend.main:app
+"""
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import argparse
+import logging
+import threading
+import subprocess
+import socketserver
+import http.client
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import faiss
+
+from rag_pipeline.recipe_store import RecipeStore, STORE_DIR, compile_recipe_store
+from rag_pipeline.ann_index import build_index, index_path
+from rag_pipeline.lexical_index import build_lexical_index
+from rag_pipeline.attribute_index import build_attribute_index
+from rag_pipeline.cache import EmbeddingCache
+from rag_pipeline.metrics import ERRORS, stage
+from rag_pipeline.tracing import current_request_id
+
+# rag_pipeline.search creates a ShardedSearch when COOKMATE_SHARDS is set,
+# so it is imported inside the functions below, not here.
+
+logger = logging.getLogger("cookmate-backend")
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+SHARDS_DIR = os.path.join(BASE_DIR, "data", "shards")
+MANIFEST_FILE = "shards.json"
+
+# How long a search waits for the shards; the ones that have not
+# answered by then are left out of the results.
+SHARD_TIMEOUT_MS = float(os.getenv("COOKMATE_SHARD_TIMEOUT_MS", "1000"))
+# Shards that failed their health check are probed again by /ready at
+# most this often (a search that reaches them also marks them ready).
+SHARD_REPROBE_S = float(os.getenv("COOKMATE_SHARD_REPROBE_S", "5"))
+
+
+# ---------- splitting ----------
+
+
+def split_corpus(
+    n_shards: int,
+    out_dir: str = SHARDS_DIR,
+    store_dir: str = STORE_DIR,
+    emb_path: Optional[str] = None,
+    idmap_path: Optional[str] = None,
+    index_type: str = "flat",
+) -> Dict[str, Any]:
+    """
+    Partition the indexed recipes into n_shards shard directories by
+    recipe_id % n_shards and write the manifest. Returns the manifest.
+    """
+    from rag_pipeline.search import EMB_PATH, IDMAP_PATH
+
+    store = RecipeStore(store_dir)
+    ids = pd.read_csv(idmap_path or IDMAP_PATH)["recipe_id"].to_numpy(dtype="int64")
+    embeddings = np.load(emb_path or EMB_PATH, mmap_mode="r")
+
+    # Store row of every indexed recipe, through the id map.
+    store_ids = np.asarray(store.recipe_ids)
+    order = np.argsort(store_ids, kind="stable")
+    rows = order[np.searchsorted(store_ids, ids, sorter=order).clip(max=len(order) - 1)]
+    if not np.array_equal(store_ids[rows], ids):
+        raise ValueError(f"Some ids in the id map are not in the recipe store at {store_dir}")
+
+    manifest: Dict[str, Any] = {
+        "n_shards": n_shards,
+        "partition": "recipe_id % n_shards",
+        "index_type": index_type,
+        "shards": [],
+    }
+    for shard in range(n_shards):
+        positions = np.flatnonzero(ids % n_shards == shard)
+        shard_dir = os.path.join(out_dir, f"shard_{shard:02d}")
+        os.makedirs(shard_dir, exist_ok=True)
+
+        shard_store_dir = compile_recipe_store(store.frame(rows[positions]), os.path.join(shard_dir, "recipe_store"))
+        vectors = np.ascontiguousarray(embeddings[positions], dtype="float32")
+        np.save(os.path.join(shard_dir, "recipe_embeddings.npy"), vectors)
+        faiss.write_index(build_index(vectors, index_type), index_path(index_type, shard_dir))
+        pd.DataFrame({"recipe_id": ids[positions]}).to_csv(os.path.join(shard_dir, "id_mapping.csv"), index=False)
+
+        shard_store = RecipeStore(shard_store_dir)
+        build_lexical_index(shard_store)
+        build_attribute_index(shard_store)
+        shard_store.close()
+
+        manifest["shards"].append({"id": shard, "dir": os.path.basename(shard_dir), "n_docs": int(len(positions))})
+        logger.info("SHARDS | shard %d: %d recipes -> %s", shard, len(positions), shard_dir)
+
+    store.close()
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(out_dir: str = SHARDS_DIR) -> Dict[str, Any]:
+    with open(os.path.join(out_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- worker ----------
+
+
+class _NoEncoder:
+    """Shard workers search vectors the coordinator already computed."""
+
+    def encode(self, texts, **kwargs):
+        raise RuntimeError("shard workers do not encode queries")
+
+
+def shard_engine(shard_dir: str):
+    """A SearchEngine over one shard directory (no encoder, no query cache)."""
+    from rag_pipeline.search import INDEX_TYPE, SearchEngine
+
+    return SearchEngine(
+        clean_path=os.path.join(shard_dir, "cleaned_recipes.json"),
+        store_dir=os.path.join(shard_dir, "recipe_store"),
+        emb_path=os.path.join(shard_dir, "recipe_embeddings.npy"),
+        index_path=index_path(INDEX_TYPE, shard_dir),
+        idmap_path=os.path.join(shard_dir, "id_mapping.csv"),
+        model=_NoEncoder(),
+        emb_cache_size=0,
+        emb_cache_path=None,
+    )
+
+
+def encode_vectors(vectors: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype="float32").tobytes()).decode("ascii")
+
+
+def decode_vectors(data: str, n: int) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="float32").reshape(n, -1)
+
+
+class ShardWorker:
+    """Answers the worker endpoints for one shard."""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        self.engine = shard_engine(shard_dir)
+
+    def candidates(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        queries = body["queries"]
+        found = self.engine.candidates(
+            decode_vectors(body["vectors"], len(queries)),
+            queries,
+            int(body["depth"]),
+            body.get("filters"),
+            lexical=body.get("lexical", True),
+        )
+        return {
+            "results": [
+                {
+                    "vector": {"rows": f["vector"][0], "scores": f["vector"][1]},
+                    "lexical": None if f["lexical"] is None else {"rows": f["lexical"][0], "scores": f["lexical"][1]},
+                    "filter": f["filter"],
+                }
+                for f in found
+            ]
+        }
+
+    def recipes(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return {"recipes": self.engine.materialize([int(r) for r in body["rows"]])}
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "shard": self.shard_dir, "n_docs": len(self.engine.store)}
+
+
+def _handler(worker: ShardWorker):
+    routes = {"/candidates": worker.candidates, "/recipes": worker.recipes}
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so the coordinator reuses its connections.
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The coordinator timed out and closed the connection.
+                self.close_connection = True
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, worker.health())
+            else:
+                self._send(404, {"error": f"no route {self.path}"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            route = routes.get(self.path)
+            if route is None:
+                self._send(404, {"error": f"no route {self.path}"})
+                return
+            try:
+                self._send(200, route(body))
+            except Exception as e:
+                logger.exception("SHARDS | %s failed", self.path)
+                self._send(500, {"error": repr(e)})
+
+    return Handler
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a (host, port) address.
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(worker: ShardWorker, host: str = "127.0.0.1", port: int = 0, socket_path: Optional[str] = None):
+    """The worker's HTTP server on host:port, or on a Unix socket."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return _UnixHTTPServer(socket_path, _handler(worker))
+    return ThreadingHTTPServer((host, port), _handler(worker))
+
+
+def serve(shard_dir: str, host: str = "127.0.0.1", port: int = 0, socket_path: Optional[str] = None) -> None:
+    worker = ShardWorker(shard_dir)
+    worker.engine.load()
+    server = make_server(worker, host, port, socket_path)
+    address = f"unix:{socket_path}" if socket_path else f"http://{host}:{server.server_address[1]}"
+    logger.info("SHARDS | serving %s (%d recipes) on %s", shard_dir, len(worker.engine.store), address)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# ---------- coordinator ----------
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class ShardCall:
+    """One request in flight; abandon() closes its connection from another thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conn: Optional[http.client.HTTPConnection] = None
+        self.abandoned = False
+
+    def attach(self, conn: Optional[http.client.HTTPConnection]) -> bool:
+        """Track conn (None to stop tracking); False if the call was already abandoned."""
+        with self._lock:
+            self.conn = conn
+            return not self.abandoned
+
+    def abandon(self) -> None:
+        with self._lock:
+            self.abandoned = True
+            conn = self.conn
+        if conn is not None and conn.sock is not None:
+            # Wakes the thread blocked on the response, which then closes the connection.
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class ShardClient:
+    """Pooled keep-alive connections to one shard worker, plus its counters."""
+
+    def __init__(self, address: str, timeout: float):
+        self.address = address
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.address.startswith("unix:"):
+            return _UnixHTTPConnection(self.address[len("unix:"):], self.timeout)
+        url = urlsplit(self.address)
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        call: Optional[ShardCall] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        conn = conn or self._connect()
+
+        start = time.perf_counter()
+        try:
+            if call is not None and not call.attach(conn):
+                raise socket.timeout(f"{self.address}{path} abandoned before it was sent")
+            body = None if payload is None else json.dumps(payload).encode("utf-8")
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"{self.address}{path} returned {response.status}: {data[:200]!r}")
+        except Exception:
+            if call is not None:
+                call.attach(None)
+            conn.close()
+            raise
+
+        # A connection the caller gave up on may have been shut down under us.
+        reusable = call is None or call.attach(None)
+        if not reusable:
+            conn.close()
+        with self._lock:
+            if reusable:
+                self._idle.append(conn)
+            self.requests += 1
+            self.seconds += time.perf_counter() - start
+        return json.loads(data)
+
+    def record_failure(self, timeout: bool) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "address": self.address,
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "mean_ms": round(1000.0 * self.seconds / self.requests, 3) if self.requests else None,
+            }
+
+
+class ShardedSearch:
+    """
+    Scatter-gather search over shard workers, with the SearchEngine
+    interface the backend uses (search, search_batch, encode, warmup,
+    status, embedding_cache).
+    """
+
+    def __init__(
+        self,
+        addresses: List[str],
+        timeout_ms: float = SHARD_TIMEOUT_MS,
+        model=None,
+        model_name: Optional[str] = None,
+        encoder: Optional[str] = None,
+        encoder_threads: Optional[int] = None,
+        emb_cache_size: Optional[int] = None,
+        emb_cache_path: Optional[str] = None,
+        vector_weight: Optional[float] = None,
+        lexical_weight: Optional[float] = None,
+        hybrid_candidates: Optional[int] = None,
+        rrf_k: Optional[float] = None,
+        reprobe_s: float = SHARD_REPROBE_S,
+    ):
+        from rag_pipeline import search
+
+        def pick(value, default):
+            return default if value is None else value
+
+        self.timeout = timeout_ms / 1000.0
+        self.reprobe_s = reprobe_s
+        self._next_reprobe = 0.0
+        self.clients = [ShardClient(a, self.timeout) for a in addresses]
+        self.model_name = pick(model_name, search.MODEL_NAME)
+        self.encoder = pick(encoder, search.ENCODER)
+        self.encoder_threads = pick(encoder_threads, search.ENCODER_THREADS)
+        self.vector_weight = pick(vector_weight, search.HYBRID_VECTOR_WEIGHT)
+        self.lexical_weight = pick(lexical_weight, search.HYBRID_LEXICAL_WEIGHT)
+        self.hybrid_candidates = pick(hybrid_candidates, search.HYBRID_CANDIDATES)
+        self.rrf_k = pick(rrf_k, search.RRF_K)
+
+        self.model = model
+        cache_tag = self.model_name if self.encoder == "torch" else f"{self.model_name}:{self.encoder}"
+        self.embedding_cache = EmbeddingCache(
+            max_size=pick(emb_cache_size, search.EMB_CACHE_SIZE),
+            path=pick(emb_cache_path, search.EMB_CACHE_PATH),
+            model_name=cache_tag,
+        )
+
+        self._pool = ThreadPoolExecutor(max_workers=max(4, 2 * len(addresses)), thread_name_prefix="cookmate-shard")
+        self._lock = threading.Lock()
+        self._reprobe_lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Dict[str, Any]] = {
+            name: {"state": "pending", "seconds": None, "error": None}
+            for name in ["model", *(f"shard:{a}" for a in addresses)]
+        }
+        if model is not None:
+            self._status["model"].update(state="ready", seconds=0.0)
+        self.searches = 0
+        self.partial_searches = 0
+
+    # ---------- lifecycle ----------
+
+    def load(self) -> None:
+        """Load the encoder and check every shard answers /health."""
+        with self._lock:
+            for name, entry in self._status.items():
+                if entry["state"] == "ready":
+                    continue
+                entry["state"] = "loading"
+                start = time.perf_counter()
+                try:
+                    if name == "model":
+                        from rag_pipeline.encoders import load_encoder
+
+                        self.model = load_encoder(self.encoder, self.model_name, threads=self.encoder_threads)
+                    else:
+                        self._client(name).request("GET", "/health")
+                except Exception as e:
+                    entry.update(state="failed", error=repr(e), seconds=round(time.perf_counter() - start, 3))
+                    logger.error("SHARDS | failed to load %s: %r", name, e)
+                    if name == "model":
+                        raise
+                    continue
+                entry.update(state="ready", error=None, seconds=round(time.perf_counter() - start, 3))
+
+    def warmup(self) -> threading.Thread:
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return self._warmup_thread
+
+        def _run():
+            try:
+                self.load()
+            except Exception:
+                pass
+
+        self._warmup_thread = threading.Thread(target=_run, name="cookmate-search-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _client(self, name: str) -> ShardClient:
+        return self.clients[list(self._status).index(name) - 1]
+
+    def _mark_ready(self, i: int) -> None:
+        entry = self._status[f"shard:{self.clients[i].address}"]
+        if entry["state"] == "failed":
+            entry.update(state="ready", error=None)
+            logger.info("SHARDS | %s is back", self.clients[i].address)
+
+    def _reprobe(self) -> None:
+        """Check /health again on the shards that failed it, at most every reprobe_s."""
+        with self._reprobe_lock:
+            now = time.monotonic()
+            if now < self._next_reprobe:
+                return
+            self._next_reprobe = now + self.reprobe_s
+            failed = [i for i, c in enumerate(self.clients) if self._status[f"shard:{c.address}"]["state"] == "failed"]
+        for i in failed:
+            try:
+                self.clients[i].request("GET", "/health")
+            except Exception as e:
+                self._status[f"shard:{self.clients[i].address}"]["error"] = repr(e)
+                continue
+            self._mark_ready(i)
+
+    def is_ready(self) -> bool:
+        self._reprobe()
+        return all(s["state"] == "ready" for s in self._status.values())
+
+    def status(self) -> Dict[str, Any]:
+        self._reprobe()
+        assets = {name: dict(entry) for name, entry in self._status.items()}
+        loaded = sum(1 for s in assets.values() if s["state"] == "ready")
+        return {
+            "ready": loaded == len(assets),
+            "loaded": loaded,
+            "total": len(assets),
+            "assets": assets,
+            "encoder": {"backend": self.encoder, "threads": self.encoder_threads},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "partial_searches": self.partial_searches,
+            "timeout_ms": self.timeout * 1000.0,
+            "shards": [c.stats() for c in self.clients],
+        }
+
+    # ---------- retrieval ----------
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        from rag_pipeline.search import encode_queries
+
+        if self.model is None:
+            self.load()
+        return encode_queries(self.model, self.embedding_cache, texts)
+
+    def _fan_out(self, path: str, payloads: Dict[int, Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """POST payloads[i] to shard i in parallel; replies of the shards that made the deadline."""
+        calls = {i: ShardCall() for i in payloads}
+        futures = {
+            self._pool.submit(self.clients[i].request, "POST", path, p, calls[i]): i for i, p in payloads.items()
+        }
+        done, late = wait(futures, timeout=self.timeout)
+
+        replies = {}
+        for future in done:
+            i = futures[future]
+            try:
+                replies[i] = future.result()
+                self._mark_ready(i)
+            except Exception as e:
+                self.clients[i].record_failure(timeout=isinstance(e, socket.timeout))
+                ERRORS.inc(stage="shard")
+                logger.warning("SHARDS | %s %s failed: %r", self.clients[i].address, path, e)
+        for future in late:
+            i = futures[future]
+            # Cancelling does not stop a request already sent: close its connection
+            # so the pool thread is freed and the connection is not reused.
+            if not future.cancel():
+                calls[i].abandon()
+            self.clients[i].record_failure(timeout=True)
+            ERRORS.inc(stage="shard")
+            logger.warning("SHARDS | %s %s timed out after %.0fms", self.clients[i].address, path, self.timeout * 1000)
+        return replies
+
+    @staticmethod
+    def _merge(ranked: List[Tuple[int, Dict[str, List[Any]]]], depth: int) -> Tuple[List[Tuple[int, int]], List[float]]:
+        """Per-shard (rows, scores) rankings -> one ranking of (shard, row) by score."""
+        hits = [
+            (score, shard, row)
+            for shard, part in ranked
+            for row, score in zip(part["rows"], part["scores"])
+        ]
+        hits.sort(key=lambda h: (-h[0], h[1], h[2]))
+        hits = hits[:depth]
+        return [(shard, row) for _, shard, row in hits], [score for score, _, _ in hits]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filters: Optional[List[Optional[Dict[str, Optional[str]]]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Same contract as SearchEngine.search_batch, over every shard that answers in time."""
+        from rag_pipeline.search import fuse_candidates
+
+        if not queries:
+            return []
+
+        query_emb = self.encode(queries)
+        hybrid = self.lexical_weight > 0
+        depth = max(k, self.hybrid_candidates) if hybrid else k
+        payload = {
+            "queries": queries,
+            "vectors": encode_vectors(query_emb),
+            "depth": depth,
+            "filters": filters,
+            "lexical": hybrid,
+        }
+
+        with stage("index_search"):
+            replies = self._fan_out("/candidates", {i: payload for i in range(len(self.clients))})
+        with self._lock:
+            self.searches += 1
+            if len(replies) < len(self.clients):
+                self.partial_searches += 1
+        if not replies:
+            raise RuntimeError("No shard answered the search")
+
+        chosen: List[List[Tuple[int, int]]] = []
+        for q, query_text in enumerate(queries):
+            parts = [(shard, reply["results"][q]) for shard, reply in sorted(replies.items())]
+            vector = self._merge([(shard, p["vector"]) for shard, p in parts], depth)
+            lexical = None
+            if any(p["lexical"] is not None for _, p in parts):
+                lexical = self._merge([(shard, p["lexical"]) for shard, p in parts if p["lexical"] is not None], depth)
+            keys, scores = fuse_candidates(
+                vector, lexical, k,
+                vector_weight=self.vector_weight,
+                lexical_weight=self.lexical_weight,
+                rrf_k=self.rrf_k,
+            )
+            chosen.append(keys)
+            logger.info(
+                "RETRIEVAL | query='%s' | top_k=%d | filter=%s | shards=%d/%d | indices=%s | scores=%s | request_id=%s",
+                query_text,
+                k,
+                parts[0][1]["filter"],
+                len(replies),
+                len(self.clients),
+                keys,
+                scores,
+                current_request_id(),
+            )
+
+        wanted: Dict[int, List[int]] = {}
+        for keys in chosen:
+            for shard, row in keys:
+                wanted.setdefault(shard, []).append(row)
+        with stage("materialize"):
+            fetched = self._fan_out("/recipes", {s: {"rows": sorted(set(rows))} for s, rows in wanted.items()})
+
+        recipes: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for shard, reply in fetched.items():
+            for row, recipe in zip(sorted(set(wanted[shard])), reply["recipes"]):
+                recipes[(shard, row)] = recipe
+        return [[recipes[key] for key in keys if key in recipes] for keys in chosen]
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        diet: Optional[str] = None,
+        cuisine: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        filters = [{"diet": diet, "cuisine": cuisine}] if (diet or cuisine) else None
+        return self.search_batch([query], k=k, filters=filters)[0]
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+# ---------- command line ----------
+
+
+def launch(out_dir: str, host: str = "127.0.0.1", base_port: int = 8100, socket_dir: Optional[str] = None):
+    """Start one worker process per shard in out_dir; returns (processes, addresses)."""
+    manifest = load_manifest(out_dir)
+    env = {k: v for k, v in os.environ.items() if k != "COOKMATE_SHARDS"}
+    procs, addresses = [], []
+    for i, shard in enumerate(manifest["shards"]):
+        cmd = [sys.executable, "-m", "rag_pipeline.shards", "serve", os.path.join(out_dir, shard["dir"])]
+        if socket_dir:
+            path = os.path.join(socket_dir, f"cookmate-shard-{shard['id']:02d}.sock")
+            cmd += ["--socket", path]
+            addresses.append(f"unix:{path}")
+        else:
+            cmd += ["--host", host, "--port", str(base_port + i)]
+            addresses.append(f"http://{host}:{base_port + i}")
+        procs.append(subprocess.Popen(cmd, cwd=BASE_DIR, env=env))
+    return procs, addresses
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from rag_pipeline.search import INDEX_TYPE
+
+    parser = argparse.ArgumentParser(description="Split the corpus into shards and serve them.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("split", help="partition the indexed recipes by recipe_id into shard directories")
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--output", default=SHARDS_DIR)
+    p.add_argument("--store", default=STORE_DIR)
+    p.add_argument("--embeddings", default=None)
+    p.add_argument("--id-map", default=None)
+    p.add_argument("--index-type", default=INDEX_TYPE)
+
+    p = sub.add_parser("serve", help="serve one shard directory")
+    p.add_argument("shard_dir")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8100)
+    p.add_argument("--socket", default=None, help="serve on this Unix socket instead of a port")
+
+    p = sub.add_parser("launch", help="start a worker per shard on this machine")
+    p.add_argument("shards_dir", nargs="?", default=SHARDS_DIR)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--base-port", type=int, default=8100)
+    p.add_argument("--socket-dir", default=None, help="serve on Unix sockets in this directory")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "split":
+        split_corpus(args.shards, args.output, args.store, args.embeddings, args.id_map, args.index_type)
+    elif args.command == "serve":
+        serve(args.shard_dir, args.host, args.port, args.socket)
+    else:
+        procs, addresses = launch(args.shards_dir, args.host, args.base_port, args.socket_dir)
+        print("COOKMATE_SHARDS=" + ",".join(addresses), flush=True)
+        try:
+            for proc in procs:
+                proc.wait()
+        except KeyboardInterrupt:
+            for proc in procs:
+                proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Structured (schema-constrained) recipe output.
+
+RECIPE_JSON_SCHEMA is passed to Ollama as the `format` of a generation, so
+decoding is constrained by a grammar built from the schema and the model
+can only emit a JSON object with the recipe fields. StreamingJSONValidator
+checks streamed output as it arrives: it reports when the top-level object
+is complete (the rest of the stream can be dropped) and when the output
+can no longer become a valid object (the generation can be aborted instead
+of running to the end).
+"""
+import os
+from typing import Any, Dict, Optional
+
+# Pass RECIPE_JSON_SCHEMA as Ollama's `format` ("0" = free-text JSON as before).
+STRUCTURED_OUTPUT = os.getenv("COOKMATE_STRUCTURED_OUTPUT", "1") != "0"
+
+RECIPE_JSON_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "ingredients": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "item": {"type": "string"},
+                    "quantity": {"type": "string"},
+                },
+                "required": ["item", "quantity"],
+            },
+        },
+        "steps": {"type": "array", "items": {"type": "string"}},
+        "time_minutes": {"type": "integer"},
+        "servings": {"type": "integer"},
+        "diet": {"type": "string"},
+        "cuisine": {"type": "string"},
+        "reason": {"type": "string"},
+    },
+    "required": [
+        "title",
+        "ingredients",
+        "steps",
+        "time_minutes",
+        "servings",
+        "diet",
+        "cuisine",
+        "reason",
+    ],
+}
+
+
+def output_format() -> Optional[Dict[str, Any]]:
+    """The `format` to send with recipe generations, or None for free text."""
+    return RECIPE_JSON_SCHEMA if STRUCTURED_OUTPUT else None
+
+
+_CLOSERS = {"}": "{", "]": "["}
+
+
+class StreamingJSONValidator:
+    """
+    Incremental syntax check of one streamed JSON object.
+
+    feed(chunk) returns
+    - "partial":  keep reading
+    - "complete": the top-level object has closed; document holds it
+    - "invalid":  the output cannot become a valid object; see error
+
+    strict: the first non-whitespace character must be "{" (constrained
+            decoding guarantees it). Otherwise up to max_preamble
+            characters of prose or markdown fences may come first.
+    max_chars: output longer than this without closing the object is
+            treated as a runaway generation.
+    """
+
+    def __init__(self, strict: bool = True, max_preamble: int = 200, max_chars: int = 16000):
+        self.strict = strict
+        self.max_preamble = max_preamble
+        self.max_chars = max_chars
+
+        self.state = "partial"
+        self.error: Optional[str] = None
+        self._buf = []
+        self._seen = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> str:
+        if self.state != "partial":
+            return self.state
+
+        self._buf.append(chunk)
+        for ch in chunk:
+            pos = self._seen
+            self._seen += 1
+
+            if self._start is None:
+                if ch == "{":
+                    self._start = pos
+                    self._stack.append("{")
+                elif not ch.isspace() and self.strict:
+                    return self._fail(f"output starts with {ch!r}, not a JSON object")
+                elif pos >= self.max_preamble:
+                    return self._fail(f"no JSON object in the first {self.max_preamble} characters")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in _CLOSERS:
+                if self._stack.pop() != _CLOSERS[ch]:
+                    return self._fail(f"mismatched {ch!r} at character {pos}")
+                if not self._stack:
+                    self._end = pos + 1
+                    self.state = "complete"
+                    return self.state
+
+        if self._seen > self.max_chars:
+            return self._fail(f"no complete JSON object after {self.max_chars} characters")
+        return self.state
+
+    def _fail(self, message: str) -> str:
+        self.state = "invalid"
+        self.error = message
+        return self.state
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._buf)
+
+    @property
+    def document(self) -> Optional[str]:
+        """The complete top-level object, once state is "complete"."""
+        if self._end is None:
+            return None
+        return self.text[self._start:self._end]
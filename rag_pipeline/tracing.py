@@ -0,0 +1,244 @@
+"""
+Request-scoped tracing and opt-in profiling.
+
+Every backend request gets a request id (the client's X-Request-ID if it
+sent a usable one) held in a contextvar. The id follows the request
+through search_recipes, prompt building, the LLM call and
+validate_recipe_json, including work handed to the CPU pool by
+rag_pipeline.executor.run_cpu. The pipeline stages timed by
+rag_pipeline.metrics.stage become spans of the current request, and
+span() adds others.
+
+When a request finishes, the backend:
+
+- returns X-Request-ID and a Server-Timing header with the spans, summed
+  per name (for a streamed response, the spans recorded before the first
+  byte),
+- appends one JSON line per request to COOKMATE_TRACE_LOG
+  (logs/trace.jsonl by default; empty turns it off).
+
+Profiling is opt-in: with COOKMATE_PROFILE_HEADER=1, a request sent with
+"X-CookMate-Profile: 1", and with COOKMATE_PROFILE_SAMPLE_RATE, a random
+fraction of requests, runs its CPU-bound work (run_cpu calls and
+validation) under cProfile. The merged profile is
+written to COOKMATE_PROFILE_DIR (logs/profiles/), as <time>-<id>.prof
+plus a .txt with the top functions by cumulative time:
+
+    python -m pstats logs/profiles/20251125-170733-3f9c2a1b4d5e6f70.prof
+
+The header is ignored by default: any client could otherwise make the
+server profile its requests and write files. Searches coalesced by the micro-batcher run on its own
+thread, outside the requests' traces.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PROFILE_HEADER = "X-CookMate-Profile"
+
+TRACE_LOG = os.getenv("COOKMATE_TRACE_LOG", os.path.join(BASE_DIR, "logs", "trace.jsonl"))
+PROFILE_DIR = os.getenv("COOKMATE_PROFILE_DIR") or os.path.join(BASE_DIR, "logs", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("COOKMATE_PROFILE_SAMPLE_RATE", "0"))
+# Honour the profiling header ("1"); off by default, clients are not trusted.
+PROFILE_HEADER_ENABLED = os.getenv("COOKMATE_PROFILE_HEADER", "0") == "1"
+# Functions listed in the .txt summary next to each profile.
+PROFILE_TOP = 40
+
+# Client-supplied ids end up in headers, logs and file names.
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+logger = logging.getLogger("cookmate-backend")
+
+
+class Trace:
+    """Spans (and optionally a cProfile profile) of one request."""
+
+    def __init__(self, request_id: Optional[str] = None, profile: bool = False):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.profile = profile
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        # (name, start offset, duration), in seconds
+        self.spans: List[Tuple[str, float, float]] = []
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append((name, start - self.start, duration))
+
+    def add_profile(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per span name, plus the total."""
+        totals: Dict[str, List[float]] = {}
+        with self._lock:
+            for name, _, duration in self.spans:
+                entry = totals.setdefault(name, [0.0, 0])
+                entry[0] += duration
+                entry[1] += 1
+        parts = []
+        for name, (duration, n) in totals.items():
+            part = f"{name};dur={1000 * duration:.2f}"
+            if n > 1:
+                part += f';desc="x{n}"'
+            parts.append(part)
+        parts.append(f"total;dur={1000 * self.elapsed():.2f}")
+        return ", ".join(parts)
+
+    def record(self, **fields: Any) -> Dict[str, Any]:
+        """The trace as one JSON-serializable log record."""
+        with self._lock:
+            spans = [
+                {"name": name, "start_ms": round(1000 * start, 3), "duration_ms": round(1000 * duration, 3)}
+                for name, start, duration in self.spans
+            ]
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "request_id": self.request_id,
+            **fields,
+            "duration_ms": round(1000 * self.elapsed(), 3),
+            "spans": spans,
+        }
+
+    def write_profile(self, directory: Optional[str] = None) -> Optional[str]:
+        """Dump the merged profile (if any) and its text summary; returns the .prof path."""
+        with self._lock:
+            stats = self._stats
+        if stats is None:
+            return None
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        path = os.path.join(directory, f"{stamp}-{self.request_id}.prof")
+        n = 1
+        while os.path.exists(path):
+            # Same second, same (client-chosen) request id: keep both.
+            n += 1
+            path = os.path.join(directory, f"{stamp}-{self.request_id}-{n}.prof")
+        stats.dump_stats(path)
+        with open(path[: -len(".prof")] + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(path, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        return path
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("cookmate_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace is not None else None
+
+
+def start_trace(request_id: Optional[str] = None, profile: bool = False) -> Tuple[Trace, Token]:
+    """Make a new trace current; pass the token to end_trace()."""
+    if request_id and not _REQUEST_ID.match(request_id):
+        request_id = None
+    trace = Trace(request_id, profile=profile)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token) -> None:
+    _current.reset(token)
+
+
+def add_span(name: str, start: float, duration: float) -> None:
+    """Record a span (perf_counter start, seconds) on the current request, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, duration)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.perf_counter() - start)
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """Profile this request? (profiling header, else the sample rate)"""
+    if PROFILE_HEADER_ENABLED and header_value and header_value.strip().lower() not in ("0", "false", "no"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def profiled(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """fn(*args, **kwargs), under cProfile when the current request is profiled."""
+    trace = _current.get()
+    if trace is None or not trace.profile:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process.
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        trace.add_profile(profiler)
+
+
+_trace_logger: Optional[logging.Logger] = None
+_trace_logger_lock = threading.Lock()
+
+
+def get_trace_logger() -> logging.Logger:
+    """Logger writing bare JSON lines to TRACE_LOG (no handler when it is empty)."""
+    global _trace_logger
+    if _trace_logger is None:
+        with _trace_logger_lock:
+            if _trace_logger is None:
+                trace_logger = logging.getLogger("cookmate-trace")
+                trace_logger.setLevel(logging.INFO)
+                trace_logger.propagate = False
+                if TRACE_LOG and not trace_logger.handlers:
+                    os.makedirs(os.path.dirname(os.path.abspath(TRACE_LOG)), exist_ok=True)
+                    handler = logging.FileHandler(TRACE_LOG, encoding="utf-8")
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    trace_logger.addHandler(handler)
+                _trace_logger = trace_logger
+    return _trace_logger
+
+
+def finish_trace(trace: Trace, **fields: Any) -> Dict[str, Any]:
+    """Write the profile (if any) and the JSON log line of a finished request; returns the record."""
+    profile = None
+    try:
+        profile = trace.write_profile()
+    except OSError as e:
+        logger.warning("TRACE | could not write profile for %s: %r", trace.request_id, e)
+    record = trace.record(**fields, profile=profile)
+    get_trace_logger().info(json.dumps(record))
+    if profile:
+        logger.info("TRACE | request_id=%s profiled -> %s", trace.request_id, profile)
+    return record
@@ -0,0 +1,103 @@
+"""
+Small synthetic recipe corpus for tests that must run without the real
+dataset, the MiniLM download or Ollama.
+
+build_corpus() writes the same files the notebooks produce
+(cleaned_recipes.json, recipe_embeddings.npy, faiss_index.bin,
+id_mapping.csv) into a directory, embedded with HashingEncoder. The
+recipe store is compiled from it on first load.
+"""
+import os
+import zlib
+import random
+from typing import List, Dict
+
+import numpy as np
+import pandas as pd
+import faiss
+
+DIM = 64
+
+INGREDIENTS = [
+    "tomato", "garlic", "pasta", "onion", "rice", "chicken", "beef", "tofu",
+    "basil", "olive oil", "salt", "pepper", "butter", "flour", "egg", "milk",
+    "cheese", "carrot", "potato", "spinach", "lemon", "ginger", "soy sauce",
+    "beans", "corn", "salmon", "shrimp", "mushroom", "cumin", "chili",
+]
+CATEGORIES = ["Main Dish", "Dessert", "Vegetable", "Breakfast", "Soup"]
+KEYWORDS = ["Italian", "Asian", "Mexican", "French", "Easy", "Healthy", "< 30 Mins"]
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder with the SentenceTransformer.encode signature."""
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            for token in str(text).lower().replace(",", " ").split():
+                out[i, zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out /= norms
+        return out
+
+
+def make_recipes(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(n):
+        ings = rng.sample(INGREDIENTS, rng.randint(3, 8))
+        recipes.append(
+            {
+                "recipe_id": 1000 + i,
+                "title": f"{ings[0].title()} and {ings[1]} dish {i}",
+                "ingredients_list": ings,
+                "quantities_list": [str(rng.randint(1, 4)) for _ in ings],
+                "steps_list": [f"Step {j + 1} for {ings[j % len(ings)]}." for j in range(rng.randint(2, 6))],
+                "Calories": round(rng.uniform(100, 900), 1),
+                "FatContent": round(rng.uniform(1, 50), 1),
+                "CarbohydrateContent": round(rng.uniform(1, 120), 1),
+                "ProteinContent": round(rng.uniform(1, 60), 1),
+                "RecipeCategory": rng.choice(CATEGORIES),
+                "Keywords": rng.sample(KEYWORDS, 2),
+            }
+        )
+    return recipes
+
+
+def recipe_text(recipe: Dict) -> str:
+    return (
+        f"Title: {recipe['title']}. Ingredients: {', '.join(recipe['ingredients_list'])}. "
+        f"Steps: {' '.join(recipe['steps_list'][:5])}"
+    )
+
+
+def build_corpus(out_dir: str, n: int = 200, seed: int = 0) -> Dict[str, str]:
+    """Write a synthetic corpus to out_dir and return the asset paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    recipes = make_recipes(n, seed=seed)
+
+    paths = {
+        "clean_path": os.path.join(out_dir, "cleaned_recipes.json"),
+        "emb_path": os.path.join(out_dir, "recipe_embeddings.npy"),
+        "index_path": os.path.join(out_dir, "faiss_index.bin"),
+        "idmap_path": os.path.join(out_dir, "id_mapping.csv"),
+        "store_dir": os.path.join(out_dir, "recipe_store"),
+    }
+
+    df = pd.DataFrame(recipes)
+    df.to_json(paths["clean_path"], orient="records")
+
+    embeddings = HashingEncoder().encode([recipe_text(r) for r in recipes])
+    np.save(paths["emb_path"], embeddings)
+
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    faiss.write_index(index, paths["index_path"])
+
+    df[["recipe_id"]].to_csv(paths["idmap_path"], index=False)
+    return paths
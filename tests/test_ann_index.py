@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import faiss
+
+from rag_pipeline.ann_index import (
+    INDEX_TYPES,
+    build_index,
+    evaluate,
+    index_path,
+    main,
+    sample_queries,
+)
+from rag_pipeline.attribute_index import diet_flags
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+
+def test_variants_build_and_report_recall():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(2000, 32)).astype("float32")
+    faiss.normalize_L2(x)
+    queries = sample_queries(x, 50)
+
+    exact = build_index(x, "flat")
+    _, truth = exact.search(queries, 5)
+
+    for index_type in INDEX_TYPES:
+        index = build_index(x, index_type, nlist=16, pq_m=8, pq_nbits=4)
+        assert index.ntotal == len(x)
+        result = evaluate(index, queries, truth, k=5, nprobe=16, ef_search=128)
+        assert 0.0 < result["recall@5"] <= 1.0
+        assert result["latency_ms"]["p50"] > 0
+        if index_type in ("flat", "ivf_flat", "hnsw"):
+            # All 16 lists probed / a wide HNSW beam: (near-)exact.
+            assert result["recall@5"] >= 0.95
+    print("✅ test_variants_build_and_report_recall passed.")
+
+
+def test_engine_uses_tuned_ivf_index_with_filters():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=400)
+        main([
+            "--embeddings", paths["emb_path"],
+            "--output-dir", tmp,
+            "--types", "ivf_flat",
+            "--nlist", "8",
+            "--nprobe", "8",
+            "--queries", "20",
+        ])
+        assert os.path.exists(os.path.join(tmp, "index_report.json"))
+
+        paths["index_path"] = index_path("ivf_flat", tmp)
+        engine = SearchEngine(**paths, model=HashingEncoder(), nprobe=8)
+        exact = SearchEngine(**{**paths, "index_path": index_path("flat", tmp)}, model=HashingEncoder())
+
+        query = "tofu ginger soy sauce"
+        assert [r["recipe_id"] for r in engine.search(query, k=5)] == [r["recipe_id"] for r in exact.search(query, k=5)]
+
+        for r in engine.search(query, k=5, diet="vegan"):
+            assert diet_flags(r["ingredients_list"])["vegan"]
+    print("✅ test_engine_uses_tuned_ivf_index_with_filters passed.")
+
+
+def test_existing_index_kept_unless_forced():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=200)
+        argv = ["--embeddings", paths["emb_path"], "--output-dir", tmp, "--types", "flat", "--queries", "10"]
+        production = index_path("flat", tmp)
+        with open(production, "rb") as f:
+            original = f.read()
+        os.utime(production, (0, 0))
+
+        main(argv)
+        with open(production, "rb") as f:
+            assert f.read() == original
+        assert os.path.getmtime(production) == 0
+        with open(os.path.join(tmp, "index_report.json"), encoding="utf-8") as f:
+            assert json.load(f)["indexes"]["flat"]["kept_existing"] is True
+
+        main(argv + ["--force"])
+        assert os.path.getmtime(production) > 0
+    print("✅ test_existing_index_kept_unless_forced passed.")
+
+
+if __name__ == "__main__":
+    test_variants_build_and_report_recall()
+    test_engine_uses_tuned_ivf_index_with_filters()
+    test_existing_index_kept_unless_forced()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from rag_pipeline.recipe_store import open_or_compile
+from rag_pipeline.attribute_index import AttributeIndex, build_attribute_index, diet_flags
+from rag_pipeline.attribute_index import normalize_diet
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+
+def test_diet_flags():
+    assert diet_flags(["tofu", "peanut butter", "coconut milk", "rice flour"]) == {
+        "vegetarian": True, "vegan": True, "gluten-free": True,
+    }
+    assert diet_flags(["eggs", "eggplant"])["vegan"] is False
+    assert diet_flags(["eggplant", "butternut squash"])["vegan"] is True
+    assert diet_flags(["chicken breasts"]) == {"vegetarian": False, "vegan": False, "gluten-free": True}
+    assert diet_flags(["all-purpose flour"])["gluten-free"] is False
+    assert normalize_diet("Gluten Free") == "gluten-free" and normalize_diet("none") is None
+    print("✅ test_diet_flags passed.")
+
+
+def test_bitsets_match_store_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=100)
+        store = open_or_compile(paths["store_dir"], paths["clean_path"])
+        attrs = AttributeIndex(build_attribute_index(store))
+
+        rows = np.arange(len(store))
+        vegan = attrs.allows(attrs.bitset("diet:vegan"), rows)
+        for i in rows:
+            assert vegan[i] == diet_flags(store.list("ingredients_list", int(i)))["vegan"]
+
+        italian = attrs.allows(attrs.bitset("keyword:italian"), rows)
+        for i in rows:
+            assert italian[i] == ("Italian" in store.list("keywords", int(i)))
+
+        mask, info = attrs.mask("vegan", "Italian")
+        assert info["cuisine"] == "italian" and info["allowed"] == int((vegan & italian).sum())
+        _, info = attrs.mask("vegan", "Klingon")
+        assert info["cuisine"] is None and info["cuisine_ignored"] == "unknown cuisine"
+        store.close()
+    print("✅ test_bitsets_match_store_rows passed.")
+
+
+def test_filtered_search_respects_constraints():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=300)
+        engine = SearchEngine(**paths, model=HashingEncoder())
+
+        results = engine.search("vegan chicken tomato pasta", k=8, diet="vegan", cuisine="Italian")
+        assert len(results) == 8
+        for r in results:
+            assert diet_flags(r["ingredients_list"])["vegan"]
+            assert "Italian" in engine.store.list("keywords", engine.store.recipe_ids.tolist().index(r["recipe_id"]))
+
+        # Mixed filters in one batch give the same results as single searches.
+        queries = ["chicken rice", "tofu ginger", "beef onion"]
+        filters = [{"diet": "vegetarian"}, None, {"diet": "gluten-free", "cuisine": "Asian"}]
+        batch = engine.search_batch(queries, k=5, filters=filters)
+        for query, f, results in zip(queries, filters, batch):
+            single = engine.search(query, k=5, **(f or {}))
+            assert [r["recipe_id"] for r in results] == [r["recipe_id"] for r in single]
+    print("✅ test_filtered_search_respects_constraints passed.")
+
+
+def test_mask_caches_stay_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=200)
+        engine = SearchEngine(**paths, model=HashingEncoder())
+        engine.load()
+        attrs = engine.attributes
+
+        # Made-up cuisines all share one cache entry.
+        for i in range(500):
+            attrs.mask("vegan", f"cuisine-{i}")
+        assert attrs.filter_key("Vegan", "Cuisine-7") == attrs.filter_key("vegan", "klingon")
+        assert len(attrs._masks) == 1
+
+        # Index-position bitmaps are keyed on the filter, not on mask identity.
+        engine._rows = np.arange(len(engine.store))
+        vegan, _ = attrs.mask("vegan", None)
+        italian, _ = attrs.mask(None, "Italian")
+        a = engine._index_mask(attrs.filter_key("vegan", None), vegan)
+        b = engine._index_mask(attrs.filter_key(None, "italian"), italian)
+        assert np.array_equal(a, vegan) and np.array_equal(b, italian)
+        assert len(engine._index_masks) == 2
+    print("✅ test_mask_caches_stay_bounded passed.")
+
+
+if __name__ == "__main__":
+    test_diet_flags()
+    test_bitsets_match_store_rows()
+    test_filtered_search_respects_constraints()
+    test_mask_caches_stay_bounded()
@@ -0,0 +1,150 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+
+from rag_pipeline import search
+from rag_pipeline.batcher import MicroBatcher
+from rag_pipeline.executor import CPU_WORKERS
+
+
+def test_micro_batcher_coalesces_concurrent_queries():
+    calls = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def fake_search_batch(queries, k):
+        calls.append((list(queries), k))
+        entered.set()
+        release.wait(timeout=5)
+        return [[{"query": q, "rank": r} for r in range(k)] for q in queries]
+
+    batcher = MicroBatcher(fake_search_batch, window_ms=1, max_batch_size=8)
+
+    # The first query is dispatched alone and blocks the worker, so the
+    # next ones pile up and go out together as one batch.
+    first = batcher.submit("warmup", 1)
+    assert entered.wait(timeout=5)
+    futures = [batcher.submit(f"q{i}", k=i + 1) for i in range(4)]
+    release.set()
+
+    assert first.result(timeout=5) == [{"query": "warmup", "rank": 0}]
+    for i, future in enumerate(futures):
+        hits = future.result(timeout=5)
+        assert len(hits) == i + 1
+        assert all(h["query"] == f"q{i}" for h in hits)
+
+    assert len(calls) == 2
+    assert calls[1] == (["q0", "q1", "q2", "q3"], 4)
+
+    stats = batcher.stats()
+    assert stats["requests"] == 5
+    assert stats["batch_sizes"] == {1: 1, 4: 1}
+
+    print("✅ test_micro_batcher_coalesces_concurrent_queries passed.")
+
+
+def test_micro_batcher_propagates_errors():
+    def failing(queries, k):
+        raise RuntimeError("index not loaded")
+
+    batcher = MicroBatcher(failing, window_ms=1)
+    future = batcher.submit("tomato", 3)
+
+    try:
+        future.result(timeout=5)
+    except RuntimeError as e:
+        assert "index not loaded" in str(e)
+    else:
+        raise AssertionError("expected the search error to reach the caller")
+
+    print("✅ test_micro_batcher_propagates_errors passed.")
+
+
+def test_micro_batcher_fails_short_results():
+    def short(queries, k):
+        return [[{"query": q}] for q in queries[:-1]]
+
+    batcher = MicroBatcher(short, window_ms=1)
+    future = batcher.submit("tomato", 3)
+
+    try:
+        future.result(timeout=5)
+    except RuntimeError as e:
+        assert "0 result lists for 1 queries" in str(e)
+    else:
+        raise AssertionError("expected the caller to get an error, not hang")
+
+    print("✅ test_micro_batcher_fails_short_results passed.")
+
+
+def test_async_searches_fill_one_batch():
+    calls = []
+
+    def fake_search_batch(queries, k, filters=None):
+        calls.append(list(queries))
+        return [[{"query": q}] for q in queries]
+
+    async def many(n):
+        return await asyncio.gather(*(search.search_recipes_async(f"q{i}", k=1) for i in range(n)))
+
+    # More concurrent requests than CPU-pool threads still go out as one batch.
+    n = CPU_WORKERS + 4
+    previous = search.batcher
+    search.batcher = MicroBatcher(fake_search_batch, window_ms=200, max_batch_size=64)
+    try:
+        results = asyncio.run(many(n))
+    finally:
+        search.batcher = previous
+
+    assert [hits[0]["query"] for hits in results] == [f"q{i}" for i in range(n)]
+    assert len(calls) == 1 and len(calls[0]) == n
+    print("✅ test_async_searches_fill_one_batch passed.")
+
+
+def test_cancelled_callers_do_not_stop_the_batcher():
+    calls = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocking_search_batch(queries, k):
+        calls.append(list(queries))
+        entered.set()
+        release.wait(timeout=5)
+        return [[{"query": q}] for q in queries]
+
+    batcher = MicroBatcher(blocking_search_batch, window_ms=1)
+
+    async def give_up():
+        # The request times out while its search is running.
+        try:
+            await asyncio.wait_for(search.search_recipes_async("slow", k=1), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    previous = search.batcher
+    search.batcher = batcher
+    try:
+        asyncio.run(give_up())
+    finally:
+        search.batcher = previous
+    assert entered.wait(timeout=5)
+
+    # Cancelled while still queued: never searched.
+    queued = batcher.submit("gone", 1)
+    assert queued.cancel()
+    release.set()
+
+    assert batcher.submit("next", 1).result(timeout=5) == [{"query": "next"}]
+    assert ["gone"] not in calls and calls[-1] == ["next"]
+    print("✅ test_cancelled_callers_do_not_stop_the_batcher passed.")
+
+
+if __name__ == "__main__":
+    print("Running micro-batcher tests manually...")
+    test_micro_batcher_coalesces_concurrent_queries()
+    test_micro_batcher_propagates_errors()
+    test_micro_batcher_fails_short_results()
+    test_async_searches_fill_one_batch()
+    test_cancelled_callers_do_not_stop_the_batcher()
@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.bench_pipeline import compare, load_baselines, main, run_benchmarks, save_baselines
+
+
+def test_compare_flags_regressions():
+    baselines = {"a": {"min_us": 10.0}, "b": {"min_us": 10.0}, "c": {"min_us": 0.5}, "d": {"min_us": 10.0}}
+    results = {
+        "a": {"min_us": 11.0},  # within the threshold
+        "b": {"min_us": 14.0},  # 40% slower
+        "c": {"min_us": 0.9},   # 80% slower, but under min_delta_us
+        "d": {"min_us": 5.0},
+        "e": {"min_us": 1.0},   # no baseline yet
+    }
+    status = {row["name"]: row["status"] for row in compare(results, baselines, threshold=0.25, min_delta_us=1.0)}
+    assert status == {"a": "ok", "b": "regression", "c": "ok", "d": "faster", "e": "new"}
+    print("✅ test_compare_flags_regressions passed.")
+
+
+def test_baselines_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "baselines.json")
+        assert load_baselines(path) == {}
+        save_baselines({"a": {"min_us": 1.0}, "b": {"min_us": 2.0}}, path)
+        save_baselines({"b": {"min_us": 3.0}}, path)
+        assert load_baselines(path) == {"a": {"min_us": 1.0}, "b": {"min_us": 3.0}}
+        with open(path, encoding="utf-8") as f:
+            assert "machine" in json.load(f)
+    print("✅ test_baselines_round_trip passed.")
+
+
+def test_run_and_gate():
+    results = run_benchmarks(sizes=[200], ks=[3], only="format_retrieved", min_time=0.001, repeat=2)
+    assert list(results) == ["format_retrieved[k=3]"]
+    assert 0 < results["format_retrieved[k=3]"]["min_us"] <= results["format_retrieved[k=3]"]["median_us"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "baselines.json")
+        argv = ["--sizes", "200", "--k", "3", "--only", "build_query", "--min-time", "0.001",
+                "--repeat", "2", "--processes", "1", "--baselines", path]
+        assert main(argv + ["--update"]) == 0
+        assert list(load_baselines(path)) == ["build_query"]
+
+        # An impossibly fast baseline fails the run.
+        save_baselines({"build_query": {"min_us": 0.001}}, path)
+        assert main(argv + ["--confirm", "0", "--min-delta-us", "0"]) == 1
+    print("✅ test_run_and_gate passed.")
+
+
+if __name__ == "__main__":
+    test_compare_flags_regressions()
+    test_baselines_round_trip()
+    test_run_and_gate()
@@ -0,0 +1,64 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+
+import numpy as np
+
+from rag_pipeline.cache import EmbeddingCache
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import HashingEncoder
+
+
+class CountingEncoder(HashingEncoder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        return super().encode(texts, **kwargs)
+
+
+def test_embedding_cache_lru_and_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "emb_cache.npz")
+        cache = EmbeddingCache(max_size=2, path=path, model_name="m")
+
+        cache.put("Chicken  Rice", np.ones(4, dtype="float32"))
+        cache.put("tomato", np.zeros(4, dtype="float32"))
+        assert cache.get("chicken rice") is not None
+        cache.put("garlic", np.zeros(4, dtype="float32"))
+
+        # "tomato" was the least recently used entry
+        assert cache.get("tomato") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+
+        cache.save()
+        reloaded = EmbeddingCache(max_size=2, path=path, model_name="m")
+        assert np.allclose(reloaded.get("chicken rice"), 1.0)
+
+        other_model = EmbeddingCache(max_size=2, path=path, model_name="other")
+        assert len(other_model) == 0
+
+    print("✅ test_embedding_cache_lru_and_persistence passed.")
+
+
+def test_engine_encode_uses_cache():
+    encoder = CountingEncoder()
+    engine = SearchEngine(model=encoder)
+
+    first = engine.encode(["chicken rice onion garlic"])
+    again = engine.encode(["Chicken rice  onion garlic"])
+
+    assert encoder.calls == 1
+    assert np.allclose(first, again)
+
+    print("✅ test_engine_encode_uses_cache passed.")
+
+
+if __name__ == "__main__":
+    print("Running embedding cache tests manually...")
+    test_embedding_cache_lru_and_persistence()
+    test_engine_encode_uses_cache()
@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import faiss
+
+from rag_pipeline.encoders import (
+    benchmark,
+    check_parity,
+    length_buckets,
+    load_encoder,
+    load_logged_queries,
+    mean_pool,
+)
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, make_recipes, recipe_text, HashingEncoder
+
+
+class NoisyEncoder(HashingEncoder):
+    """HashingEncoder plus small Gaussian noise, standing in for a quantized model."""
+
+    def __init__(self, noise: float, seed: int = 0):
+        super().__init__()
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    def encode(self, texts, normalize_embeddings: bool = True, **kwargs):
+        out = super().encode(texts, normalize_embeddings=False)
+        out += self.rng.normal(0, self.noise, out.shape).astype("float32")
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-9)
+
+
+def test_mean_pool_ignores_padding():
+    hidden = np.array([[[1.0, 1.0], [3.0, 5.0], [100.0, 100.0]]], dtype="float32")
+    mask = np.array([[1, 1, 0]])
+    assert mean_pool(hidden, mask).tolist() == [[2.0, 3.0]]
+    print("✅ test_mean_pool_ignores_padding passed.")
+
+
+def test_parity_check():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=200)
+        index = faiss.read_index(paths["index_path"])
+        texts = [recipe_text(r) for r in make_recipes(50, seed=7)]
+
+        close = check_parity(NoisyEncoder(0.001), HashingEncoder(), texts, index=index, k=5)
+        assert close["ok"] and close["min_cosine"] > 0.99 and close["overlap@5"] > 0.9
+
+        far = check_parity(NoisyEncoder(0.5), HashingEncoder(), texts, index=index, k=5)
+        assert not far["ok"] and far["min_cosine"] < 0.95
+    print("✅ test_parity_check passed.")
+
+
+def test_logged_queries_and_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "backend.log")
+        with open(log, "w", encoding="utf-8") as f:
+            f.write("2025-11-25 17:07:33,208 [INFO] RAG | retrieved=5\n")
+            for i in range(20):
+                words = " ".join(["tomato"] * (i + 1))
+                f.write(f"2025-11-25 17:07:33,208 [INFO] RETRIEVAL | query='Ingredients: {words}' | top_k=5 | indices=[1]\n")
+
+        queries = load_logged_queries(log)
+        assert len(queries) == 20 and queries[0] == "Ingredients: tomato"
+        assert load_logged_queries(log, limit=3) == queries[:3]
+
+        buckets = length_buckets(queries)
+        assert sum(len(b) for b in buckets.values()) == 20
+
+        report = benchmark({"hash": HashingEncoder(), "noisy": NoisyEncoder(0.01)}, queries)
+        assert set(report["encoders"]) == {"hash", "noisy"}
+        entry = report["encoders"]["hash"]
+        assert entry["latency_ms"]["p50"] >= 0 and entry["batch_qps"] > 0
+        assert len(entry["by_length"]) == 3
+    print("✅ test_logged_queries_and_benchmark passed.")
+
+
+def test_encoder_selection():
+    try:
+        load_encoder("tensorflow")
+        assert False, "unknown backend accepted"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            load_encoder("onnx_int8", onnx_dir=tmp)
+            assert False, "missing ONNX model accepted"
+        except FileNotFoundError:
+            pass
+
+        # Non-torch backends do not share cached query vectors with torch.
+        paths = build_corpus(tmp, n=20)
+        torch_engine = SearchEngine(**paths, model=HashingEncoder())
+        onnx_engine = SearchEngine(**paths, model=HashingEncoder(), encoder="onnx_int8", encoder_threads=2)
+        assert torch_engine.embedding_cache.model_name == "all-MiniLM-L6-v2"
+        assert onnx_engine.embedding_cache.model_name == "all-MiniLM-L6-v2:onnx_int8"
+        assert onnx_engine.status()["encoder"] == {"backend": "onnx_int8", "threads": 2}
+    print("✅ test_encoder_selection passed.")
+
+
+if __name__ == "__main__":
+    test_mean_pool_ignores_padding()
+    test_parity_check()
+    test_logged_queries_and_benchmark()
+    test_encoder_selection()
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from rag_pipeline import generator, search
+from rag_pipeline.cache import ResultCache
+from rag_pipeline.llm_client import get_llm_client
+from rag_pipeline.search import SearchEngine
+from rag_pipeline.semantic_cache import SemanticCache
+from rag_pipeline.structured_output import STRUCTURED_OUTPUT
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+RECIPE = {
+    "title": "Tomato Garlic Pasta",
+    "ingredients": [{"item": "pasta", "quantity": "200 g"}, {"item": "tomato", "quantity": "2"}],
+    "steps": ["Boil the pasta.", "Toss with the sauce."],
+    "time_minutes": 20,
+    "servings": 2,
+    "diet": "vegetarian",
+    "cuisine": "Italian",
+    "reason": "Uses the pantry.",
+}
+INVALID = "Sorry, I cannot write a recipe today."
+PAYLOAD = {"ingredients": ["tomato", "garlic", "pasta"], "k": 3, "max_retries": 1, "use_cache": False}
+
+
+def _scripted_astream(outputs):
+    """Stand-in for LLMClient.astream: each call streams the next output in chunks."""
+    calls = iter(outputs)
+
+    async def astream(prompt, **kwargs):
+        output = next(calls)
+        if isinstance(output, Exception):
+            raise output
+        for i in range(0, len(output), 10):
+            yield output[i:i + 10]
+
+    return astream
+
+
+def _events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+class _SyntheticBackend:
+    """Synthetic search engine, empty caches and a scripted LLM for the duration of a test."""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = search.engine
+        search.engine = SearchEngine(**build_corpus(self.tmp.name, n=100), model=HashingEncoder())
+        self.caches = generator.result_cache, generator.semantic_cache
+        generator.result_cache = ResultCache(max_size=16, ttl=None)
+        generator.semantic_cache = SemanticCache(search.engine.encode, max_entries=16)
+        self.client = get_llm_client()
+        self.client.astream = _scripted_astream(self.outputs)
+        return TestClient(app)
+
+    def __exit__(self, *exc):
+        del self.client.astream
+        generator.result_cache, generator.semantic_cache = self.caches
+        search.engine = self.engine
+        self.tmp.cleanup()
+
+
+def test_stream_events_and_final_body():
+    valid = json.dumps(RECIPE)
+    with _SyntheticBackend([INVALID, valid, INVALID, valid]) as client:
+        resp = client.post("/generate_recipe/stream", json=PAYLOAD)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = _events(resp.text)
+
+        plain = client.post("/generate_recipe", json=PAYLOAD)
+        assert plain.status_code == 200
+
+    kinds = [event for event, _ in events]
+    retry = kinds.index("retry")
+    assert set(kinds[:retry]) == {"token"} and set(kinds[retry + 1:-1]) == {"token"}
+    assert kinds[-1] == "result" and kinds.count("result") == 1
+    assert events[retry][1]["attempt"] == 1
+
+    second = "".join(data["text"] for event, data in events[retry + 1:-1])
+    assert second == valid and all(data["attempt"] == 1 for _, data in events[retry + 1:-1])
+
+    result = events[-1][1]
+    assert result["success"] is True and result["attempts"] == 2
+    assert result["recipe"]["title"] == RECIPE["title"] and "nutrition" in result["recipe"]
+    assert result == plain.json()
+    print("✅ test_stream_events_and_final_body passed.")
+
+
+def test_stream_reports_llm_errors_in_band():
+    with _SyntheticBackend([RuntimeError("connection refused")]) as client:
+        resp = client.post("/generate_recipe/stream", json=PAYLOAD)
+
+    assert resp.status_code == 200
+    events = _events(resp.text)
+    assert [event for event, _ in events] == ["result"]
+    result = events[0][1]
+    assert result["success"] is False and result["error"] == "llm_error"
+    assert "connection refused" in result["validation_message"]
+    assert result["pantry"] == PAYLOAD["ingredients"]
+    print("✅ test_stream_reports_llm_errors_in_band passed.")
+
+
+def test_cache_failure_keeps_the_recipe():
+    def failing_encode(texts):
+        raise RuntimeError("encoder unavailable")
+
+    with _SyntheticBackend([json.dumps(RECIPE), json.dumps(RECIPE)]) as client:
+        generator.semantic_cache = SemanticCache(failing_encode, max_entries=16)
+        streamed = _events(client.post("/generate_recipe/stream", json=PAYLOAD).text)[-1][1]
+        plain = client.post("/generate_recipe", json=PAYLOAD).json()
+
+    for result in (streamed, plain):
+        assert result["success"] is True and result["error"] is None
+        assert result["recipe"]["title"] == RECIPE["title"]
+    print("✅ test_cache_failure_keeps_the_recipe passed.")
+
+
+def test_cache_hits_report_no_llm_work():
+    with _SyntheticBackend([json.dumps(RECIPE)]) as client:
+        first = client.post("/generate_recipe", json=PAYLOAD).json()
+        hit = client.post("/generate_recipe", json={**PAYLOAD, "use_cache": True}).json()
+        streamed = _events(client.post("/generate_recipe/stream", json={**PAYLOAD, "use_cache": True}).text)
+
+    assert first["attempts"] == 1 and first["cached"] is False
+    assert first["retries_avoided"] == int(STRUCTURED_OUTPUT)
+    for result in (hit, streamed[-1][1]):
+        assert result["cached"] is True and result["recipe"] == first["recipe"]
+        assert result["attempts"] == 0 and result["repairs"] == [] and result["retries_avoided"] == 0
+    print("✅ test_cache_hits_report_no_llm_work passed.")
+
+
+if __name__ == "__main__":
+    test_stream_events_and_final_body()
+    test_stream_reports_llm_errors_in_band()
+    test_cache_failure_keeps_the_recipe()
+    test_cache_hits_report_no_llm_work()
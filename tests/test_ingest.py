@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+import faiss
+
+from rag_pipeline.recipe_store import (
+    RecipeStore,
+    append_npy,
+    append_recipe_store,
+    compile_recipe_store,
+    open_or_compile,
+)
+from rag_pipeline.ingest import ingest
+from rag_pipeline.lexical_index import LexicalIndex, lexical_path
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, make_recipes, recipe_text, HashingEncoder
+
+
+def test_append_npy_grows_header_in_place():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.npy")
+        np.save(path, np.arange(18, dtype="float32").reshape(9, 2))
+
+        # 9 -> 10 -> 100 rows: the shape gains digits, the header keeps its size.
+        assert append_npy(path, np.full((1, 2), -1, dtype="float32")) == 10
+        assert append_npy(path, np.ones((90, 2), dtype="float64")) == 100
+        data = np.load(path)
+        assert data.shape == (100, 2) and data.dtype == np.float32
+        assert data[9].tolist() == [-1, -1] and data[10:].sum() == 180
+
+        # keep drops an uncommitted tail before appending.
+        append_npy(path, np.zeros((1, 2)), keep=9)
+        data = np.load(path)
+        assert data.shape == (10, 2) and data[9].tolist() == [0, 0]
+    print("✅ test_append_npy_grows_header_in_place passed.")
+
+
+def test_append_npy_rewrites_a_tight_header():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.npy")
+        # A 64-byte header with no room to grow, as older writers produce.
+        header = b"{'descr':'<f4','fortran_order':False,'shape':(9,4)}"
+        header = header.ljust(64 - 10 - 1) + b"\n"
+        original = np.arange(36, dtype="float32").reshape(9, 4)
+        with open(path, "wb") as f:
+            f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header)
+            f.write(original.tobytes())
+
+        assert append_npy(path, np.full((3, 4), -1, dtype="float32")) == 12
+        data = np.load(path)
+        assert data.shape == (12, 4)
+        assert np.array_equal(data[:9], original) and (data[9:] == -1).all()
+        assert not os.path.exists(path + ".tmp.npy")
+    print("✅ test_append_npy_rewrites_a_tight_header passed.")
+
+
+def test_append_matches_compile():
+    with tempfile.TemporaryDirectory() as tmp:
+        df = pd.DataFrame(make_recipes(100))
+        # A missing quantity list and blank category exercise the null paths.
+        df.at[70, "quantities_list"] = None
+        df.at[71, "RecipeCategory"] = None
+
+        full = RecipeStore(compile_recipe_store(df, os.path.join(tmp, "full")))
+        part_dir = compile_recipe_store(df.iloc[:60], os.path.join(tmp, "part"))
+        append_recipe_store(df.iloc[60:80].reset_index(drop=True), part_dir)
+        append_recipe_store(df.iloc[80:].reset_index(drop=True), part_dir)
+        part = RecipeStore(part_dir)
+
+        assert len(part) == len(full) == 100
+        for i in range(100):
+            assert part.row(i) == full.row(i), i
+        full.close()
+        part.close()
+    print("✅ test_append_matches_compile passed.")
+
+
+def _write_jsonl(path, recipes):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in recipes:
+            f.write(json.dumps(r) + "\n")
+
+
+def test_ingest_appends_everywhere():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=100)
+        open_or_compile(paths["store_dir"], paths["clean_path"]).close()
+
+        recipes = make_recipes(130)
+        new = recipes[100:]
+        no_id = dict(new[-1], title="Saffron mystery stew")
+        no_id.pop("recipe_id")
+        # 30 new recipes, 5 already indexed, one without an id, one invalid.
+        source = os.path.join(tmp, "delta.jsonl")
+        _write_jsonl(source, recipes[:5] + new + [no_id, {"title": "", "ingredients_list": []}])
+
+        # Rows an interrupted run left behind are dropped first.
+        append_recipe_store(pd.DataFrame(recipes[120:125]), paths["store_dir"])
+        append_npy(paths["emb_path"], np.ones((5, 64), dtype="float32"))
+
+        report = ingest(
+            source,
+            HashingEncoder(),
+            clean_path=paths["clean_path"],
+            store_dir=paths["store_dir"],
+            emb_path=paths["emb_path"],
+            idmap_path=paths["idmap_path"],
+            chunk_size=8,
+        )
+        assert report["read"] == 37 and report["added"] == 31
+        assert report["skipped_existing"] == 5 and report["invalid"] == 1 and report["assigned_ids"] == 1
+        assert report["total"] == 131
+
+        ids = pd.read_csv(paths["idmap_path"])["recipe_id"].tolist()
+        assert ids[:130] == [r["recipe_id"] for r in recipes] and ids[130] == 1130
+        assert faiss.read_index(paths["index_path"]).ntotal == 131
+        assert np.load(paths["emb_path"]).shape == (131, 64)
+        assert len(pd.read_json(paths["clean_path"])) == 131
+        store = RecipeStore(paths["store_dir"])
+        assert store.recipe_ids.tolist() == ids
+        store.close()
+        assert len(LexicalIndex(lexical_path(paths["store_dir"]))) == 131
+
+        engine = SearchEngine(**paths, model=HashingEncoder(), lexical_weight=0)
+        results = engine.search(recipe_text(no_id), k=3)
+        assert results[0]["recipe_id"] == 1130 and results[0]["title"] == "Saffron mystery stew"
+
+        # Re-running a delta adds nothing (records with ids are idempotent).
+        _write_jsonl(source, recipes[90:])
+        again = ingest(
+            source, HashingEncoder(), clean_path=paths["clean_path"], store_dir=paths["store_dir"],
+            emb_path=paths["emb_path"], idmap_path=paths["idmap_path"],
+        )
+        assert again["added"] == 0 and again["total"] == 131
+    print("✅ test_ingest_appends_everywhere passed.")
+
+
+def test_search_maps_rows_through_id_map():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=120)
+        aligned = SearchEngine(**paths, model=HashingEncoder(), lexical_weight=0)
+        queries = ["chicken rice", "tofu ginger", "beef onion"]
+        filters = [{"diet": "vegetarian"}, None, {"diet": "gluten-free", "cuisine": "Asian"}]
+        expected = aligned.search_batch(queries, k=6, filters=filters)
+
+        # Same recipes, store compiled in a different order than the index.
+        shuffled = pd.read_json(paths["clean_path"]).sample(frac=1.0, random_state=3)
+        shuffled_paths = dict(paths, store_dir=os.path.join(tmp, "shuffled_store"))
+        compile_recipe_store(shuffled.reset_index(drop=True), shuffled_paths["store_dir"])
+        engine = SearchEngine(**shuffled_paths, model=HashingEncoder(), lexical_weight=0)
+        got = engine.search_batch(queries, k=6, filters=filters)
+        assert engine._rows is not None
+
+        for a, b in zip(expected, got):
+            assert [r["recipe_id"] for r in a] == [r["recipe_id"] for r in b]
+            assert [r["title"] for r in a] == [r["title"] for r in b]
+    print("✅ test_search_maps_rows_through_id_map passed.")
+
+
+if __name__ == "__main__":
+    test_append_npy_grows_header_in_place()
+    test_append_npy_rewrites_a_tight_header()
+    test_append_matches_compile()
+    test_ingest_appends_everywhere()
+    test_search_maps_rows_through_id_map()
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag_pipeline.json_repair import repair_recipe_json, get_repair_stats
+from rag_pipeline.generator import validate_recipe_json
+
+
+RECIPE = {
+    "title": "Tomato Pasta",
+    "ingredients": [{"item": "pasta", "quantity": "200 g"}],
+    "steps": ["Boil pasta, then drain.", "Add sauce."],
+    "time_minutes": 20,
+    "servings": 2,
+    "diet": "vegetarian",
+    "cuisine": "Italian",
+    "reason": "fits",
+}
+
+
+def test_repair_fences_prose_and_trailing_commas():
+    text = "Sure! Here is your recipe:\n```json\n" + json.dumps(RECIPE, indent=2)[:-2] + ",\n}\n```\nEnjoy!"
+    assert not validate_recipe_json(text)[0]
+
+    ok, recipe, repairs = repair_recipe_json(text)
+    assert ok and recipe == RECIPE
+    assert {"strip_fences", "strip_preamble", "strip_trailing_text", "trailing_commas"} <= set(repairs)
+    print("✅ test_repair_fences_prose_and_trailing_commas passed.")
+
+
+def test_repair_keeps_commas_inside_strings():
+    text = '{"title": "A, }", "ingredients": ["x",], "steps": ["Add sauce, ]",],}'
+    ok, recipe, _ = repair_recipe_json(text)
+    assert ok and recipe["title"] == "A, }" and recipe["steps"] == ["Add sauce, ]"]
+    print("✅ test_repair_keeps_commas_inside_strings passed.")
+
+
+def test_repair_coerces_types_and_fills_defaults():
+    broken = {
+        "title": "Rice Bowl",
+        "ingredients": "1 cup rice\n1 small onion",
+        "steps": "1. Cook rice.\n2. Fry onion.",
+        "time_minutes": "25 minutes",
+        "servings": "2",
+    }
+    ok, recipe, repairs = repair_recipe_json(json.dumps(broken), diet="vegan", cuisine=None)
+    assert ok
+    assert recipe["ingredients"] == ["1 cup rice", "1 small onion"]
+    assert recipe["steps"] == ["Cook rice.", "Fry onion."]
+    assert recipe["time_minutes"] == 25 and recipe["servings"] == 2
+    assert recipe["diet"] == "vegan" and recipe["cuisine"] == "none" and recipe["reason"] == ""
+    assert "coerce_ingredients" in repairs and "default_reason" in repairs
+    assert validate_recipe_json(json.dumps(recipe))[0]
+    print("✅ test_repair_coerces_types_and_fills_defaults passed.")
+
+
+def test_repair_refuses_missing_critical_fields():
+    before = get_repair_stats().stats()["failed"]
+    ok, message, _ = repair_recipe_json('{"title": "Soup", "ingredients": ["water"]}')
+    assert not ok and "steps" in message
+    ok, _, _ = repair_recipe_json("I cannot help with that.")
+    assert not ok
+    assert get_repair_stats().stats()["failed"] == before + 2
+    print("✅ test_repair_refuses_missing_critical_fields passed.")
+
+
+def test_repair_closes_truncated_output():
+    text = json.dumps(RECIPE)
+    cut = text[:text.index('"time_minutes"') - 2]
+    ok, recipe, repairs = repair_recipe_json(cut)
+    assert ok and recipe["steps"] == RECIPE["steps"]
+    assert "close_brackets" in repairs
+    print("✅ test_repair_closes_truncated_output passed.")
+
+
+if __name__ == "__main__":
+    test_repair_fences_prose_and_trailing_commas()
+    test_repair_keeps_commas_inside_strings()
+    test_repair_coerces_types_and_fills_defaults()
+    test_repair_refuses_missing_critical_fields()
+    test_repair_closes_truncated_output()
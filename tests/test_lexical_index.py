@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from rag_pipeline.recipe_store import open_or_compile
+from rag_pipeline.lexical_index import (
+    LexicalIndex,
+    build_lexical_index,
+    open_or_build,
+    rrf_fuse,
+    tokenize,
+)
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+
+def test_tokenize_normalizes_ingredients():
+    assert tokenize("2 cups Cherry Tomatoes, chopped") == ["cherry", "tomato"]
+    assert tokenize("Fresh berries") == ["berry"]
+    assert tokenize("grass") == ["grass"]
+    print("✅ test_tokenize_normalizes_ingredients passed.")
+
+
+def test_postings_match_store_and_bm25_prefers_full_matches():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=120)
+        store = open_or_compile(paths["store_dir"], paths["clean_path"])
+        index = LexicalIndex(build_lexical_index(store))
+
+        assert len(index) == len(store)
+        t = index.term_ids["tofu"]
+        rows = index.postings[index.offsets[t]:index.offsets[t + 1]]
+        assert np.all(np.diff(rows) > 0)
+        expected = [i for i in range(len(store)) if "tofu" in store.list("ingredients_list", i)]
+        assert rows.tolist() == expected
+
+        hits, scores = index.search("tofu ginger", 10)
+        assert np.all(np.diff(scores) <= 0)
+        both = {i for i in range(len(store)) if {"tofu", "ginger"} <= set(store.list("ingredients_list", i))}
+        assert set(hits[:len(both)].tolist()) == both
+
+        # Reopening a current index does not rebuild it.
+        mtime = os.path.getmtime(os.path.join(paths["store_dir"], "lexical.npz"))
+        open_or_build(store)
+        assert os.path.getmtime(os.path.join(paths["store_dir"], "lexical.npz")) == mtime
+        store.close()
+    print("✅ test_postings_match_store_and_bm25_prefers_full_matches passed.")
+
+
+def test_rrf_fuse_weights():
+    vector = [1, 2, 3]
+    lexical = [3, 4]
+    assert [row for row, _ in rrf_fuse([vector, lexical], [1.0, 1.0], 4)] == [3, 1, 2, 4]
+    assert [row for row, _ in rrf_fuse([vector, lexical], [1.0, 0.0], 4)] == [1, 2, 3]
+    print("✅ test_rrf_fuse_weights passed.")
+
+
+def test_hybrid_search_improves_ingredient_precision():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=400)
+        vector_only = SearchEngine(**paths, model=HashingEncoder(), lexical_weight=0)
+        hybrid = SearchEngine(**paths, model=HashingEncoder())
+
+        query, wanted = "tofu ginger soy sauce", {"tofu", "ginger", "soy sauce"}
+
+        def full_matches(engine):
+            return sum(wanted <= set(r["ingredients_list"]) for r in engine.search(query, k=5))
+
+        assert full_matches(hybrid) >= full_matches(vector_only)
+        assert hybrid.status()["assets"]["lexical"]["state"] == "ready"
+    print("✅ test_hybrid_search_improves_ingredient_precision passed.")
+
+
+if __name__ == "__main__":
+    test_tokenize_normalizes_ingredients()
+    test_postings_match_store_and_bm25_prefers_full_matches()
+    test_rrf_fuse_weights()
+    test_hybrid_search_improves_ingredient_precision()
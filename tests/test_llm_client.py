@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+from rag_pipeline import llm_client
+from rag_pipeline.llm_client import LLMClient
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class _Peak:
+    """Counts calls in flight and remembers the highest count."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.now = 0
+        self.peak = 0
+        self.payloads = []
+
+    def enter(self, payload):
+        with self.lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+            self.payloads.append(payload)
+
+    def leave(self):
+        with self.lock:
+            self.now -= 1
+
+
+class _FakeOllamaAdapter(BaseAdapter):
+    """requests transport answering /api/generate without a server."""
+
+    def __init__(self, peak: _Peak, delay: float = 0.05):
+        super().__init__()
+        self.peak = peak
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        self.peak.enter(json.loads(request.body))
+        try:
+            time.sleep(self.delay)
+        finally:
+            self.peak.leave()
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers["Content-Type"] = "application/json"
+        resp._content = json.dumps({"response": "ok", "done": True}).encode()
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def _mock_async_client(handler):
+    """httpx.AsyncClient whose requests go to handler instead of the network."""
+
+    class _Client(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+    return _Client
+
+
+def test_configuration_from_environment():
+    env = dict(
+        os.environ,
+        OLLAMA_HOST="http://ollama.test:1234/",
+        COOKMATE_LLM_MODEL="mistral",
+        COOKMATE_LLM_TIMEOUT="7",
+        COOKMATE_LLM_CONNECT_TIMEOUT="2",
+        COOKMATE_LLM_MAX_CONCURRENCY="3",
+        COOKMATE_LLM_KEEP_ALIVE="-1",
+        COOKMATE_LLM_POOL_SIZE="5",
+    )
+    code = (
+        "import json; from rag_pipeline.llm_client import get_llm_client; c = get_llm_client(); "
+        "print(json.dumps([c.base_url, c.model, c.timeout, c.connect_timeout, "
+        "c.max_concurrency, c.keep_alive, c.pool_size, c is get_llm_client()]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout) == ["http://ollama.test:1234", "mistral", 7.0, 2.0, 3, "-1", 5, True]
+    print("✅ test_configuration_from_environment passed.")
+
+
+def test_payload_keep_alive_and_format():
+    client = LLMClient(model="llama3", keep_alive="30m")
+    payload = client._payload("hi", None, 0.2, stream=False, format={"type": "object"})
+    assert payload == {
+        "model": "llama3",
+        "prompt": "hi",
+        "stream": False,
+        "options": {"temperature": 0.2},
+        "keep_alive": "30m",
+        "format": {"type": "object"},
+    }
+
+    payload = LLMClient(keep_alive=None)._payload("hi", "mistral", 0.0, stream=True)
+    assert payload["model"] == "mistral" and payload["stream"] is True
+    assert "keep_alive" not in payload and "format" not in payload
+    print("✅ test_payload_keep_alive_and_format passed.")
+
+
+def test_sync_concurrency_cap():
+    peak = _Peak()
+    client = LLMClient(base_url="http://ollama.test", max_concurrency=2, keep_alive="5m")
+    client._get_session().mount("http://", _FakeOllamaAdapter(peak))
+
+    threads = [threading.Thread(target=client.generate, args=(f"p{i}",), kwargs={"format": "json"}) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert peak.peak == 2
+    assert all(p["keep_alive"] == "5m" and p["format"] == "json" for p in peak.payloads)
+    stats = client.stats()
+    assert stats["requests"] == 6 and stats["in_flight"] == 0 and stats["waiting"] == 0
+    print("✅ test_sync_concurrency_cap passed.")
+
+
+def test_async_concurrency_cap_and_loop_rebinding():
+    peak = _Peak()
+    urls = []
+
+    async def handler(request):
+        urls.append(str(request.url))
+        peak.enter(json.loads(request.content))
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            peak.leave()
+        return httpx.Response(200, json={"response": "ok", "done": True})
+
+    client = LLMClient(base_url="http://ollama.test:1234", max_concurrency=2)
+
+    async def burst():
+        results = await asyncio.gather(*(client.agenerate(f"p{i}") for i in range(6)))
+        return results, client._async_client, client._async_slots
+
+    real = llm_client.httpx.AsyncClient
+    llm_client.httpx.AsyncClient = _mock_async_client(handler)
+    try:
+        results, first_client, first_slots = asyncio.run(burst())
+        # A fresh event loop (as the test client uses per request) gets its own client and slots.
+        again, second_client, second_slots = asyncio.run(burst())
+    finally:
+        llm_client.httpx.AsyncClient = real
+
+    assert results == ["ok"] * 6 and again == ["ok"] * 6
+    assert peak.peak == 2
+    assert first_client is not second_client and first_slots is not second_slots
+    assert first_client.is_closed and not second_client.is_closed
+    assert set(urls) == {"http://ollama.test:1234/api/generate"}
+    assert client.stats()["requests"] == 12
+    print("✅ test_async_concurrency_cap_and_loop_rebinding passed.")
+
+
+def test_stale_client_closed_on_its_running_loop():
+    async def handler(request):
+        return httpx.Response(200, json={"response": "ok", "done": True})
+
+    client = LLMClient(base_url="http://ollama.test")
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+
+    real = llm_client.httpx.AsyncClient
+    llm_client.httpx.AsyncClient = _mock_async_client(handler)
+    try:
+        thread.start()
+        assert asyncio.run_coroutine_threadsafe(client.agenerate("a"), other).result(timeout=5) == "ok"
+        stale = client._async_client
+        assert asyncio.run(client.agenerate("b")) == "ok"
+    finally:
+        llm_client.httpx.AsyncClient = real
+        other.call_soon_threadsafe(other.stop)
+        thread.join(timeout=5)
+        other.close()
+
+    assert stale.is_closed and client._async_client is not stale
+    print("✅ test_stale_client_closed_on_its_running_loop passed.")
+
+
+if __name__ == "__main__":
+    test_configuration_from_environment()
+    test_payload_keep_alive_and_format()
+    test_sync_concurrency_cap()
+    test_async_concurrency_cap_and_loop_rebinding()
+    test_stale_client_closed_on_its_running_loop()
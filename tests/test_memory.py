@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import faiss
+
+from rag_pipeline.memory import process_memory, find_processes
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Loads an index like a worker, touches every vector, reports its memory
+# once the parent says all workers are up and stays alive until every
+# worker has reported (pages only count as shared while both map them).
+WORKER = """
+import sys, json
+sys.path.insert(0, {root!r})
+import numpy as np
+from rag_pipeline.ann_index import read_index
+from rag_pipeline.memory import process_memory
+index = read_index({path!r}, mmap={mmap})
+index.search(np.ones((1, index.d), dtype="float32"), 5)
+print("ready", flush=True)
+sys.stdin.readline()
+print(json.dumps(process_memory()), flush=True)
+sys.stdin.readline()
+"""
+
+
+def _run_workers(path, mmap, n=2):
+    code = WORKER.format(root=ROOT, path=path, mmap=mmap)
+    procs = [
+        subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(n)
+    ]
+    for p in procs:
+        assert p.stdout.readline().strip() == "ready"
+    for p in procs:
+        p.stdin.write("\n")
+        p.stdin.flush()
+    reports = [json.loads(p.stdout.readline()) for p in procs]
+    for p in procs:
+        p.stdin.close()
+        p.wait(timeout=30)
+    return reports
+
+
+def test_process_memory():
+    mem = process_memory()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("⏭️ test_process_memory skipped (no /proc).")
+        return
+    assert mem["rss_mb"] > 0 and 0 < mem["pss_mb"] <= mem["rss_mb"] + 0.1
+    assert mem["shared_mb"] is not None and mem["private_mb"] is not None
+    assert os.getpid() not in find_processes("python")
+    print("✅ test_process_memory passed.")
+
+
+def test_mmap_index_is_shared_between_workers():
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("⏭️ test_mmap_index_is_shared_between_workers skipped (no /proc).")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.bin")
+        index = faiss.IndexFlatIP(128)
+        index.add(np.random.default_rng(0).random((60000, 128), dtype="float32"))
+        faiss.write_index(index, path)
+        size_mb = os.path.getsize(path) / 2**20
+
+        mapped = _run_workers(path, mmap=True)
+        loaded = _run_workers(path, mmap=False)
+        for m, l in zip(mapped, loaded):
+            # Mapped, the vectors are shared pages instead of a private copy per worker.
+            assert m["private_mb"] < l["private_mb"] - 0.8 * size_mb, (m, l)
+            assert m["shared_mb"] > l["shared_mb"] + 0.8 * size_mb, (m, l)
+            assert m["pss_mb"] < l["pss_mb"] - 0.4 * size_mb, (m, l)
+    print("✅ test_mmap_index_is_shared_between_workers passed.")
+
+
+def test_engine_maps_assets():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=150)
+        mapped = SearchEngine(**paths, model=HashingEncoder())
+        loaded = SearchEngine(**paths, model=HashingEncoder(), mmap_index=False)
+
+        for query in ["tomato garlic pasta", "tofu ginger soy sauce"]:
+            assert [r["recipe_id"] for r in mapped.search(query, k=5)] == [
+                r["recipe_id"] for r in loaded.search(query, k=5)
+            ]
+        assert isinstance(mapped.embeddings, np.memmap)
+        assert mapped.embeddings.shape == (150, 64)
+    print("✅ test_engine_maps_assets passed.")
+
+
+if __name__ == "__main__":
+    test_process_memory()
+    test_mmap_index_is_shared_between_workers()
+    test_engine_maps_assets()
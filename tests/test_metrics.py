@@ -0,0 +1,104 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from rag_pipeline.metrics import (
+    CACHE_LOOKUPS,
+    ERRORS,
+    STAGE_SECONDS,
+    Counter,
+    Histogram,
+    Registry,
+    stage,
+)
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    hist = registry.register(Histogram("demo_seconds", "Demo.", ["stage"], buckets=(0.1, 1.0)))
+    count = registry.register(Counter("demo_total", "Demo count.", ["cache", "result"]))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    hist.observe(3.0, stage="a")
+    count.inc(cache="x", result="hit")
+    count.inc(2, cache="x", result="miss")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="a"} 3' in lines
+    assert 'demo_seconds_sum{stage="a"} 3.55' in lines
+    assert "# TYPE demo_total counter" in lines
+    assert 'demo_total{cache="x",result="miss"} 2' in lines
+
+    try:
+        hist.observe(1.0, step="a")
+        assert False, "unknown label accepted"
+    except ValueError:
+        pass
+    print("✅ test_prometheus_text_format passed.")
+
+
+def test_histogram_quantiles():
+    hist = Histogram("q_seconds", "Quantiles.", buckets=(0.01, 0.1, 1.0))
+    assert hist.quantile(0.5) is None
+    for _ in range(90):
+        hist.observe(0.005)
+    for _ in range(10):
+        hist.observe(0.5)
+    assert hist.quantile(0.5) <= 0.01
+    assert 0.1 < hist.quantile(0.99) <= 1.0
+    print("✅ test_histogram_quantiles passed.")
+
+
+def test_search_stages_are_timed():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = SearchEngine(**build_corpus(tmp, n=100), model=HashingEncoder())
+        engine.load()
+        before = {s: STAGE_SECONDS.count(stage=s) for s in ("query_encode", "index_search", "lexical_search", "materialize")}
+        hits = CACHE_LOOKUPS.value(cache="embedding", result="hit")
+
+        engine.search("tomato garlic pasta", k=3)
+        engine.search("tomato garlic pasta", k=3)
+
+        for name, n in before.items():
+            assert STAGE_SECONDS.count(stage=name) == n + 2, name
+        assert CACHE_LOOKUPS.value(cache="embedding", result="hit") == hits + 1
+
+    errors = ERRORS.value(stage="demo")
+    try:
+        with stage("demo"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert ERRORS.value(stage="demo") == errors + 1
+    assert STAGE_SECONDS.count(stage="demo") == 1
+    print("✅ test_search_stages_are_timed passed.")
+
+
+def test_metrics_endpoint():
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE cookmate_stage_seconds histogram" in resp.text
+    assert 'cookmate_requests_total{endpoint="/health",status="200"}' in resp.text
+    print("✅ test_metrics_endpoint passed.")
+
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_histogram_quantiles()
+    test_search_stages_are_timed()
+    test_metrics_endpoint()
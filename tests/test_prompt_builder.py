@@ -0,0 +1,102 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag_pipeline.prompt_builder import (
+    UserRequest,
+    CompiledTemplate,
+    build_rag_prompt,
+    get_compiled_template,
+    pack_rag_prompt,
+)
+from rag_pipeline.format_retrieved import (
+    FULL,
+    SHORT_STEPS,
+    INGREDIENTS_ONLY,
+    estimate_tokens,
+    pack_retrieved,
+)
+
+
+RECIPE = {
+    "title": "Tomato Pasta",
+    "ingredients_list": ["pasta", "tomato", "garlic"],
+    "steps_list": ["Boil pasta.", "Make sauce.", "Combine."],
+}
+
+
+def test_compiled_template_renders_like_replace():
+    text = "A {{X}} b {{Y}} c {{X}}"
+    template = CompiledTemplate(text)
+    values = {"X": "1", "Y": "{{X}}"}
+
+    assert template.fields == ["X", "Y", "X"]
+    assert template.static_prefix == "A "
+    # One pass: a value containing a placeholder is not substituted again.
+    assert template.render(values) == "A 1 b {{X}} c 1"
+    print("✅ test_compiled_template_renders_like_replace passed.")
+
+
+def test_static_prefix_is_shared_across_requests():
+    template = get_compiled_template()
+    assert template.fields[0] == "INGREDIENTS"
+    assert "JSON SCHEMA" in template.static_prefix
+    assert '"item": ingredient name' in template.static_prefix
+
+    a = build_rag_prompt(UserRequest(["tomato", "pasta"], "vegan", "italian"), [RECIPE])
+    b = build_rag_prompt(UserRequest(["rice"], None, None), [])
+
+    assert a.startswith(template.static_prefix)
+    assert b.startswith(template.static_prefix)
+    assert a.index("Tomato Pasta") > len(template.static_prefix)
+    assert "{{" not in a and "{{" not in b
+    print("✅ test_static_prefix_is_shared_across_requests passed.")
+
+
+def _long_recipe(i):
+    return {
+        "title": f"Recipe number {i}",
+        "keywords": ["dinner", "easy"],
+        "ingredients_list": [f"ingredient {j}" for j in range(8)],
+        "steps_list": [f"Do a fairly long preparation step number {j} carefully." for j in range(10)],
+        "calories": 400.0,
+    }
+
+
+def test_pack_retrieved_respects_budget():
+    recipes = [_long_recipe(i) for i in range(15)]
+    text, report = pack_retrieved(recipes, max_tokens=400)
+
+    assert report["tokens"] == estimate_tokens(text)
+    assert report["tokens"] <= 400
+    assert 1 <= report["recipes_included"] < 15
+    assert report["detail"][0] == FULL
+    assert all(level in (SHORT_STEPS, INGREDIENTS_ONLY) for level in report["detail"][1:])
+    assert "Recipe 1:" in text and "Nutrition" in text
+    assert f"Recipe {report['recipes_included'] + 1}:" not in text
+
+    # Unlimited budget keeps everything, lower hits with shortened steps.
+    _, report = pack_retrieved(recipes, max_tokens=10 ** 6)
+    assert report["recipes_included"] == 15
+    assert report["detail"][1:] == [SHORT_STEPS] * 14
+    print("✅ test_pack_retrieved_respects_budget passed.")
+
+
+def test_pack_retrieved_always_keeps_top_hit():
+    text, report = pack_retrieved([_long_recipe(0), _long_recipe(1)], max_tokens=5)
+    assert report["recipes_included"] == 1
+    assert report["detail"] == [INGREDIENTS_ONLY]
+    assert "Steps:" not in text and "ingredient 0" in text
+
+    prompt, report = pack_rag_prompt(UserRequest(["rice"], None, None), [_long_recipe(0)], 0)
+    assert report["budget"] is None
+    assert "9. Do a fairly long" in prompt
+    print("✅ test_pack_retrieved_always_keeps_top_hit passed.")
+
+
+if __name__ == "__main__":
+    test_compiled_template_renders_like_replace()
+    test_static_prefix_is_shared_across_requests()
+    test_pack_retrieved_respects_budget()
+    test_pack_retrieved_always_keeps_top_hit()
@@ -0,0 +1,113 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+import multiprocessing
+
+import pandas as pd
+
+from rag_pipeline import recipe_store, lexical_index
+from rag_pipeline.recipe_store import compile_recipe_store, open_or_compile, RecipeStore
+from tests.synthetic_corpus import build_corpus
+
+
+def test_recipe_store_roundtrip():
+    df = pd.DataFrame(
+        [
+            {
+                "recipe_id": 7,
+                "title": "Crème brûlée",
+                "ingredients_list": ["cream", "sugar"],
+                "quantities_list": "['2']",
+                "steps_list": ["Heat the cream.", "Add sugar."],
+                "Calories": 420.5,
+                "FatContent": None,
+                "CarbohydrateContent": 30.0,
+                "ProteinContent": 5.0,
+                "RecipeCategory": "Dessert",
+                "Keywords": 'c("French", "< 30 Mins")',
+            },
+            {
+                "recipe_id": 9,
+                "title": "Plain rice",
+                "ingredients_list": ["rice"],
+                "quantities_list": ["1"],
+                "steps_list": ["Boil."],
+                "Calories": 200.0,
+                "FatContent": 0.5,
+                "CarbohydrateContent": 44.0,
+                "ProteinContent": 4.0,
+                "RecipeCategory": None,
+                "Keywords": None,
+            },
+        ]
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = os.path.join(tmp, "store")
+        compile_recipe_store(df, store_dir)
+        store = RecipeStore(store_dir)
+
+        assert len(store) == 2
+        assert store.recipe_id(1) == 9
+
+        row = store.row(0)
+        assert row["title"] == "Crème brûlée"
+        assert row["ingredients_list"] == ["cream", "sugar"]
+        assert row["quantities_list"] == ["2", None]
+        assert row["keywords"] == ["French", "< 30 Mins"]
+        assert row["calories"] == 420.5
+        assert row["fat"] is None
+
+        assert store.text("category", 1) == ""
+        assert store.list("keywords", 1) == []
+        assert store.list("steps_list", 1) == ["Boil."]
+
+        store.close()
+
+    print("✅ test_recipe_store_roundtrip passed.")
+
+
+def _start_worker(paths, log_path, barrier):
+    # What each uvicorn worker does on first start, counting the builds.
+    def counted(build, name):
+        def wrapper(*args, **kwargs):
+            with open(log_path, "a") as f:
+                f.write(name + "\n")
+            return build(*args, **kwargs)
+        return wrapper
+
+    recipe_store.compile_recipe_store = counted(recipe_store.compile_recipe_store, "store")
+    lexical_index.build_lexical_index = counted(lexical_index.build_lexical_index, "lexical")
+    barrier.wait(timeout=30)
+    store = open_or_compile(paths["store_dir"], paths["clean_path"])
+    assert len(lexical_index.open_or_build(store)) == len(store)
+
+
+def test_workers_compile_the_store_once():
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=300)
+        log_path = os.path.join(tmp, "builds.log")
+        barrier = ctx.Barrier(4)
+        workers = [ctx.Process(target=_start_worker, args=(paths, log_path, barrier)) for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join(timeout=60)
+        assert [w.exitcode for w in workers] == [0, 0, 0, 0]
+
+        with open(log_path) as f:
+            assert sorted(f.read().split()) == ["lexical", "store"]
+        assert len(RecipeStore(paths["store_dir"])) == 300
+        leftovers = [name for name in os.listdir(tmp) if ".tmp" in name or ".old-" in name]
+        leftovers += [name for name in os.listdir(paths["store_dir"]) if ".tmp" in name]
+        assert leftovers == []
+
+    print("✅ test_workers_compile_the_store_once passed.")
+
+
+if __name__ == "__main__":
+    print("Running test_recipe_store_roundtrip manually...")
+    test_recipe_store_roundtrip()
+    test_workers_compile_the_store_once()
@@ -0,0 +1,47 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import tempfile
+
+from rag_pipeline.cache import ResultCache, canonical_request_key
+
+
+def test_canonical_request_key_ignores_order_case_and_duplicates():
+    a = canonical_request_key(["Tomato", "garlic", "pasta"], "Vegetarian", "Italian", 3, "llama3")
+    b = canonical_request_key(["pasta", "tomato ", "GARLIC", "garlic"], "vegetarian", "italian", 3, "llama3")
+    assert a == b
+
+    assert a != canonical_request_key(["tomato", "garlic", "pasta"], "vegan", "Italian", 3, "llama3")
+    assert a != canonical_request_key(["tomato", "garlic", "pasta"], "vegetarian", "Italian", 5, "llama3")
+    assert a != canonical_request_key(["tomato", "garlic", "pasta"], "vegetarian", "Italian", 3, "mistral")
+
+    print("✅ test_canonical_request_key_ignores_order_case_and_duplicates passed.")
+
+
+def test_result_cache_ttl_copies_and_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.json")
+        cache = ResultCache(max_size=4, ttl=60, path=path)
+
+        cache.put("k1", {"success": True, "recipe": {"title": "Soup"}})
+        got = cache.get("k1")
+        got["recipe"]["title"] = "changed by caller"
+        assert cache.get("k1")["recipe"]["title"] == "Soup"
+
+        cache.put("old", {"success": True}, expires_at=time.time() - 1)
+        assert cache.get("old") is None
+        assert cache.stats()["expirations"] == 1
+
+        cache.save()
+        reloaded = ResultCache(max_size=4, ttl=60, path=path)
+        assert reloaded.get("k1")["recipe"]["title"] == "Soup"
+        assert len(reloaded) == 1
+
+    print("✅ test_result_cache_ttl_copies_and_persistence passed.")
+
+
+if __name__ == "__main__":
+    print("Running result cache tests manually...")
+    test_canonical_request_key_ignores_order_case_and_duplicates()
+    test_result_cache_ttl_copies_and_persistence()
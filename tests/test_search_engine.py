@@ -0,0 +1,82 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+
+def test_engine_loads_lazily_and_reports_readiness():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=50)
+        engine = SearchEngine(**paths, model=HashingEncoder())
+
+        status = engine.status()
+        assert status["ready"] is False
+        assert engine.store is None
+        assert status["assets"]["recipes"]["state"] == "pending"
+
+        engine.warmup().join(timeout=30)
+
+        status = engine.status()
+        assert status["ready"] is True
+        assert status["loaded"] == status["total"]
+        for entry in status["assets"].values():
+            assert entry["state"] == "ready"
+            assert entry["seconds"] is not None
+
+    print("✅ test_engine_loads_lazily_and_reports_readiness passed.")
+
+
+def test_engine_search_loads_on_first_use():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=50)
+        engine = SearchEngine(**paths, model=HashingEncoder())
+
+        results = engine.search("tomato garlic pasta", k=5)
+        assert engine.is_ready()
+        assert 0 < len(results) <= 5
+
+        first = results[0]
+        for key in ["recipe_id", "title", "ingredients_list", "ingredients_structured", "steps_list"]:
+            assert key in first
+
+    print("✅ test_engine_search_loads_on_first_use passed.")
+
+
+def test_engine_search_batch_matches_single_queries():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(tmp, n=80)
+        engine = SearchEngine(**paths, model=HashingEncoder())
+
+        queries = ["tomato garlic pasta", "chicken rice onion garlic", "tofu ginger soy sauce"]
+        batch = engine.search_batch(queries, k=4)
+
+        assert len(batch) == len(queries)
+        for query, results in zip(queries, batch):
+            single = engine.search(query, k=4)
+            assert [r["recipe_id"] for r in results] == [r["recipe_id"] for r in single]
+
+    print("✅ test_engine_search_batch_matches_single_queries passed.")
+
+
+def test_engine_reports_failed_asset():
+    engine = SearchEngine(clean_path="/nonexistent/cleaned_recipes.json", model=HashingEncoder())
+
+    engine.warmup().join(timeout=30)
+
+    status = engine.status()
+    assert status["ready"] is False
+    assert status["assets"]["recipes"]["state"] == "failed"
+    assert status["assets"]["recipes"]["error"]
+
+    print("✅ test_engine_reports_failed_asset passed.")
+
+
+if __name__ == "__main__":
+    print("Running search engine tests manually...")
+    test_engine_loads_lazily_and_reports_readiness()
+    test_engine_search_loads_on_first_use()
+    test_engine_search_batch_matches_single_queries()
+    test_engine_reports_failed_asset()
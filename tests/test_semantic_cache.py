@@ -0,0 +1,55 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag_pipeline.query_builder import build_query
+from rag_pipeline.semantic_cache import SemanticCache
+from tests.synthetic_corpus import HashingEncoder
+
+
+def _result(title, items):
+    return {
+        "success": True,
+        "recipe": {"title": title, "ingredients": [{"item": i, "quantity": "1"} for i in items]},
+    }
+
+
+def test_semantic_cache_serves_near_duplicates_only():
+    cache = SemanticCache(HashingEncoder().encode, threshold=0.6, max_entries=2)
+
+    pantry = ["tomato", "garlic", "pasta"]
+    cache.add(
+        build_query(pantry, "vegetarian", "Italian"),
+        pantry,
+        "vegetarian",
+        "Italian",
+        _result("Garlic Tomato Pasta", ["tomato", "garlic", "pasta", "olive oil"]),
+    )
+
+    similar = ["garlic", "tomatoes", "pasta"]
+    hit = cache.lookup(build_query(similar, "vegetarian", "italian"), similar, "vegetarian", "italian")
+    assert hit is not None
+    assert hit["recipe"]["title"] == "Garlic Tomato Pasta"
+    assert hit["cache_similarity"] >= 0.6
+
+    # Same text, different diet: must not be served.
+    assert cache.lookup(build_query(similar, "vegetarian", "Italian"), similar, "vegan", "Italian") is None
+
+    # An ingredient the stored recipe does not use.
+    extra = ["tomato", "garlic", "pasta", "spinach"]
+    assert cache.lookup(build_query(extra, "vegetarian", "Italian"), extra, "vegetarian", "Italian") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+    for i in range(2):
+        cache.add(f"rice beans {i}", ["rice"], None, None, _result(f"Rice {i}", ["rice"]))
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["evictions"] == 1
+
+    print("✅ test_semantic_cache_serves_near_duplicates_only passed.")
+
+
+if __name__ == "__main__":
+    print("Running test_semantic_cache_serves_near_duplicates_only manually...")
+    test_semantic_cache_serves_near_duplicates_only()
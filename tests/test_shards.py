@@ -0,0 +1,284 @@
+import os
+import sys
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag_pipeline.shards import (
+    ShardClient,
+    ShardedSearch,
+    ShardWorker,
+    load_manifest,
+    make_server,
+    split_corpus,
+)
+from rag_pipeline.search import SearchEngine
+from tests.synthetic_corpus import build_corpus, HashingEncoder
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+QUERIES = ["tomato garlic pasta", "tofu ginger soy sauce", "chicken rice onion", "salmon lemon butter"]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _split(tmp, n=300, shards=3):
+    paths = build_corpus(tmp, n=n)
+    single = SearchEngine(**paths, model=HashingEncoder(), lexical_weight=0)
+    single.load()  # compiles the recipe store the split reads
+    out = os.path.join(tmp, "shards")
+    split_corpus(shards, out, paths["store_dir"], paths["emb_path"], paths["idmap_path"])
+    return single, out
+
+
+def _wait_ready(client, seconds=60):
+    deadline = time.time() + seconds
+    while True:
+        try:
+            return client.request("GET", "/health")
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def test_split_partitions_by_recipe_id():
+    with tempfile.TemporaryDirectory() as tmp:
+        single, out = _split(tmp)
+        manifest = load_manifest(out)
+        assert [s["n_docs"] for s in manifest["shards"]] == [100, 100, 100]
+
+        seen = []
+        for shard in manifest["shards"]:
+            worker = ShardWorker(os.path.join(out, shard["dir"]))
+            worker.engine.load()
+            ids = list(worker.engine.store.recipe_ids)
+            assert all(i % 3 == shard["id"] for i in ids)
+            seen += ids
+        assert sorted(seen) == sorted(single.store.recipe_ids)
+    print("✅ test_split_partitions_by_recipe_id passed.")
+
+
+def test_sharded_search_matches_single_node():
+    with tempfile.TemporaryDirectory() as tmp:
+        single, out = _split(tmp)
+        manifest = load_manifest(out)
+
+        # Two workers on ports, one on a Unix socket, as separate processes.
+        sock = os.path.join(tmp, "shard.sock")
+        addresses, procs = [], []
+        for shard in manifest["shards"]:
+            cmd = [sys.executable, "-m", "rag_pipeline.shards", "serve", os.path.join(out, shard["dir"])]
+            if shard["id"] == 2:
+                cmd += ["--socket", sock]
+                addresses.append(f"unix:{sock}")
+            else:
+                port = _free_port()
+                cmd += ["--port", str(port)]
+                addresses.append(f"http://127.0.0.1:{port}")
+            procs.append(subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        try:
+            for address in addresses:
+                _wait_ready(ShardClient(address, timeout=5))
+
+            coordinator = ShardedSearch(
+                addresses, timeout_ms=5000, model=HashingEncoder(), emb_cache_size=0, lexical_weight=0
+            )
+            for query in QUERIES:
+                expected = single.search(query, k=5)
+                got = coordinator.search(query, k=5)
+                assert [r["recipe_id"] for r in got] == [r["recipe_id"] for r in expected], query
+                assert got[0] == expected[0]
+
+                expected = single.search(query, k=5, diet="vegetarian")
+                got = coordinator.search(query, k=5, diet="vegetarian")
+                assert [r["recipe_id"] for r in got] == [r["recipe_id"] for r in expected], query
+
+            batch = coordinator.search_batch(QUERIES, k=3)
+            assert [[r["recipe_id"] for r in b] for b in batch] == [
+                [r["recipe_id"] for r in single.search(q, k=3)] for q in QUERIES
+            ]
+
+            # Hybrid mode fuses BM25 hits from every shard too.
+            hybrid = ShardedSearch(addresses, timeout_ms=5000, model=HashingEncoder(), emb_cache_size=0)
+            assert len(hybrid.search("tomato garlic pasta", k=5)) == 5
+
+            stats = coordinator.stats()
+            assert stats["partial_searches"] == 0
+            assert all(s["requests"] > 0 and s["errors"] == 0 for s in stats["shards"])
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait(timeout=30)
+    print("✅ test_sharded_search_matches_single_node passed.")
+
+
+def test_slow_and_dead_shards_give_partial_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        single, out = _split(tmp)
+        manifest = load_manifest(out)
+
+        # Shard 1 answers only once the test is over.
+        release, finished = threading.Event(), threading.Event()
+
+        def slow(search):
+            def candidates(body):
+                release.wait(10)
+                try:
+                    return search(body)
+                finally:
+                    finished.set()
+
+            return candidates
+
+        servers, addresses = [], []
+        for shard in manifest["shards"]:
+            worker = ShardWorker(os.path.join(out, shard["dir"]))
+            worker.engine.load()
+            if shard["id"] == 1:
+                worker.candidates = slow(worker.candidates)
+            server = make_server(worker)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+            addresses.append(f"http://127.0.0.1:{server.server_address[1]}")
+        # Nothing listens on the fourth address.
+        addresses.append(f"http://127.0.0.1:{_free_port()}")
+
+        try:
+            coordinator = ShardedSearch(
+                addresses, timeout_ms=300, model=HashingEncoder(), emb_cache_size=0, lexical_weight=0
+            )
+            start = time.perf_counter()
+            got = coordinator.search("tomato garlic pasta", k=5)
+            assert time.perf_counter() - start < 0.9
+
+            # Best hits of the two shards that answered.
+            expected = [
+                r["recipe_id"] for r in single.search("tomato garlic pasta", k=50) if r["recipe_id"] % 3 != 1
+            ][:5]
+            assert [r["recipe_id"] for r in got] == expected
+
+            stats = coordinator.stats()
+            assert stats["partial_searches"] == 1
+            by_address = {s["address"]: s for s in stats["shards"]}
+            assert by_address[addresses[1]]["timeouts"] == 1
+            assert by_address[addresses[3]]["errors"] == 1
+
+            dead = ShardedSearch(addresses[3:], timeout_ms=300, model=HashingEncoder(), emb_cache_size=0)
+            try:
+                dead.search("tomato", k=5)
+                assert False, "search with no shard answering succeeded"
+            except RuntimeError:
+                pass
+        finally:
+            release.set()
+            finished.wait(10)
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+    print("✅ test_slow_and_dead_shards_give_partial_results passed.")
+
+
+def test_failed_shard_is_probed_again():
+    with tempfile.TemporaryDirectory() as tmp:
+        _, out = _split(tmp, n=60, shards=1)
+        worker = ShardWorker(os.path.join(out, load_manifest(out)["shards"][0]["dir"]))
+        worker.engine.load()
+        address = f"http://127.0.0.1:{_free_port()}"
+
+        by_ready = ShardedSearch([address], timeout_ms=500, model=HashingEncoder(), emb_cache_size=0, reprobe_s=0)
+        by_search = ShardedSearch([address], timeout_ms=500, model=HashingEncoder(), emb_cache_size=0, reprobe_s=3600)
+        for coordinator in (by_ready, by_search):
+            coordinator.load()
+            assert not coordinator.is_ready()
+            assert coordinator.status()["assets"][f"shard:{address}"]["state"] == "failed"
+
+        # The shard comes up after the coordinators checked it.
+        server = make_server(worker, port=int(address.rsplit(":", 1)[1]))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            assert by_ready.status()["ready"] and by_ready.is_ready()
+
+            assert not by_search.is_ready()
+            assert len(by_search.search("tomato garlic pasta", k=3)) == 3
+            assert by_search.is_ready()
+        finally:
+            by_ready.close()
+            by_search.close()
+            server.shutdown()
+            server.server_close()
+    print("✅ test_failed_shard_is_probed_again passed.")
+
+
+def test_timed_out_request_frees_its_thread_and_connection():
+    with tempfile.TemporaryDirectory() as tmp:
+        _, out = _split(tmp, n=60, shards=1)
+        worker = ShardWorker(os.path.join(out, load_manifest(out)["shards"][0]["dir"]))
+        worker.engine.load()
+        release, finished = threading.Event(), threading.Event()
+        search = worker.candidates
+
+        def slow(body):
+            release.wait(10)
+            try:
+                return search(body)
+            finally:
+                finished.set()
+
+        worker.candidates = slow
+        server = make_server(worker)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        coordinator = ShardedSearch(
+            [f"http://127.0.0.1:{server.server_address[1]}"], timeout_ms=300, model=HashingEncoder(), emb_cache_size=0
+        )
+        # A socket timeout longer than the deadline, as with a response that trickles in.
+        coordinator.clients[0].timeout = 30
+        try:
+            try:
+                coordinator.search("tomato garlic pasta", k=3)
+                assert False, "search with no shard answering succeeded"
+            except RuntimeError:
+                pass
+            assert coordinator.stats()["shards"][0]["timeouts"] == 1
+
+            # The pool thread is not left waiting on the slow shard.
+            drained = threading.Thread(target=coordinator._pool.shutdown, kwargs={"wait": True})
+            drained.start()
+            drained.join(3)
+            assert not drained.is_alive()
+        finally:
+            release.set()
+            finished.wait(10)
+            time.sleep(0.2)
+            server.shutdown()
+            server.server_close()
+        assert coordinator.clients[0]._idle == []
+    print("✅ test_timed_out_request_frees_its_thread_and_connection passed.")
+
+
+def test_embedding_cache_path_is_honoured():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "emb_cache.npz")
+        coordinator = ShardedSearch([], model=HashingEncoder(), emb_cache_path=path)
+        try:
+            assert coordinator.embedding_cache.path == path
+        finally:
+            coordinator.close()
+    print("✅ test_embedding_cache_path_is_honoured passed.")
+
+
+if __name__ == "__main__":
+    test_split_partitions_by_recipe_id()
+    test_sharded_search_matches_single_node()
+    test_slow_and_dead_shards_give_partial_results()
+    test_failed_shard_is_probed_again()
+    test_timed_out_request_frees_its_thread_and_connection()
+    test_embedding_cache_path_is_honoured()
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag_pipeline.structured_output import RECIPE_JSON_SCHEMA, StreamingJSONValidator
+from rag_pipeline.generator import GenerationStats, validate_recipe_json
+
+
+RECIPE = {
+    "title": "Tomato {Garlic} Pasta",
+    "ingredients": [{"item": "pasta", "quantity": "200 g"}],
+    "steps": ["Boil \"al dente\" pasta.", "Add sauce ]."],
+    "time_minutes": 20,
+    "servings": 2,
+    "diet": "vegetarian",
+    "cuisine": "Italian",
+    "reason": "fits",
+}
+
+
+def _feed(validator, text, size=5):
+    state = "partial"
+    for i in range(0, len(text), size):
+        state = validator.feed(text[i:i + size])
+        if state != "partial":
+            break
+    return state
+
+
+def test_schema_requires_validated_fields():
+    assert all(f in RECIPE_JSON_SCHEMA["properties"] for f in RECIPE_JSON_SCHEMA["required"])
+    ok, _ = validate_recipe_json(json.dumps(RECIPE))
+    assert ok
+    print("✅ test_schema_requires_validated_fields passed.")
+
+
+def test_validator_completes_and_ignores_trailing_text():
+    validator = StreamingJSONValidator()
+    text = "  " + json.dumps(RECIPE) + "\nEnjoy your meal! {"
+    assert _feed(validator, text) == "complete"
+    assert json.loads(validator.document) == RECIPE
+    print("✅ test_validator_completes_and_ignores_trailing_text passed.")
+
+
+def test_validator_aborts_unrecoverable_output():
+    strict = StreamingJSONValidator(strict=True)
+    assert _feed(strict, "Here is your recipe: {}") == "invalid"
+    assert len(strict.text) < 10
+
+    lenient = StreamingJSONValidator(strict=False)
+    assert _feed(lenient, "```json\n" + json.dumps(RECIPE)) == "complete"
+
+    mismatched = StreamingJSONValidator()
+    assert _feed(mismatched, '{"steps": ["a", "b"}, "title": "x"}') == "invalid"
+    assert "mismatched" in mismatched.error
+
+    runaway = StreamingJSONValidator(max_chars=100)
+    assert _feed(runaway, '{"steps": [' + '"step", ' * 50) == "invalid"
+    print("✅ test_validator_aborts_unrecoverable_output passed.")
+
+
+def test_retries_avoided_needs_structured_output():
+    stats = GenerationStats()
+    assert stats.record(1, True, 1, structured=True) == 1
+    # Free text, a local repair, a retry or no retry budget: nothing avoided.
+    assert stats.record(1, True, 1, structured=False) == 0
+    assert stats.record(1, True, 1, repaired=True, structured=True) == 0
+    assert stats.record(2, True, 1, structured=True) == 0
+    assert stats.record(1, True, 0, structured=True) == 0
+    assert stats.record(2, False, 1, structured=True) == 0
+
+    totals = stats.stats()
+    assert totals["requests"] == 6 and totals["retries_avoided"] == 1
+    assert totals["first_try_valid"] == 4 and totals["retries"] == 2 and totals["failures"] == 1
+    print("✅ test_retries_avoided_needs_structured_output passed.")
+
+
+if __name__ == "__main__":
+    test_schema_requires_validated_fields()
+    test_validator_completes_and_ignores_trailing_text()
+    test_validator_aborts_unrecoverable_output()
+    test_retries_avoided_needs_structured_output()
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from rag_pipeline import tracing
+from rag_pipeline.executor import run_cpu
+from rag_pipeline.metrics import stage
+from rag_pipeline.tracing import current_request_id, end_trace, should_profile, span, start_trace
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def test_spans_and_server_timing():
+    trace, token = start_trace("req-1")
+    try:
+        assert current_request_id() == "req-1"
+        with stage("query_encode"):
+            pass
+        for _ in range(2):
+            with span("search"):
+                pass
+    finally:
+        end_trace(token)
+    assert current_request_id() is None
+
+    assert [name for name, _, _ in trace.spans] == ["query_encode", "search", "search"]
+    timing = trace.server_timing()
+    assert timing.startswith("query_encode;dur=")
+    assert 'search;dur=' in timing and ';desc="x2"' in timing
+    assert ", total;dur=" in timing
+
+    record = json.loads(json.dumps(trace.record(path="/x")))
+    assert record["request_id"] == "req-1" and record["path"] == "/x"
+    assert [s["name"] for s in record["spans"]] == ["query_encode", "search", "search"]
+
+    # Unusable client ids are replaced.
+    bad, token = start_trace("bad id\nX-Injected: 1")
+    end_trace(token)
+    assert bad.request_id != "bad id\nX-Injected: 1" and len(bad.request_id) == 16
+    print("✅ test_spans_and_server_timing passed.")
+
+
+def test_run_cpu_keeps_the_trace_and_profiles():
+    def work():
+        with stage("materialize"):
+            return sum(i * i for i in range(20000)), current_request_id()
+
+    async def request(profile):
+        trace, token = start_trace(profile=profile)
+        try:
+            result = await run_cpu(work)
+        finally:
+            end_trace(token)
+        return trace, result
+
+    trace, (_, request_id) = asyncio.run(request(profile=False))
+    assert request_id == trace.request_id
+    assert [name for name, _, _ in trace.spans] == ["materialize"]
+    assert trace.write_profile() is None
+
+    trace, _ = asyncio.run(request(profile=True))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = trace.write_profile(tmp)
+        assert path.endswith(f"{trace.request_id}.prof") and os.path.exists(path)
+        with open(path[: -len(".prof")] + ".txt", encoding="utf-8") as f:
+            assert "work" in f.read()
+        # A second profile under the same id does not overwrite the first.
+        again = trace.write_profile(tmp)
+        assert again != path and os.path.exists(path) and os.path.exists(again)
+
+    # The header is ignored unless COOKMATE_PROFILE_HEADER=1.
+    previous = tracing.PROFILE_HEADER_ENABLED
+    tracing.PROFILE_HEADER_ENABLED = False
+    try:
+        assert not should_profile("1")
+        tracing.PROFILE_HEADER_ENABLED = True
+        assert should_profile("1") and not should_profile("0") and not should_profile(None)
+    finally:
+        tracing.PROFILE_HEADER_ENABLED = previous
+    print("✅ test_run_cpu_keeps_the_trace_and_profiles passed.")
+
+
+def test_backend_returns_request_id_and_logs_trace():
+    records = _Records()
+    trace_logger = tracing.get_trace_logger()
+    trace_logger.addHandler(records)
+    try:
+        client = TestClient(app)
+        resp = client.get("/health", headers={"X-Request-ID": "abc-123"})
+        assert resp.status_code == 200
+        assert resp.headers["X-Request-ID"] == "abc-123"
+        assert "total;dur=" in resp.headers["Server-Timing"]
+
+        generated = client.get("/health").headers["X-Request-ID"]
+        assert generated and generated != "abc-123"
+    finally:
+        trace_logger.removeHandler(records)
+
+    logged = [json.loads(line) for line in records.lines]
+    assert [r["request_id"] for r in logged] == ["abc-123", generated]
+    assert logged[0]["path"] == "/health" and logged[0]["status"] == 200
+    assert logged[0]["duration_ms"] >= 0 and logged[0]["profile"] is None
+    print("✅ test_backend_returns_request_id_and_logs_trace passed.")
+
+
+if __name__ == "__main__":
+    test_spans_and_server_timing()
+    test_run_cpu_keeps_the_trace_and_profiles()
+    test_backend_returns_request_id_and_logs_trace()